@@ -0,0 +1,67 @@
+"""
+Compare rendering camera views to PNG files one by one with a `BatchRenderer`.
+
+Runs on any standalone context, including software drivers such as llvmpipe.
+
+Usage: python benchmarks/bench_batch.py [n_frames] [size]
+"""
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import radiant
+from radiant.renderers.batch import BatchRenderer, save_images
+from radiant.renderers.moderngl import create_standalone_context, ModernGLRenderer
+
+
+def build_scene(n_meshes=200, seed=0):
+    rng = np.random.RandomState(seed)
+    scene = radiant.Scene()
+    geometry = radiant.PlaneGeometry(width_segments=16, height_segments=16)
+    materials = [radiant.MeshPhongMaterial(color=tuple(rng.uniform(0, 1, 3)) + (1.0,)) for _ in range(8)]
+    for i in range(n_meshes):
+        scene.append_child(radiant.Mesh(
+            geometry, materials[i % len(materials)],
+            position=rng.uniform(-3, 3, 3), rotation=rng.uniform(-np.pi, np.pi, 3)))
+    light = radiant.PointLight(position=[0, 5, 5])
+    scene.append_child(light)
+    return scene, light
+
+
+def orbit(n_frames):
+    return [
+        radiant.PerspectiveCamera(position=[8 * np.sin(a), 2, 8 * np.cos(a)], target=[0, 0, 0], up=[0, 1, 0], aspect=1)
+        for a in np.linspace(0, 2 * np.pi, n_frames, endpoint=False)
+    ]
+
+
+def main(n_frames=200, size=512):
+    ctx = create_standalone_context()
+    renderer = ModernGLRenderer(ctx)
+    scene, light = build_scene()
+    cameras = orbit(n_frames)
+    print(f"{n_frames} frames of {size}x{size}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        sink = save_images(directory + "/sync_{:05d}.png")
+        fbo = ctx.framebuffer(ctx.renderbuffer((size, size)), ctx.depth_renderbuffer((size, size)))
+        start = time.perf_counter()
+        for index, camera in enumerate(cameras):
+            fbo.use()
+            renderer.render(scene, camera, light=light)
+            data = np.frombuffer(fbo.read(components=3, alignment=1), dtype='u1')
+            sink(index, data.reshape((size, size, 3))[::-1])
+        seconds = time.perf_counter() - start
+        print(f"synchronous:        {n_frames / seconds:.1f} frames/s")
+
+        for buffers in (1, 2, 3):
+            batch = BatchRenderer(renderer, size=(size, size), buffers=buffers)
+            batch.render(scene, cameras, light=light, sink=save_images(directory + "/batch_{:05d}.png"))
+            print(f"batch, {buffers} buffer(s): {batch.stats['fps']:.1f} frames/s")
+            batch.release()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,63 @@
+"""
+Compare picking with a `SceneBVH` against testing every mesh.
+
+Usage: python benchmarks/bench_bvh.py [n_meshes] [n_rays]
+"""
+import sys
+import time
+
+import numpy as np
+
+import radiant
+from radiant.bvh import ray_box_distances
+
+
+def build_scene(n_meshes, seed=0):
+    rng = np.random.RandomState(seed)
+    scene = radiant.Scene()
+    geometry = radiant.PlaneGeometry(width_segments=4, height_segments=4)
+    material = radiant.MeshBasicMaterial()
+    extent = n_meshes ** (1 / 3) * 2
+    for position, rotation in zip(rng.uniform(-extent, extent, (n_meshes, 3)), rng.uniform(-np.pi, np.pi, (n_meshes, 3))):
+        scene.append_child(radiant.Mesh(geometry, material, position=position, rotation=rotation))
+    return scene
+
+
+def main(n_meshes=100000, n_rays=1000):
+    scene = build_scene(n_meshes)
+    rng = np.random.RandomState(1)
+    origins = rng.uniform(-1, 1, (n_rays, 3)).astype('f4')
+    directions = rng.normal(size=(n_rays, 3)).astype('f4')
+    scene.update_subtree()
+    print(f"{n_meshes} meshes, {n_rays} rays")
+
+    start = time.perf_counter()
+    bvh = radiant.SceneBVH(scene)
+    print(f"SceneBVH build:        {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    with np.errstate(divide='ignore'):
+        inv_directions = 1 / directions
+    candidates = 0
+    for origin, inv_direction in zip(origins, inv_directions):
+        entry, exit = ray_box_distances(origin, inv_direction, bvh.item_lower, bvh.item_upper)
+        candidates += (entry <= exit).sum()
+    print(f"brute force boxes:     {(time.perf_counter() - start) * 1000:.1f} ms, {candidates} candidates")
+
+    start = time.perf_counter()
+    rays, _, _ = bvh.query_rays(origins, directions)
+    print(f"SceneBVH.query_rays:   {(time.perf_counter() - start) * 1000:.1f} ms, {len(rays)} candidates")
+
+    start = time.perf_counter()
+    hits = bvh.raycast(origins, directions)
+    print(f"SceneBVH.raycast:      {(time.perf_counter() - start) * 1000:.1f} ms, {(hits.mesh >= 0).sum()} hits")
+
+    for node in bvh.meshes[::100]:
+        node.position = node.position + 0.5
+    start = time.perf_counter()
+    moved = bvh.update()
+    print(f"SceneBVH.update:       {(time.perf_counter() - start) * 1000:.1f} ms, {moved} moved")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,35 @@
+"""
+Measure how a `RenderFarm` scales with the number of worker processes.
+
+Usage: python benchmarks/bench_farm.py [n_frames] [size] [max_workers]
+"""
+import os
+import sys
+import time
+
+from bench_batch import build_scene, orbit
+
+from radiant.renderers.farm import RenderFarm
+
+
+def main(n_frames=200, size=256, max_workers=None):
+    max_workers = max_workers or os.cpu_count()
+    scene, light = build_scene()
+    cameras = orbit(n_frames)
+    print(f"{n_frames} frames of {size}x{size}")
+
+    workers = 1
+    while workers <= max_workers:
+        with RenderFarm(scene, light=light, size=(size, size), workers=workers, start_method='spawn') as farm:
+            # the first frames include starting the workers and loading the scene
+            list(farm.render(cameras[:workers]))
+            start = time.perf_counter()
+            for _ in farm.render(cameras):
+                pass
+            seconds = time.perf_counter() - start
+        print(f"{workers:3d} workers: {n_frames / seconds:7.1f} frames/s")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,51 @@
+"""
+Compare `load_obj` with `load_obj_indexed` on a synthetic mesh.
+
+Usage: python benchmarks/bench_load_obj.py [n_faces]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import radiant
+
+
+def write_grid_obj(fh, n_faces):
+    """Write a triangulated grid with roughly n_faces faces in the Blender layout."""
+    segments = max(int(np.sqrt(n_faces / 2)), 1)
+    plane = radiant.PlaneGeometry(width_segments=segments, height_segments=segments)
+    index = plane.index + 1
+    np.savetxt(fh, plane.attributes['pos'], fmt='v %.6f %.6f %.6f')
+    np.savetxt(fh, plane.attributes['uv'], fmt='vt %.6f %.6f')
+    np.savetxt(fh, plane.attributes['normal'], fmt='vn %.6f %.6f %.6f')
+    np.savetxt(fh, np.repeat(index, 3, axis=1), fmt='f %d/%d/%d %d/%d/%d %d/%d/%d')
+    return len(index)
+
+
+def main(n_faces=1000000):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "grid.obj")
+        with open(path, mode="wb") as fh:
+            n_faces = write_grid_obj(fh, n_faces)
+        print(f"{n_faces} faces, {os.path.getsize(path) / 2**20:.1f} MiB")
+
+        start = time.perf_counter()
+        with open(path, mode="r") as fh:
+            geometry = radiant.load_obj(fh)
+        elapsed = time.perf_counter() - start
+        n_bytes = sum(a.nbytes for a in geometry.attributes.values())
+        print(f"load_obj:         {elapsed:.2f}s, {n_bytes / 2**20:.1f} MiB of buffers")
+        del geometry
+
+        start = time.perf_counter()
+        geometry = radiant.load_obj_indexed(path)
+        elapsed = time.perf_counter() - start
+        n_bytes = sum(a.nbytes for a in geometry.attributes.values()) + geometry.index.nbytes
+        print(f"load_obj_indexed: {elapsed:.2f}s, {n_bytes / 2**20:.1f} MiB of buffers")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,72 @@
+"""
+Compare per-node `Object3D.update` with a batched `TransformGraph.update`.
+
+Usage: python benchmarks/bench_scene_graph.py [n_nodes]
+"""
+import sys
+import time
+
+import numpy as np
+
+import radiant
+
+
+def build_tree(n_nodes, branching=8, seed=0):
+    rng = np.random.RandomState(seed)
+    nodes = [radiant.Scene()]
+    for i in range(1, n_nodes):
+        node = radiant.Object3D(position=rng.uniform(-1, 1, 3), rotation=rng.uniform(-np.pi, np.pi, 3))
+        nodes[(i - 1) // branching].append_child(node)
+        nodes.append(node)
+    return nodes
+
+
+def main(n_nodes=100000, repeat=1):
+    nodes = build_tree(n_nodes)
+    print(f"{n_nodes} nodes")
+
+    best = float('inf')
+    for _ in range(repeat):
+        for node in nodes:
+            node.dirty = True
+        start = time.perf_counter()
+        for node in nodes:
+            node.update()
+        best = min(best, time.perf_counter() - start)
+    print(f"Object3D.update:       {best * 1000:.1f} ms")
+
+    # mostly static scene: only a few leaves move per frame
+    moving = nodes[-10:]
+    best = float('inf')
+    for _ in range(repeat):
+        for node in moving:
+            node.position = node.position + 0.1
+        start = time.perf_counter()
+        updated = nodes[0].update_subtree()
+        best = min(best, time.perf_counter() - start)
+    print(f"update_subtree, {updated} moved:  {best * 1000:.2f} ms")
+
+    start = time.perf_counter()
+    graph = radiant.TransformGraph(nodes[0])
+    print(f"TransformGraph build:  {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    best = float('inf')
+    for _ in range(repeat):
+        graph.mark_dirty()
+        start = time.perf_counter()
+        graph.update()
+        best = min(best, time.perf_counter() - start)
+    print(f"TransformGraph.update: {best * 1000:.1f} ms")
+
+    best = float('inf')
+    for _ in range(repeat):
+        for node in moving:
+            node.position = node.position + 0.1
+        start = time.perf_counter()
+        updated = graph.update()
+        best = min(best, time.perf_counter() - start)
+    print(f"TransformGraph.update, {updated} moved: {best * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
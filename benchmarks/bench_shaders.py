@@ -0,0 +1,68 @@
+"""
+Measure cold and warm start compile times of the built-in shader variants.
+
+Every run is a fresh process: the cold start with empty program and driver shader
+caches, the warm start reusing both. The driver cache is Mesa's, see
+``MESA_SHADER_CACHE_DIR``; other drivers keep theirs elsewhere.
+
+Usage: python benchmarks/bench_shaders.py [runs]
+"""
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+VARIANTS = ('INSTANCED', 'FLAT_SHADING', 'CLUSTERED_LIGHTS')
+
+
+def compile_all(cache_dir):
+    from radiant import shader_library
+    from radiant.renderers.moderngl import create_standalone_context
+    from radiant.renderers.programs import ProgramCache
+    from radiant.renderers.resources import ResourceManager
+
+    start = time.perf_counter()
+    resources = ResourceManager(create_standalone_context(), program_cache=ProgramCache(cache_dir))
+    context_seconds = time.perf_counter() - start
+    warmed = resources.warm_up()
+    warm_up_seconds = resources.stats['compile_seconds']
+    for count in range(len(VARIANTS) + 1):
+        for defines in itertools.combinations(VARIANTS, count):
+            resources.program(shader_library.load('meshphong', dict.fromkeys(defines, True)))
+    for defines in ({}, {'INSTANCED': True}):
+        resources.program(shader_library.load('meshbasic', defines))
+    resources.save()
+    print(json.dumps({
+        'context': context_seconds,
+        'warmed': warmed,
+        'warm_up': warm_up_seconds,
+        'compiled': resources.stats['programs_compiled'],
+        'compile': resources.stats['compile_seconds'],
+    }))
+
+
+def run(cache_dir, env):
+    output = subprocess.run([sys.executable, __file__, '--child', cache_dir], env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main(runs=3):
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, MESA_SHADER_CACHE_DIR=os.path.join(tmp, 'mesa'))
+            env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env.get('PYTHONPATH')]))
+            cache_dir = os.path.join(tmp, 'programs')
+            for label in ('cold', 'warm'):
+                result = run(cache_dir, env)
+                print(f"{label}: {result['compiled']:2d} programs in {result['compile'] * 1000:7.1f} ms, "
+                      f"{result['warmed']:2d} of them up front in {result['warm_up'] * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--child']:
+        compile_all(sys.argv[2])
+    else:
+        main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,38 @@
+"""
+Measure the frame time of the `SoftwareRenderer` on the dragon model.
+
+Usage: python benchmarks/bench_software.py [size] [repeat]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+import radiant
+from radiant.renderers.software import SoftwareRenderer
+
+
+def main(size=256, repeat=5):
+    with open(os.path.join(os.path.dirname(__file__), "..", "examples", "resources", "dragon.obj")) as fh:
+        geometry = radiant.load_obj_indexed(fh)
+    scene = radiant.Scene()
+    scene.append_child(radiant.Mesh(geometry, radiant.MeshPhongMaterial(color=(0.3, 0.6, 0.2, 1.0), shininess=16.0)))
+    light = radiant.PointLight(position=[5, 10, 10])
+    scene.append_child(light)
+    camera = radiant.PerspectiveCamera(position=[0, 4, 12], target=[0, 2, 0], up=[0, 1, 0], aspect=1)
+    print(f"{len(geometry.index)} triangles, {size}x{size}")
+
+    for workers in sorted({1, os.cpu_count()}):
+        renderer = SoftwareRenderer(size=(size, size), workers=workers)
+        times = []
+        for angle in np.linspace(0, np.pi, repeat):
+            camera.look_at([12 * np.sin(angle), 4, 12 * np.cos(angle)], [0, 2, 0])
+            start = time.perf_counter()
+            renderer.render(scene, camera, light=light)
+            times.append(time.perf_counter() - start)
+        print(f"{workers} thread(s): {min(times) * 1000:.0f} ms/frame, {1 / min(times):.1f} frames/s")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,467 @@
+"""
+Benchmark suite with scalable synthetic workloads and a regression check.
+
+Every benchmark runs at a series of sizes. Wall time is the best of a number of
+repeats; peak memory is traced with `tracemalloc` in a separate run, so tracing
+does not skew the timings. Renderers also report their draw call counters.
+
+Usage:
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --baseline results.json --threshold 0.25
+    python benchmarks/suite.py --quick --filter 'scene_graph*'
+
+With a baseline, results are compared and the exit status is 1 when a benchmark
+got slower, or used more memory, by more than the threshold.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench_load_obj import write_grid_obj
+import numpy as np
+import pyrr
+
+import radiant
+
+
+# name -> (function, sizes, quick sizes)
+BENCHMARKS = {}
+
+
+def benchmark(sizes, quick_sizes):
+    """
+    Register a benchmark.
+
+    The function takes a size, does its setup and returns the callable to measure.
+    That callable may return a dict of counters, which is recorded with the timings.
+    """
+    def register(func):
+        BENCHMARKS[func.__name__] = (func, sizes, quick_sizes)
+        return func
+    return register
+
+
+@benchmark(sizes=[16, 64, 256, 1024], quick_sizes=[16, 64])
+def plane_geometry(segments):
+    """PlaneGeometry with segments x segments quads."""
+    def run():
+        radiant.PlaneGeometry(width_segments=segments, height_segments=segments)
+    return run
+
+
+# generators of PlaneGeometry's family, by the number of segments along each side
+GENERATORS = {
+    'box': lambda n: radiant.BoxGeometry(width_segments=n, height_segments=n, depth_segments=n),
+    'sphere': lambda n: radiant.SphereGeometry(width_segments=2 * n, height_segments=n),
+    'cylinder': lambda n: radiant.CylinderGeometry(radial_segments=n, height_segments=n),
+    'torus': lambda n: radiant.TorusGeometry(radial_segments=n, tubular_segments=2 * n),
+    'extrusion': lambda n: radiant.ExtrusionGeometry(
+        np.stack([np.cos(np.linspace(0, 2 * np.pi, 4 * n, endpoint=False)), np.sin(np.linspace(0, 2 * np.pi, 4 * n, endpoint=False))], axis=1),
+        steps=n),
+}
+
+
+@benchmark(sizes=[16, 64, 256, 512], quick_sizes=[16, 64])
+def geometry_generators(segments):
+    """Every parametric geometry generator at the given number of segments."""
+    def run():
+        return {name: len(generator(segments).index) for name, generator in GENERATORS.items()}
+    return run
+
+
+@benchmark(sizes=[1000, 10000], quick_sizes=[1000])
+def geometry_pool(n_meshes):
+    """Meshes of a few shared primitives, through Geometry.shared."""
+    material = radiant.MeshBasicMaterial()
+
+    def run():
+        radiant.geometry_pool.clear()
+        meshes = [radiant.Mesh(radiant.SphereGeometry.shared(radius=1 + i % 4), material) for i in range(n_meshes)]
+        return {'geometries': len({id(mesh.geometry) for mesh in meshes})}
+    return run
+
+
+def _deep_tree(n_nodes):
+    root = node = radiant.Scene()
+    for _ in range(n_nodes - 1):
+        child = radiant.Object3D(position=(0, 0.1, 0), rotation=(0, 0.1, 0))
+        node.append_child(child)
+        node = child
+    return root
+
+
+def _wide_tree(n_nodes, branching=8):
+    nodes = [radiant.Scene()]
+    for i in range(1, n_nodes):
+        node = radiant.Object3D(position=(i % 7, 0, 0), rotation=(0, 0.1 * i, 0))
+        nodes[(i - 1) // branching].append_child(node)
+        nodes.append(node)
+    return nodes[0]
+
+
+def _touch_all(root):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        node.dirty = True
+        stack.extend(node.children)
+
+
+@benchmark(sizes=[100, 500, 900], quick_sizes=[100])
+def scene_graph_deep(n_nodes):
+    """update_subtree of a chain of nodes, after invalidating all of them."""
+    root = _deep_tree(n_nodes)
+
+    def run():
+        root.dirty = True
+        return {'updated': root.update_subtree()}
+    return run
+
+
+@benchmark(sizes=[1000, 10000], quick_sizes=[1000])
+def scene_graph_wide(n_nodes):
+    """update_subtree of a tree with branching factor 8, after invalidating all nodes."""
+    root = _wide_tree(n_nodes)
+
+    def run():
+        _touch_all(root)
+        return {'updated': root.update_subtree()}
+    return run
+
+
+@benchmark(sizes=[1000, 10000, 100000], quick_sizes=[1000])
+def transform_graph_wide(n_nodes):
+    """TransformGraph.update of a tree with branching factor 8, all nodes dirty."""
+    graph = radiant.TransformGraph(_wide_tree(n_nodes))
+
+    def run():
+        graph.mark_dirty()
+        return {'updated': graph.update()}
+    return run
+
+
+def _transforms(n):
+    rng = np.random.default_rng(0)
+    rotations = rng.normal(size=(n, 4))
+    rotations /= np.linalg.norm(rotations, axis=1, keepdims=True)
+    return rng.uniform(-5, 5, (n, 3)), rotations, rng.uniform(0.5, 2, (n, 3)), rng.uniform(-5, 5, (n, 3))
+
+
+@benchmark(sizes=[1, 100, 10000], quick_sizes=[1, 100])
+def transforms_batched(n):
+    """Compose, decompose, normal matrices, quaternion products and views of N transforms with radiant.maths."""
+    positions, rotations, scales, targets = _transforms(n)
+    models, products = np.empty((n, 4, 4)), np.empty((n, 4))
+    decomposed = np.empty((n, 3)), np.empty((n, 4)), np.empty((n, 3))
+
+    def run():
+        radiant.maths.compose(positions, rotations, scales, out=models)
+        radiant.maths.normal_matrix(models)
+        radiant.maths.decompose(models, out=decomposed)
+        radiant.maths.quaternion_multiply(rotations, decomposed[1], out=products)
+        radiant.maths.look_at(positions, targets, [0, 1, 0])
+    return run
+
+
+@benchmark(sizes=[1, 100, 1000], quick_sizes=[1, 100])
+def transforms_pyrr(n):
+    """The work of transforms_batched, one transform at a time with pyrr, as the scene did before."""
+    positions, rotations, scales, targets = _transforms(n)
+
+    def run():
+        for position, rotation, scale, target in zip(positions, rotations, scales, targets):
+            model = pyrr.Matrix44.from_translation(position) * pyrr.Matrix44.from_quaternion(rotation) * pyrr.Matrix44.from_scale(scale)
+            np.linalg.inv(model).T
+            linear = np.asarray(model)[:3, :3]
+            decomposed = pyrr.Quaternion.from_matrix(linear / np.linalg.norm(linear, axis=0))
+            pyrr.quaternion.cross(rotation, decomposed)
+            pyrr.Matrix44.look_at(position, target, [0, 1, 0])
+    return run
+
+
+def _animated_graph(n_nodes, n_keys=30):
+    graph = radiant.TransformGraph(_wide_tree(n_nodes))
+    nodes = graph.nodes[1:]
+    rng = np.random.default_rng(0)
+    times = np.linspace(0, 1, n_keys)
+    positions = rng.uniform(-1, 1, (len(nodes), n_keys, 3))
+    angles = rng.uniform(-np.pi, np.pi, (len(nodes), n_keys, 1)) / 2
+    rotations = np.concatenate([np.zeros_like(angles), np.sin(angles), np.zeros_like(angles), np.cos(angles)], axis=2)
+    return graph, nodes, times, positions, rotations
+
+
+@benchmark(sizes=[1000, 10000, 100000], quick_sizes=[1000])
+def animation_mixer(n_nodes):
+    """AnimationMixer.update and TransformGraph.update of position and rotation tracks on every node."""
+    graph, nodes, times, positions, rotations = _animated_graph(n_nodes)
+    mixer = radiant.AnimationMixer(graph)
+    mixer.play(radiant.AnimationClip.from_arrays(nodes, 'position', times, positions))
+    mixer.play(radiant.AnimationClip.from_arrays(nodes, 'rotation', times, rotations))
+
+    def run():
+        animated = mixer.update(1 / 60)
+        return {'animated': animated, 'updated': graph.update()}
+    return run
+
+
+@benchmark(sizes=[1000, 10000], quick_sizes=[1000])
+def animation_setters(n_nodes):
+    """The same as animation_mixer through the Object3D setters, with keyframes already sampled."""
+    graph, nodes, times, positions, rotations = _animated_graph(n_nodes)
+    position, rotation = positions[:, 1], rotations[:, 1]
+
+    def run():
+        for node, p, r in zip(nodes, position, rotation):
+            node.position = p
+            node.rotation = r
+        return {'animated': len(nodes), 'updated': graph.update()}
+    return run
+
+
+def _obj_benchmark(loader, n_faces):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "grid.obj")
+    with open(path, mode="wb") as fh:
+        write_grid_obj(fh, n_faces)
+
+    def run():
+        with open(path, mode="r") as fh:
+            geometry = loader(fh)
+        return {'vertices': len(geometry.attributes['pos'])}
+    run.cleanup = lambda: (os.remove(path), os.rmdir(directory))
+    return run
+
+
+@benchmark(sizes=[1000, 10000, 100000], quick_sizes=[1000])
+def load_obj(n_faces):
+    """load_obj of a generated grid OBJ file."""
+    return _obj_benchmark(radiant.load_obj, n_faces)
+
+
+@benchmark(sizes=[1000, 10000, 100000, 1000000], quick_sizes=[1000, 10000])
+def load_obj_indexed(n_faces):
+    """load_obj_indexed of a generated grid OBJ file."""
+    return _obj_benchmark(radiant.load_obj_indexed, n_faces)
+
+
+@benchmark(sizes=[10000, 100000, 1000000], quick_sizes=[10000])
+def optimize_vertex_cache(n_triangles):
+    """optimize_vertex_cache of a PlaneGeometry with about n_triangles triangles."""
+    segments = int(np.sqrt(n_triangles / 2))
+    geometry = radiant.PlaneGeometry(width_segments=segments, height_segments=segments)
+    _, (before, after) = radiant.optimize_vertex_cache(geometry, return_acmr=True)
+
+    def run():
+        radiant.optimize_vertex_cache(geometry)
+        return {'acmr_before': round(before, 3), 'acmr_after': round(after, 3)}
+    return run
+
+
+def _mesh_grid(n_meshes, n_materials=4):
+    scene = radiant.Scene()
+    geometry = radiant.PlaneGeometry(width=0.8, height=0.8, width_segments=4, height_segments=4)
+    materials = [radiant.MeshPhongMaterial(color=(i / n_materials, 0.5, 0.5, 1.0)) for i in range(n_materials)]
+    side = int(np.ceil(np.sqrt(n_meshes)))
+    for i in range(n_meshes):
+        position = (i % side - side / 2, i // side - side / 2, 0)
+        scene.append_child(radiant.Mesh(geometry, materials[i % n_materials], position=position))
+    light = radiant.PointLight(position=(0, 0, side))
+    camera = radiant.PerspectiveCamera(position=(0, 0, side * 1.5), target=(0, 0, 0), up=(0, 1, 0), aspect=1)
+    return scene, camera, light
+
+
+def _moderngl_benchmark(n_meshes, **kwargs):
+    from radiant.renderers.moderngl import create_standalone_context, ModernGLRenderer
+
+    ctx = create_standalone_context()
+    renderer = ModernGLRenderer(ctx, **kwargs)
+    scene, camera, light = _mesh_grid(n_meshes)
+    fbo = ctx.framebuffer(ctx.renderbuffer((256, 256)), ctx.depth_renderbuffer((256, 256)))
+    fbo.use()
+
+    def run():
+        # move the camera, so per-frame work is not skipped by the caches
+        camera.position = np.asarray(camera.position) + (0.01, 0, 0)
+        renderer.render(scene, camera, light=light)
+        return {key: renderer.stats[key] for key in ('draw_calls', 'program_binds', 'uniform_writes', 'uniform_block_binds')}
+    return run
+
+
+@benchmark(sizes=[10, 100, 1000, 10000], quick_sizes=[10, 100])
+def render_moderngl(n_meshes):
+    """ModernGLRenderer.render of a grid of meshes into a 256x256 offscreen framebuffer."""
+    return _moderngl_benchmark(n_meshes)
+
+
+@benchmark(sizes=[10, 100, 1000], quick_sizes=[10, 100])
+def render_moderngl_single(n_meshes):
+    """The same as render_moderngl without instancing, so every mesh is a draw call of its own."""
+    return _moderngl_benchmark(n_meshes, instancing_threshold=float('inf'))
+
+
+def _light_benchmark(n_lights, light_clusters):
+    from radiant.renderers.moderngl import create_standalone_context, ModernGLRenderer
+
+    ctx = create_standalone_context()
+    renderer = ModernGLRenderer(ctx, light_clusters=light_clusters)
+    scene, camera, _ = _mesh_grid(100)
+    rng = np.random.default_rng(0)
+    lights = [
+        radiant.PointLight(position=position, color=color, intensity=0.2, distance=1.5)
+        for position, color in zip(rng.uniform([-5, -5, 0.2], [5, 5, 1.5], (n_lights, 3)), rng.uniform(0, 1, (n_lights, 3)))
+    ]
+    fbo = ctx.framebuffer(ctx.renderbuffer((512, 512)), ctx.depth_renderbuffer((512, 512)))
+    fbo.use()
+
+    def run():
+        camera.position = np.asarray(camera.position) + (0.01, 0, 0)
+        renderer.render(scene, camera, lights=lights)
+        return {key: renderer.stats[key] for key in ('light_assignments', 'max_cluster_lights')}
+    return run
+
+
+@benchmark(sizes=[16, 128, 1024, 4096], quick_sizes=[16, 128])
+def render_lights_clustered(n_lights):
+    """ModernGLRenderer.render of 100 meshes at 512x512, lit by point lights through 16x9x24 clusters."""
+    return _light_benchmark(n_lights, (16, 9, 24))
+
+
+@benchmark(sizes=[16, 128, 1024], quick_sizes=[16, 128])
+def render_lights_unclustered(n_lights):
+    """The same as render_lights_clustered with a single cluster, so every fragment loops over every light."""
+    return _light_benchmark(n_lights, (1, 1, 1))
+
+
+@benchmark(sizes=[10, 100, 1000], quick_sizes=[10])
+def render_software(n_meshes):
+    """SoftwareRenderer.render of a grid of meshes at 256x256."""
+    from radiant.renderers.software import SoftwareRenderer
+
+    renderer = SoftwareRenderer(size=(256, 256))
+    scene, camera, light = _mesh_grid(n_meshes)
+
+    def run():
+        renderer.render(scene, camera, light=light)
+        return {'triangles': renderer.stats['triangles']}
+    return run
+
+
+def measure(func, size, repeat):
+    """Run a benchmark at one size; returns its record."""
+    run = func(size)
+    try:
+        counters = run() or {}
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        if hasattr(run, 'cleanup'):
+            run.cleanup()
+    return {
+        'seconds': min(times),
+        'mean_seconds': sum(times) / len(times),
+        'peak_bytes': peak,
+        'counters': counters,
+    }
+
+
+def run_suite(pattern='*', quick=False, repeat=5):
+    results = {}
+    for name, (func, sizes, quick_sizes) in BENCHMARKS.items():
+        if not fnmatch.fnmatch(name, pattern):
+            continue
+        for size in (quick_sizes if quick else sizes):
+            key = f"{name}[{size}]"
+            try:
+                results[key] = measure(func, size, repeat)
+            except ImportError as e:
+                # optional dependency, e.g. the ModernGL backend
+                print(f"{key:36s} skipped: {e}")
+                break
+            record = results[key]
+            print(f"{key:36s} {record['seconds'] * 1000:10.2f} ms {record['peak_bytes'] / 2**20:9.2f} MiB  {record['counters']}")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results against a baseline.
+
+    Returns
+    -------
+    list of str
+        Descriptions of the regressions.
+    """
+    regressions = []
+    print(f"\n{'benchmark':36s} {'time':>8s} {'memory':>8s}")
+    for key, record in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        time_ratio = record['seconds'] / base['seconds'] if base['seconds'] else 1.0
+        memory_ratio = record['peak_bytes'] / base['peak_bytes'] if base['peak_bytes'] else 1.0
+        flags = []
+        if time_ratio > 1 + threshold:
+            flags.append('slower')
+            regressions.append(f"{key} is {time_ratio:.2f}x slower")
+        if memory_ratio > 1 + threshold:
+            flags.append('more memory')
+            regressions.append(f"{key} uses {memory_ratio:.2f}x more memory")
+        changed = {k: (base['counters'].get(k), v) for k, v in record['counters'].items() if base['counters'].get(k) != v}
+        if changed:
+            flags.append(f"counters {changed}")
+        print(f"{key:36s} {time_ratio:7.2f}x {memory_ratio:7.2f}x  {' '.join(flags)}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="compare against the results in this JSON file")
+    parser.add_argument('--threshold', type=float, default=0.2, help="relative slowdown counted as a regression")
+    parser.add_argument('--filter', default='*', help="only run benchmarks matching this pattern")
+    parser.add_argument('--quick', action='store_true', help="only run the smaller sizes")
+    parser.add_argument('--repeat', type=int, default=5, help="number of timed runs per size")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.filter, quick=args.quick, repeat=args.repeat)
+    if args.output:
+        with open(args.output, mode="w") as fh:
+            json.dump({
+                'meta': {
+                    'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'python': platform.python_version(),
+                    'numpy': np.__version__,
+                    'platform': platform.platform(),
+                    'radiant': radiant.__version__,
+                },
+                'results': results,
+            }, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, mode="r") as fh:
+            baseline = json.load(fh)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("\nregressions:\n  " + "\n  ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,14 +6,14 @@ import radiant
 def generate_scene():
     scene = radiant.Scene()
 
-    # load a cool mesh
+    # load a cool mesh; warm starts map the cached binary geometry instead of parsing
     with open("examples/resources/dragon.obj", mode="r") as fh:
-        dragon_geometry = radiant.load_obj(fh)
+        dragon_geometry = radiant.load_obj(fh, cache="examples/.cache")
 
-    # put up a mesh somewhere
+    # put up a mesh somewhere, simplified when it covers only a small part of the screen
     red = radiant.MeshPhongMaterial(color=(0.1, 0.5, 0.3, 1.0), shininess=16.0)
-    plane = radiant.Mesh(dragon_geometry, red)
-    scene.append_child(plane)
+    dragon = radiant.LOD.from_geometries(radiant.lod_chain(dragon_geometry, levels=4), red)
+    scene.append_child(dragon)
 
     # create a camera
     camera = radiant.PerspectiveCamera(position=[-5, 2, -5], target=[0, 0, 0], near=0.1, far=15.0)
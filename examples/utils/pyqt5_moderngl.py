@@ -1,7 +1,7 @@
 import signal
 import sys
 
-import ModernGL
+import moderngl
 from PyQt5.QtGui import QGuiApplication, QOpenGLWindow, QSurfaceFormat
 
 from radiant.renderers.moderngl import ModernGLRenderer
@@ -21,7 +21,7 @@ class GLWindow(QOpenGLWindow):
         self.scene, self.camera, self.light = scene, camera, light
 
     def initializeGL(self):
-        self.ctx = ModernGL.create_context()
+        self.ctx = moderngl.create_context()
         self.renderer = ModernGLRenderer(self.ctx)
 
     def resizeGL(self, width, height):
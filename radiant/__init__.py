@@ -3,10 +3,18 @@
 from .geometries import *
 from .materials import *
 from .scenes import *
+from .graphs import *
+from .animation import *
+from .simplify import *
+from .optimize import *
+from .packing import *
+from .bvh import *
 from .cameras import *
 from .renderers import *
 from .loaders import *
 from .lights import *
+from .clusters import *
+from .shaderlib import *
 from . import maths
 
 __version__ = '0.1.0'
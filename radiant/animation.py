@@ -0,0 +1,346 @@
+from collections import namedtuple
+
+import numpy as np
+
+from .maths import quaternion_slerp
+
+
+__all__ = ('KeyframeTrack', 'AnimationClip', 'AnimationAction', 'AnimationMixer')
+
+
+# components of the transform arrays of TransformGraph
+PATHS = {'position': 3, 'rotation': 4, 'scale': 3}
+INTERPOLATIONS = ('linear', 'step')
+
+
+KeyframeTrack = namedtuple('KeyframeTrack', ['target', 'path', 'times', 'values', 'interpolation'], defaults=['linear'])
+KeyframeTrack.__doc__ = """
+Keyframes of one transform component of a node.
+
+Parameters
+----------
+target : Object3D
+path : str
+    'position', 'rotation' or 'scale'.
+times : (K,) array
+    Increasing keyframe times, in seconds.
+values : (K, 3) or (K, 4) array
+    Values at the keyframes; rotations are quaternions in (x, y, z, w) order.
+interpolation : str
+    'linear' (spherical for rotations) or 'step'.
+"""
+
+
+class _Channel:
+    """
+    Tracks of one path, packed into flat arrays.
+
+    Keyframes of track ``i`` are the rows ``offsets[i]:offsets[i + 1]`` of `times` and
+    `values`. Every track is shifted by ``i * stride`` in `keys`, so the keyframes of
+    all tracks can be looked up with a single ``searchsorted``; tracks sharing their
+    keyframe times, the common case, need only one scalar lookup.
+    """
+
+    def __init__(self, path, targets, times, values, offsets, step):
+        self.path = path
+        self.targets = targets
+        self.times = times
+        self.values = values
+        self.offsets = offsets
+        self.step = step
+        counts = np.diff(offsets)
+        self.first, self.last = offsets[:-1], offsets[1:] - 1
+        self.stride = (times.max() - times.min() + 1) if len(times) else 1.0
+        self.shift = np.arange(len(targets)) * self.stride
+        self.keys = times + np.repeat(self.shift, counts)
+        self.shared = None
+        if len(counts) and (counts == counts[0]).all():
+            grid = times.reshape((len(counts), counts[0]))
+            if (grid == grid[0]).all():
+                self.shared = grid[0]
+
+    def __len__(self):
+        return len(self.targets)
+
+    def sample(self, time):
+        """Values of all tracks at the given time, as a (T, C) array."""
+        if self.shared is not None:
+            return self._sample_shared(time)
+        # the keyframe before `time`, clamped to the first segment of every track
+        queries = np.clip(time, self.times[self.first], self.times[self.last]) + self.shift
+        lower = np.searchsorted(self.keys, queries, side='right') - 1
+        lower = np.clip(lower, self.first, np.maximum(self.last - 1, self.first))
+        upper = np.minimum(lower + 1, self.last)
+        span = self.times[upper] - self.times[lower]
+        alpha = np.divide(queries - self.keys[lower], span, out=np.zeros_like(span), where=span > 0)
+        # step tracks hold the value of the last keyframe reached
+        alpha[self.step] = alpha[self.step] >= 1
+        alpha = np.clip(alpha, 0, 1).astype(self.values.dtype)
+
+        return self._interpolate(self.values[lower], self.values[upper], alpha)
+
+    def _sample_shared(self, time):
+        times = self.shared
+        lower = min(max(int(np.searchsorted(times, time, side='right')) - 1, 0), max(len(times) - 2, 0))
+        upper = min(lower + 1, len(times) - 1)
+        span = times[upper] - times[lower]
+        alpha = min(max((time - times[lower]) / span, 0), 1) if span > 0 else 0.0
+        alpha = np.full(len(self), alpha, dtype=self.values.dtype)
+        alpha[self.step] = alpha[self.step] >= 1
+        values = self.values.reshape((len(self), len(times), -1))
+        return self._interpolate(values[:, lower], values[:, upper], alpha)
+
+    def _interpolate(self, start, end, alpha):
+        if self.path == 'rotation':
+            return quaternion_slerp(start, end, alpha)
+        return start + (end - start) * alpha[:, None]
+
+
+class AnimationClip:
+    """
+    Keyframe tracks animating the transforms of a set of nodes.
+
+    The tracks of every path are packed into contiguous arrays and sampled all at
+    once, see `AnimationMixer`.
+
+    Parameters
+    ----------
+    tracks : iterable of KeyframeTrack
+    name : str, optional
+    duration : float, optional
+        Defaults to the time of the last keyframe.
+    """
+
+    def __init__(self, tracks, name=None, duration=None):
+        self.name = name
+        grouped = {path: [] for path in PATHS}
+        for track in tracks:
+            if track.path not in PATHS:
+                raise ValueError(f"unknown track path {track.path!r}, expected one of {tuple(PATHS)}")
+            if track.interpolation not in INTERPOLATIONS:
+                raise ValueError(f"unknown interpolation {track.interpolation!r}, expected one of {INTERPOLATIONS}")
+            times = np.asarray(track.times, dtype='f8').ravel()
+            values = np.asarray(track.values, dtype='f4').reshape((len(times), PATHS[track.path]))
+            if not len(times):
+                raise ValueError("tracks need at least one keyframe")
+            if (np.diff(times) < 0).any():
+                raise ValueError("keyframe times must be increasing")
+            grouped[track.path].append((track.target, times, values, track.interpolation == 'step'))
+
+        self.channels = {}
+        for path, group in grouped.items():
+            if not group:
+                continue
+            targets, times, values, step = zip(*group)
+            offsets = np.concatenate([[0], np.cumsum([len(t) for t in times])])
+            self.channels[path] = _Channel(path, list(targets), np.concatenate(times), np.concatenate(values), offsets, np.array(step))
+        if duration is None:
+            duration = max((channel.times.max() for channel in self.channels.values()), default=0.0)
+        self.duration = float(duration)
+
+    @classmethod
+    def from_arrays(cls, targets, path, times, values, interpolation='linear', name=None, duration=None):
+        """
+        Clip of one path of many nodes sharing their keyframe times.
+
+        Parameters
+        ----------
+        targets : sequence of Object3D
+        path : str
+        times : (K,) array
+        values : (T, K, C) array
+            Values of every target at every keyframe.
+        interpolation : str
+        name : str, optional
+        duration : float, optional
+        """
+        values = np.asarray(values, dtype='f4')
+        if values.shape[:2] != (len(targets), len(times)):
+            raise ValueError(f"expected values of shape ({len(targets)}, {len(times)}, C), got {values.shape}")
+        return cls([KeyframeTrack(target, path, times, value, interpolation) for target, value in zip(targets, values)], name=name, duration=duration)
+
+    @property
+    def targets(self):
+        """Distinct nodes animated by the clip."""
+        return list({id(node): node for channel in self.channels.values() for node in channel.targets}.values())
+
+    def sample(self, time):
+        """
+        Sample every track.
+
+        Parameters
+        ----------
+        time : float
+
+        Returns
+        -------
+        dict
+            Path to (T, C) array of values, in the order of the targets of each channel.
+        """
+        return {path: channel.sample(time) for path, channel in self.channels.items()}
+
+
+class AnimationAction:
+    """
+    Playback state of a clip in an `AnimationMixer`.
+
+    Attributes
+    ----------
+    clip : AnimationClip
+    time : float
+        Local time in the clip, in seconds.
+    weight : float
+        Influence on the animated nodes, blended with other actions and the rest pose.
+    speed : float
+        Time scale; negative to play backwards.
+    loop : bool
+        Wrap around at the end of the clip, else hold the last frame.
+    paused : bool
+    """
+
+    def __init__(self, mixer, clip, weight=1.0, speed=1.0, loop=True):
+        self.mixer = mixer
+        self.clip = clip
+        self.time = 0.0
+        self.weight = weight
+        self.speed = speed
+        self.loop = loop
+        self.paused = False
+        # rest pose of the targets, blended in for weights below 1
+        self.rest = {
+            path: getattr(mixer.graph, path)[mixer.rows(channel.targets)].copy()
+            for path, channel in clip.channels.items()
+        }
+
+    def advance(self, dt):
+        if self.paused:
+            return
+        self.time += dt * self.speed
+        duration = self.clip.duration
+        if self.loop and duration > 0:
+            self.time %= duration
+        else:
+            self.time = min(max(self.time, 0.0), duration)
+
+    def stop(self):
+        """Remove the action from its mixer."""
+        self.mixer.actions.remove(self)
+
+
+class AnimationMixer:
+    """
+    Plays animation clips on the nodes of a `TransformGraph`.
+
+    Every update samples all the tracks of the active actions at once, blends
+    them and writes the results straight into the transform arrays of the graph,
+    marking the animated rows dirty in a single call; the world matrices follow
+    on the next `TransformGraph.update`.
+
+    Parameters
+    ----------
+    graph : TransformGraph
+        Graph holding the animated nodes.
+
+    Attributes
+    ----------
+    actions : list of AnimationAction
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.actions = []
+        self._nodes = None
+        self._rows = {}
+
+    def rows(self, targets):
+        """Rows of the given nodes in the graph."""
+        graph = self.graph
+        if graph._structure_changed:
+            graph.rebuild()
+        if self._nodes is not graph.nodes:
+            self._nodes, self._rows = graph.nodes, {}
+        key = id(targets)
+        cached = self._rows.get(key)
+        if cached is None or cached[0] is not targets:
+            if any(node._graph is not graph for node in targets):
+                raise ValueError("animated nodes must belong to the graph of the mixer")
+            cached = self._rows[key] = (targets, np.array([node._row for node in targets], dtype='i8'))
+        return cached[1]
+
+    def play(self, clip, weight=1.0, speed=1.0, loop=True):
+        """
+        Start playing a clip.
+
+        Returns
+        -------
+        AnimationAction
+        """
+        action = AnimationAction(self, clip, weight=weight, speed=speed, loop=loop)
+        self.actions.append(action)
+        return action
+
+    def update(self, dt):
+        """
+        Advance all actions and write the animated transforms to the graph.
+
+        Parameters
+        ----------
+        dt : float
+            Elapsed time, in seconds.
+
+        Returns
+        -------
+        int
+            Number of animated rows.
+        """
+        for action in self.actions:
+            action.advance(dt)
+        active = [action for action in self.actions if action.weight > 0 and action.clip.channels]
+        if not active:
+            return 0
+
+        graph = self.graph
+        animated = []
+        for path in PATHS:
+            contributions = [
+                (self.rows(action.clip.channels[path].targets), action.clip.channels[path].sample(action.time), action.weight, action.rest[path])
+                for action in active if path in action.clip.channels
+            ]
+            if not contributions:
+                continue
+            array = getattr(graph, path)
+            if len(contributions) == 1 and contributions[0][2] >= 1:
+                rows, values, _, _ = contributions[0]
+                array[rows] = values
+            else:
+                rows = self._blend(array, path, contributions)
+            animated.append(rows)
+
+        rows = np.unique(np.concatenate(animated))
+        graph.mark_dirty(rows)
+        return len(rows)
+
+    @staticmethod
+    def _blend(array, path, contributions):
+        """Weighted average of the contributions and, for weights summing below 1, the rest pose."""
+        rows = np.concatenate([rows for rows, _, _, _ in contributions])
+        values = np.concatenate([values for _, values, _, _ in contributions]).astype('f8')
+        weights = np.concatenate([np.full(len(rows), weight) for rows, _, weight, _ in contributions])
+        rest = np.zeros(array.shape, dtype='f8')
+        for action_rows, _, _, action_rest in contributions:
+            rest[action_rows] = action_rest
+        if path == 'rotation':
+            # q and -q are the same rotation; align them before averaging
+            values[(values * rest[rows]).sum(axis=1) < 0] *= -1
+
+        touched, inverse = np.unique(rows, return_inverse=True)
+        total = np.bincount(inverse, weights=weights, minlength=len(touched))
+        blended = np.stack([
+            np.bincount(inverse, weights=values[:, i] * weights, minlength=len(touched)) for i in range(values.shape[1])
+        ], axis=1)
+        blended += rest[touched] * np.maximum(1 - total, 0)[:, None]
+        blended /= np.maximum(total, 1)[:, None]
+        if path == 'rotation':
+            blended /= np.linalg.norm(blended, axis=1, keepdims=True)
+        array[touched] = blended
+        return touched
@@ -0,0 +1,421 @@
+import collections
+import weakref
+
+import numpy as np
+
+from .maths import affine_inverse, transform_boxes
+from .packing import PackedGeometry
+from .scenes import Mesh
+
+
+__all__ = ('BVH', 'TriangleBVH', 'SceneBVH', 'RayHits', 'triangle_bvh')
+
+
+# nearest hit of every ray; mesh and triangle are -1 and distance inf for a miss
+RayHits = collections.namedtuple('RayHits', ['distance', 'mesh', 'triangle'])
+
+
+def _spread_bits(x):
+    """Insert two zero bits between each of the lower 10 bits of x."""
+    x = x.astype('u4') & 0x3ff
+    x = (x | (x << 16)) & 0x030000ff
+    x = (x | (x << 8)) & 0x0300f00f
+    x = (x | (x << 4)) & 0x030c30c3
+    x = (x | (x << 2)) & 0x09249249
+    return x
+
+
+def morton_codes(points):
+    """30 bit Morton codes of points, quantized within their bounding box."""
+    lower, upper = points.min(axis=0), points.max(axis=0)
+    extent = np.where(upper > lower, upper - lower, 1)
+    q = ((points - lower) / extent * 1023).astype('u4')
+    return (_spread_bits(q[:, 0]) << 2) | (_spread_bits(q[:, 1]) << 1) | _spread_bits(q[:, 2])
+
+
+def ray_box_distances(origins, inv_directions, lower, upper):
+    """
+    Slab test of rays against boxes, pairwise.
+
+    Returns
+    -------
+    tuple
+        Entry and exit distances; a ray hits a box if ``entry <= exit``.
+    """
+    with np.errstate(invalid='ignore', over='ignore'):
+        t1 = (lower - origins) * inv_directions
+        t2 = (upper - origins) * inv_directions
+    # fmin/fmax ignore the NaNs of rays parallel to, and starting on, a slab
+    entry = np.fmax(np.fmin(t1, t2).max(axis=1), 0)
+    exit = np.fmin(np.fmax(t1, t2).min(axis=1), np.inf)
+    return entry, exit
+
+
+class BVH:
+    """
+    Bounding volume hierarchy over axis aligned boxes.
+
+    Items are sorted along a Morton curve and grouped into leaves of `leaf_size`
+    items. The leaves form the bottom level of a complete binary tree stored in heap
+    order (the children of node ``i`` are ``2i + 1`` and ``2i + 2``), so building,
+    refitting and querying all work level by level on whole arrays.
+
+    Parameters
+    ----------
+    lower, upper : (N, 3) array
+        Bounds of the items.
+    leaf_size : int
+        Number of items per leaf.
+
+    Attributes
+    ----------
+    order : (N,) array
+        Item index of every position along the leaves.
+    lower, upper : (M, 3) array
+        Bounds of every node; empty nodes have inverted bounds.
+    """
+
+    def __init__(self, lower, upper, leaf_size=4):
+        self.leaf_size = leaf_size
+        self.item_lower = np.array(lower, dtype='f4').reshape((-1, 3))
+        self.item_upper = np.array(upper, dtype='f4').reshape((-1, 3))
+        n = len(self.item_lower)
+        self.n_leaves = 1 << max(-(-n // leaf_size) - 1, 0).bit_length()
+        self.depth = self.n_leaves.bit_length() - 1
+        if n:
+            self.order = np.argsort(morton_codes((self.item_lower + self.item_upper) / 2), kind='stable')
+        else:
+            self.order = np.empty(0, dtype='i8')
+        # leaf of every item
+        self.item_leaf = np.empty(n, dtype='i8')
+        self.item_leaf[self.order] = np.arange(n) // leaf_size
+        self.lower = np.full((2 * self.n_leaves - 1, 3), np.inf, dtype='f4')
+        self.upper = np.full((2 * self.n_leaves - 1, 3), -np.inf, dtype='f4')
+        self.refit()
+
+    def __len__(self):
+        return len(self.item_lower)
+
+    def _fit_leaves(self, leaves):
+        first = self.n_leaves - 1
+        starts = leaves * self.leaf_size
+        valid = starts < len(self)
+        leaves, starts = leaves[valid], starts[valid]
+        if not len(leaves):
+            return
+        # gather each leaf's items, padding short leaves with their first item
+        positions = starts[:, None] + np.arange(self.leaf_size)
+        positions = np.where(positions < len(self), positions, starts[:, None])
+        items = self.order[positions]
+        self.lower[first + leaves] = self.item_lower[items].min(axis=1)
+        self.upper[first + leaves] = self.item_upper[items].max(axis=1)
+
+    def refit(self, items=None):
+        """
+        Update the node bounds after `item_lower` / `item_upper` changed.
+
+        Parameters
+        ----------
+        items : array, optional
+            Indices of the items that changed; only their ancestors are refit.
+            All nodes are refit by default.
+        """
+        if items is None:
+            self._fit_leaves(np.arange(self.n_leaves))
+            for level in range(self.depth - 1, -1, -1):
+                nodes = np.arange((1 << level) - 1, (2 << level) - 1)
+                self.lower[nodes] = np.minimum(self.lower[2 * nodes + 1], self.lower[2 * nodes + 2])
+                self.upper[nodes] = np.maximum(self.upper[2 * nodes + 1], self.upper[2 * nodes + 2])
+        else:
+            leaves = np.unique(self.item_leaf[np.asarray(items)])
+            self._fit_leaves(leaves)
+            nodes = leaves + self.n_leaves - 1
+            for _ in range(self.depth):
+                nodes = np.unique((nodes - 1) // 2)
+                self.lower[nodes] = np.minimum(self.lower[2 * nodes + 1], self.lower[2 * nodes + 2])
+                self.upper[nodes] = np.maximum(self.upper[2 * nodes + 1], self.upper[2 * nodes + 2])
+        self.valid = (self.lower <= self.upper).all(axis=1)
+
+    def _traverse(self, n_queries, test):
+        """
+        Find all (query, item) pairs for which test(queries, lower, upper) holds.
+
+        The test is applied to nodes level by level, and finally to the items.
+        """
+        if not len(self):
+            return np.empty(0, dtype='i8'), np.empty(0, dtype='i8')
+        queries = np.arange(n_queries)
+        nodes = np.zeros(n_queries, dtype='i8')
+        for level in range(self.depth + 1):
+            keep = self.valid[nodes] & test(queries, self.lower[nodes], self.upper[nodes])
+            queries, nodes = queries[keep], nodes[keep]
+            if level < self.depth:
+                queries = np.repeat(queries, 2)
+                nodes = (2 * np.repeat(nodes, 2) + 1) + np.tile([0, 1], len(nodes))
+
+        # expand the leaves into their items
+        starts = (nodes - (self.n_leaves - 1)) * self.leaf_size
+        counts = np.clip(len(self) - starts, 0, self.leaf_size)
+        queries = np.repeat(queries, counts)
+        positions = np.repeat(starts, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        items = self.order[positions]
+        keep = test(queries, self.item_lower[items], self.item_upper[items])
+        return queries[keep], items[keep]
+
+    def query_box(self, lower, upper):
+        """
+        Indices of the items whose bounds overlap a box.
+        """
+        lower, upper = np.asarray(lower, dtype='f4'), np.asarray(upper, dtype='f4')
+        _, items = self._traverse(1, lambda _, lo, up: ((lo <= upper) & (up >= lower)).all(axis=1))
+        return np.sort(items)
+
+    def query_frustum(self, planes):
+        """
+        Indices of the items whose bounds intersect a frustum.
+
+        Parameters
+        ----------
+        planes : (6, 4) array
+            See `radiant.maths.frustum_planes`.
+        """
+        planes = np.asarray(planes)
+
+        def test(_, lo, up):
+            # the corner furthest along each plane normal must be inside
+            corners = np.where(planes[None, :, :3] >= 0, up[:, None, :], lo[:, None, :])
+            return ((corners * planes[:, :3]).sum(axis=2) + planes[:, 3] >= 0).all(axis=1)
+
+        _, items = self._traverse(1, test)
+        return np.sort(items)
+
+    def query_rays(self, origins, directions, max_distance=np.inf):
+        """
+        All (ray, item) pairs for which the ray hits the bounds of the item.
+
+        Returns
+        -------
+        tuple
+            Ray indices, item indices and the distances at which the rays enter the bounds.
+        """
+        origins = np.asarray(origins, dtype='f4').reshape((-1, 3))
+        directions = np.asarray(directions, dtype='f4').reshape((-1, 3))
+        with np.errstate(divide='ignore'):
+            inv_directions = 1 / directions
+
+        def test(rays, lo, up):
+            entry, exit = ray_box_distances(origins[rays], inv_directions[rays], lo, up)
+            return (entry <= exit) & (entry <= max_distance)
+
+        rays, items = self._traverse(len(origins), test)
+        distances, _ = ray_box_distances(origins[rays], inv_directions[rays], self.item_lower[items], self.item_upper[items])
+        return rays, items, distances
+
+
+class TriangleBVH(BVH):
+    """
+    BVH over the triangles of a `Geometry`, for exact ray hits in model space.
+    """
+
+    def __init__(self, geometry, leaf_size=4):
+        pos = np.asarray(geometry.attributes['pos'], dtype='f4')
+        if geometry.index is not None:
+            self.triangles = np.asarray(geometry.index).reshape((-1, 3))
+        else:
+            self.triangles = np.arange(len(pos) - len(pos) % 3).reshape((-1, 3))
+        self.corners = pos[self.triangles]
+        super().__init__(self.corners.min(axis=1), self.corners.max(axis=1), leaf_size=leaf_size)
+
+    def raycast(self, origins, directions, max_distance=np.inf):
+        """
+        Nearest triangle hit by every ray.
+
+        The distance is the ray parameter, in units of the length of the direction.
+
+        Returns
+        -------
+        tuple
+            (R,) distances (inf for a miss) and (R,) triangle indices (-1 for a miss).
+        """
+        origins = np.asarray(origins, dtype='f4').reshape((-1, 3))
+        directions = np.asarray(directions, dtype='f4').reshape((-1, 3))
+        distances = np.full(len(origins), np.inf, dtype='f4')
+        triangles = np.full(len(origins), -1, dtype='i8')
+
+        rays, items, _ = self.query_rays(origins, directions, max_distance)
+        t = intersect_triangles(origins[rays], directions[rays], self.corners[items])
+        hit = t <= max_distance
+        rays, items, t = rays[hit], items[hit], t[hit]
+        if len(rays):
+            # nearest hit per ray
+            order = np.lexsort((t, rays))
+            rays, items, t = rays[order], items[order], t[order]
+            first = np.concatenate([[True], rays[1:] != rays[:-1]])
+            distances[rays[first]] = t[first]
+            triangles[rays[first]] = items[first]
+        return distances, triangles
+
+
+def intersect_triangles(origins, directions, corners, epsilon=1e-7):
+    """
+    Moller-Trumbore intersection of rays with triangles, pairwise.
+
+    Returns
+    -------
+    (N,) array
+        Ray parameter of the hit, inf for a miss.
+    """
+    v0, v1, v2 = corners[:, 0], corners[:, 1], corners[:, 2]
+    edge1, edge2 = v1 - v0, v2 - v0
+    p = np.cross(directions, edge2)
+    det = (edge1 * p).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inv_det = 1 / det
+        s = origins - v0
+        u = (s * p).sum(axis=1) * inv_det
+        q = np.cross(s, edge1)
+        v = (directions * q).sum(axis=1) * inv_det
+        t = (edge2 * q).sum(axis=1) * inv_det
+    hit = (np.abs(det) > epsilon) & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    return np.where(hit, t, np.inf)
+
+
+_triangle_bvhs = weakref.WeakKeyDictionary()
+
+
+def triangle_bvh(geometry):
+    """
+    Get the `TriangleBVH` of a geometry; built on first use and cached with the geometry.
+    """
+    # packed geometries decode their positions on every access; their vertex buffer identifies them
+    source = geometry.vertices if isinstance(geometry, PackedGeometry) else geometry.attributes['pos']
+    bvh = _triangle_bvhs.get(geometry)
+    if bvh is None or bvh.source is not source:
+        bvh = _triangle_bvhs[geometry] = TriangleBVH(geometry)
+        bvh.source = source
+    return bvh
+
+
+class SceneBVH(BVH):
+    """
+    BVH over the world space bounds of the meshes below a scene node.
+
+    `update` refits the hierarchy for the meshes that moved since the last update,
+    detected through their transform versions. Call `rebuild` after meshes were
+    added or removed, or when refits degraded the hierarchy too much.
+
+    Parameters
+    ----------
+    root : Object3D
+    leaf_size : int
+
+    Attributes
+    ----------
+    meshes : list of Mesh
+        The mesh of every item index.
+    """
+
+    def __init__(self, root, leaf_size=4):
+        self.root = root
+        self._leaf_size = leaf_size
+        self.rebuild()
+
+    def rebuild(self):
+        """Collect the meshes and build the hierarchy from scratch."""
+        self.root.update_subtree()
+        meshes, stack = [], [self.root]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Mesh):
+                meshes.append(node)
+            stack.extend(reversed(node.children))
+        self.meshes = meshes
+        self.versions = np.array([node.version for node in meshes], dtype='i8')
+        lower, upper = self._world_bounds(meshes)
+        super().__init__(lower, upper, leaf_size=self._leaf_size)
+
+    @staticmethod
+    def _world_bounds(meshes):
+        if not meshes:
+            return np.empty((0, 3), dtype='f4'), np.empty((0, 3), dtype='f4')
+        boxes = [node.geometry.bounding_box for node in meshes]
+        return transform_boxes(
+            np.array([lower for lower, _ in boxes]),
+            np.array([upper for _, upper in boxes]),
+            np.stack([np.asarray(node.model) for node in meshes]),
+        )
+
+    def update(self):
+        """
+        Refit the hierarchy for the meshes that moved.
+
+        Returns
+        -------
+        int
+            Number of meshes that moved.
+        """
+        self.root.update_subtree()
+        versions = np.array([node.version for node in self.meshes], dtype='i8')
+        moved = np.flatnonzero(versions != self.versions)
+        if len(moved):
+            self.versions = versions
+            lower, upper = self._world_bounds([self.meshes[i] for i in moved])
+            self.item_lower[moved], self.item_upper[moved] = lower, upper
+            self.refit(moved)
+        return len(moved)
+
+    def query_box(self, lower, upper):
+        """Meshes whose world space bounds overlap a box."""
+        return [self.meshes[i] for i in super().query_box(lower, upper)]
+
+    def query_frustum(self, planes):
+        """Meshes whose world space bounds intersect a frustum, see `radiant.maths.frustum_planes`."""
+        return [self.meshes[i] for i in super().query_frustum(planes)]
+
+    def raycast(self, origins, directions, max_distance=np.inf):
+        """
+        Exact nearest hits of rays with the triangles of the meshes.
+
+        Candidate meshes come from the hierarchy; the rays are then transformed into
+        the model space of each candidate and tested against its `TriangleBVH`.
+
+        Parameters
+        ----------
+        origins, directions : (R, 3) array
+            World space rays; directions need not be normalized.
+
+        Returns
+        -------
+        RayHits
+            Per ray: the distance in units of the direction length, the index of the
+            mesh in `meshes` and the index of the triangle in its geometry.
+        """
+        origins = np.asarray(origins, dtype='f4').reshape((-1, 3))
+        directions = np.asarray(directions, dtype='f4').reshape((-1, 3))
+        distance = np.full(len(origins), np.inf, dtype='f4')
+        mesh = np.full(len(origins), -1, dtype='i8')
+        triangle = np.full(len(origins), -1, dtype='i8')
+
+        rays, items, entries = self.query_rays(origins, directions, max_distance)
+        # nearest candidates first, so far ones can be skipped once a ray hit something
+        order = np.argsort(entries, kind='stable')
+        rays, items, entries = rays[order], items[order], entries[order]
+        # meshes in the order of their nearest entry
+        _, first = np.unique(items, return_index=True)
+        for item in items[np.sort(first)]:
+            selected = items == item
+            candidates = rays[selected][entries[selected] <= distance[rays[selected]]]
+            if not len(candidates):
+                continue
+            node = self.meshes[item]
+            inverse = affine_inverse(np.asarray(node.model, dtype='f8'))
+            # row vectors: points get the translation, directions do not
+            local_origins = origins[candidates] @ inverse[:3, :3] + inverse[3, :3]
+            local_directions = directions[candidates] @ inverse[:3, :3]
+            t, tri = triangle_bvh(node.geometry).raycast(local_origins, local_directions, max_distance)
+            closer = t < distance[candidates]
+            candidates = candidates[closer]
+            distance[candidates] = t[closer]
+            mesh[candidates] = item
+            triangle[candidates] = tri[closer]
+        return RayHits(distance, mesh, triangle)
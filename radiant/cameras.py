@@ -1,6 +1,7 @@
 import numpy as np
 import pyrr
 
+from .maths import look_at, perspective
 from .scenes import Object3D
 
 
@@ -33,13 +34,12 @@ class Camera(Object3D):
         self._up = value
         self.dirty = True
 
-    def update(self):
-        if self.dirty:
-            self._view = pyrr.Matrix44.look_at(self._position, self._target, self._up, dtype='f4')
-        super().update()
+    def _on_update(self):
+        self._view = look_at(self._position, self._target, self._up).astype('f4', copy=False).view(pyrr.Matrix44)
+        super()._on_update()
 
     def look_at(self, eye, target, up=None):
-        self._position = eye
+        self._position[:] = eye
         self._target = target
         if up is not None:
             self._up = up
@@ -50,6 +50,8 @@ class PerspectiveCamera(Camera):
     def __init__(self, fov=45.0, aspect=4.0/3.0, near=0.1, far=1000.0, **kwargs):
         super().__init__(**kwargs)
         self._projection = None
+        # parameters of the current projection; it only changes with them, not with every move
+        self._projection_key = None
         self._fov = fov
         self._aspect = aspect
         self._near = near
@@ -86,7 +88,9 @@ class PerspectiveCamera(Camera):
         self._far = value
         self.dirty = True
 
-    def update(self):
-        if self.dirty:
-            self._projection = pyrr.Matrix44.perspective_projection(self._fov, self._aspect, self._near, self._far, dtype='f4')
-        super().update()
+    def _on_update(self):
+        key = (self._fov, self._aspect, self._near, self._far)
+        if key != self._projection_key:
+            self._projection = perspective(*key).astype('f4').view(pyrr.Matrix44)
+            self._projection_key = key
+        super()._on_update()
@@ -0,0 +1,154 @@
+from collections import namedtuple
+
+import numpy as np
+
+
+__all__ = ('LightClusters', 'ClusterAssignment', 'perspective_depth_range')
+
+
+# lights of cluster c are indices[offsets[c]:offsets[c] + counts[c]]
+ClusterAssignment = namedtuple('ClusterAssignment', ['offsets', 'counts', 'indices'])
+
+
+def perspective_depth_range(projection):
+    """
+    Near and far plane distances of a perspective projection matrix.
+
+    Parameters
+    ----------
+    projection : (4, 4) array
+        Projection matrix in the row-vector layout of pyrr.
+
+    Returns
+    -------
+    tuple of float
+    """
+    projection = np.asarray(projection, dtype='f8')
+    if projection[2, 3] != -1 or projection[3, 3] != 0:
+        raise ValueError("light clustering needs a perspective projection")
+    a, b = projection[2, 2], projection[3, 2]
+    return b / (a - 1), b / (a + 1)
+
+
+class LightClusters:
+    """
+    Assigns point lights to the clusters of a subdivided view frustum.
+
+    The frustum is split into a regular grid of tiles on screen and exponentially
+    spaced slices in depth, so clusters keep roughly cubic proportions. A fragment
+    only needs to shade the lights of its own cluster, whatever the total number of
+    lights.
+
+    Parameters
+    ----------
+    grid : tuple of int
+        Number of clusters along the x and y axes of the screen and in depth.
+
+    Attributes
+    ----------
+    assignment : ClusterAssignment
+        Result of the last `assign`, with clusters numbered ``(z * ny + y) * nx + x``.
+    """
+
+    def __init__(self, grid=(16, 9, 24)):
+        self.grid = tuple(int(n) for n in grid)
+        self.assignment = None
+
+    def __len__(self):
+        nx, ny, nz = self.grid
+        return nx * ny * nz
+
+    def slice_scale(self, near, far):
+        """Factor of ``log(depth / near)`` giving the depth slice of a view space depth."""
+        return self.grid[2] / np.log(far / near)
+
+    def cluster_ranges(self, positions, radii, projection):
+        """
+        Ranges of clusters overlapped by the bounding boxes of the lights.
+
+        Parameters
+        ----------
+        positions : (N, 3) array
+            View space positions; the camera looks down the negative z axis.
+        radii : (N,) array
+            Distances beyond which the lights have no effect; may be infinite.
+        projection : (4, 4) array
+
+        Returns
+        -------
+        tuple
+            The (N, 3) first and (N, 3) last cluster coordinates of every light,
+            and a (N,) mask of the lights reaching into the frustum at all.
+        """
+        positions = np.asarray(positions, dtype='f8').reshape((-1, 3))
+        radii = np.asarray(radii, dtype='f8')
+        projection = np.asarray(projection, dtype='f8')
+        near, far = perspective_depth_range(projection)
+        grid = np.array(self.grid)
+
+        # depth range, clamped to the frustum
+        depth = -positions[:, 2]
+        with np.errstate(invalid='ignore'):
+            closest, farthest = np.maximum(depth - radii, near), np.minimum(depth + radii, far)
+        visible = closest <= farthest
+
+        # screen extents of the bounding box; x / depth is extremal at its corners
+        lower, upper = np.empty((len(positions), 2)), np.empty((len(positions), 2))
+        for axis in range(2):
+            scale, offset = projection[axis, axis], projection[2, axis]
+            with np.errstate(invalid='ignore'):
+                low, high = positions[:, axis] - radii, positions[:, axis] + radii
+                corners = np.stack([low / closest, low / farthest, high / closest, high / farthest], axis=1)
+            lower[:, axis] = scale * corners.min(axis=1) - offset
+            upper[:, axis] = scale * corners.max(axis=1) - offset
+        # lights of infinite range cover the whole screen
+        infinite = ~np.isfinite(radii)
+        lower[infinite], upper[infinite] = -1, 1
+        visible &= (upper >= -1).all(axis=1) & (lower <= 1).all(axis=1)
+
+        first, last = np.zeros((len(positions), 3), dtype='i8'), np.zeros((len(positions), 3), dtype='i8')
+        with np.errstate(invalid='ignore'):
+            first[:, :2] = np.floor((np.clip(lower, -1, 1) + 1) / 2 * grid[:2])
+            last[:, :2] = np.floor((np.clip(upper, -1, 1) + 1) / 2 * grid[:2])
+            scale = self.slice_scale(near, far)
+            first[visible, 2] = np.floor(np.log(closest[visible] / near) * scale)
+            last[visible, 2] = np.floor(np.log(farthest[visible] / near) * scale)
+        np.clip(first, 0, grid - 1, out=first)
+        np.clip(last, 0, grid - 1, out=last)
+        return first, last, visible
+
+    def assign(self, positions, radii, projection):
+        """
+        Build the light lists of all clusters.
+
+        Parameters
+        ----------
+        positions : (N, 3) array
+            View space positions.
+        radii : (N,) array
+        projection : (4, 4) array
+
+        Returns
+        -------
+        ClusterAssignment
+        """
+        nx, ny, nz = self.grid
+        first, last, visible = self.cluster_ranges(positions, radii, projection)
+        lights = np.flatnonzero(visible)
+        first, extent = first[lights], last[lights] - first[lights] + 1
+        counts = extent.prod(axis=1)
+
+        # one (light, cluster) pair per covered cluster, unravelled from the flat pair number
+        pairs = np.repeat(np.arange(len(lights)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        width, height = extent[pairs, 0], extent[pairs, 1]
+        x = first[pairs, 0] + local % width
+        y = first[pairs, 1] + local // width % height
+        z = first[pairs, 2] + local // (width * height)
+        clusters = (z * ny + y) * nx + x
+
+        order = np.argsort(clusters, kind='stable')
+        counts = np.bincount(clusters, minlength=len(self)).astype('i4')
+        offsets = (np.cumsum(counts) - counts).astype('i4')
+        self.assignment = ClusterAssignment(offsets, counts, lights[pairs[order]].astype('i4'))
+        return self.assignment
@@ -1,11 +1,17 @@
+import collections
+from collections.abc import MutableMapping
 from enum import Enum
+import inspect
+import weakref
 
 import numpy as np
 
-from pyrr.vector3 import generate_vertex_normals
 
-
-__all__ = ('Primitives', 'WindingOrders', 'Geometry', 'PlaneGeometry')
+__all__ = (
+    'Primitives', 'WindingOrders', 'VertexAttributes', 'Geometry', 'GeometryPool', 'geometry_pool',
+    'PlaneGeometry', 'BoxGeometry', 'SphereGeometry', 'CylinderGeometry', 'TorusGeometry', 'ExtrusionGeometry',
+    'vertex_normals', 'vertex_tangents', 'triangulate_polygon',
+)
 
 
 class Primitives(Enum):
@@ -27,12 +33,319 @@ class WindingOrders(Enum):
     CW = 'CW'
 
 
+def _triangle_corners(index, n_vertices):
+    if index is None:
+        return np.arange(n_vertices - n_vertices % 3).reshape((-1, 3))
+    return np.asarray(index).reshape((-1, 3))
+
+
+def _scatter_add(corners, values, n_vertices):
+    """Sum per triangle values onto the vertices of its corners."""
+    flat = corners.ravel()
+    result = np.empty((n_vertices, values.shape[1]))
+    for i in range(values.shape[1]):
+        result[:, i] = np.bincount(flat, weights=np.repeat(values[:, i], 3), minlength=n_vertices)
+    return result
+
+
+def _normalize(vectors):
+    lengths = np.sqrt((vectors ** 2).sum(axis=1, keepdims=True))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.nan_to_num(vectors / lengths)
+
+
+def vertex_normals(pos, index=None):
+    """
+    Area weighted vertex normals of a triangle mesh, facing the side its triangles wind counter-clockwise around.
+
+    Parameters
+    ----------
+    pos : (N, 3) array
+    index : array, optional
+        Vertex index; consecutive vertices form triangles if not given.
+
+    Returns
+    -------
+    (N, 3) float32 array
+    """
+    pos = np.asarray(pos)
+    corners = _triangle_corners(index, len(pos))
+    v0, v1, v2 = pos[corners[:, 0]], pos[corners[:, 1]], pos[corners[:, 2]]
+    # the length of the cross product is twice the area
+    faces = np.cross(v1 - v0, v2 - v0)
+    return _normalize(_scatter_add(corners, faces, len(pos))).astype('f4')
+
+
+def vertex_tangents(pos, uv, normal, index=None):
+    """
+    Vertex tangents of a triangle mesh, along the u direction of the texture coordinates (Lengyel's method).
+
+    Returns
+    -------
+    (N, 4) float32 array
+        Unit tangents orthogonal to the normals, and the handedness of the
+        bitangent, ``cross(normal, tangent) * w``, as w.
+    """
+    pos, uv, normal = np.asarray(pos), np.asarray(uv), np.asarray(normal, dtype='f8')
+    corners = _triangle_corners(index, len(pos))
+    p0, uv0 = pos[corners[:, 0]], uv[corners[:, 0]]
+    e1, e2 = pos[corners[:, 1]] - p0, pos[corners[:, 2]] - p0
+    d1, d2 = uv[corners[:, 1]] - uv0, uv[corners[:, 2]] - uv0
+    det = d1[:, 0] * d2[:, 1] - d2[:, 0] * d1[:, 1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = np.nan_to_num(1 / det, posinf=0.0, neginf=0.0)[:, None]
+    tangents = _scatter_add(corners, (e1 * d2[:, 1:] - e2 * d1[:, 1:]) * r, len(pos))
+    bitangents = _scatter_add(corners, (e2 * d1[:, :1] - e1 * d2[:, :1]) * r, len(pos))
+
+    result = np.empty((len(pos), 4), dtype='f4')
+    # Gram-Schmidt against the normal
+    result[:, :3] = _normalize(tangents - normal * (normal * tangents).sum(axis=1, keepdims=True))
+    result[:, 3] = np.where((np.cross(normal, tangents) * bitangents).sum(axis=1) < 0, -1.0, 1.0)
+    return result
+
+
+class VertexAttributes(MutableMapping):
+    """
+    Mapping of vertex attribute name to array, where some arrays are computed on first access.
+
+    A generated attribute is cached together with the source arrays it was
+    computed from, and recomputed once one of them is replaced. Assigning an
+    array to a name takes precedence over its generator.
+
+    Parameters
+    ----------
+    arrays : dict, optional
+        Mapping of name to array.
+    """
+
+    def __init__(self, arrays=None):
+        self._arrays = dict(arrays or {})
+        # name -> (function, source names)
+        self._generators = {}
+        # name -> (array, source arrays)
+        self._generated = {}
+
+    def generate(self, name, function, sources=()):
+        """
+        Compute an attribute on first access, as ``function(*[self[source] for source in sources])``.
+        """
+        self._arrays.pop(name, None)
+        self._generated.pop(name, None)
+        self._generators[name] = (function, tuple(sources))
+
+    def sources(self, name):
+        """
+        Names of the attributes an attribute is generated from.
+
+        Empty for arrays, and for attributes generated from other data; only
+        these cannot be generated again from the rest.
+        """
+        if name in self._arrays:
+            return ()
+        return self._generators[name][1]
+
+    def is_computed(self, name):
+        """Whether an attribute is available without computing it."""
+        if name in self._arrays:
+            return True
+        entry = self._generated.get(name)
+        if entry is None:
+            return False
+        _, sources = self._generators[name]
+        return all(self.is_computed(source) and self[source] is array for source, array in zip(sources, entry[1]))
+
+    def computed(self):
+        """
+        Mapping of the attributes available without computing them, to their arrays.
+        """
+        return {name: self[name] for name in self if self.is_computed(name)}
+
+    def __getitem__(self, name):
+        array = self._arrays.get(name)
+        if array is not None:
+            return array
+        function, sources = self._generators[name]
+        inputs = tuple(self[source] for source in sources)
+        entry = self._generated.get(name)
+        if entry is None or any(a is not b for a, b in zip(entry[1], inputs)):
+            entry = self._generated[name] = (function(*inputs), inputs)
+        return entry[0]
+
+    def __setitem__(self, name, array):
+        self._arrays[name] = array
+        self._generated.pop(name, None)
+
+    def __delitem__(self, name):
+        if name not in self._arrays and name not in self._generators:
+            raise KeyError(name)
+        self._arrays.pop(name, None)
+        self._generators.pop(name, None)
+        self._generated.pop(name, None)
+
+    def __iter__(self):
+        yield from self._arrays
+        for name in self._generators:
+            if name not in self._arrays:
+                yield name
+
+    def __len__(self):
+        return len(self._arrays.keys() | self._generators.keys())
+
+    def __contains__(self, name):
+        return name in self._arrays or name in self._generators
+
+    def __repr__(self):
+        return f"VertexAttributes({', '.join(self)})"
+
+
 class Geometry:
+    """
+    Vertex attributes, and optionally an index, of a list of primitives.
+
+    Triangle geometries with positions generate missing normals, and tangents
+    where there are texture coordinates, on first access; see `VertexAttributes`.
+    Renderers only access the attributes their programs read, so these are never
+    computed for materials that do not need them.
+    """
+
     def __init__(self, attributes, index=None, primitive=Primitives.TRIANGLES, winding_order=WindingOrders.CCW):
-        self.attributes = attributes
+        self._attributes = None
         self.index = index
         self.primitive = primitive
         self.winding_order = winding_order
+        self.attributes = attributes
+        # bounds and the position array they were computed from
+        self._bounds = None
+
+    @property
+    def index(self):
+        return self._index
+
+    @index.setter
+    def index(self, index):
+        self._index = index
+        if isinstance(self._attributes, VertexAttributes):
+            # generated attributes still depend on the previous index
+            names = [name for name in ('normal', 'tangent') if name in self._attributes and self._attributes.sources(name)]
+            self._generate(self._attributes, names)
+
+    @property
+    def attributes(self):
+        return self._attributes
+
+    @attributes.setter
+    def attributes(self, attributes):
+        if isinstance(attributes, dict):
+            attributes = VertexAttributes(attributes)
+        if isinstance(attributes, VertexAttributes):
+            self._generate(attributes, [name for name in ('normal', 'tangent') if name not in attributes])
+        self._attributes = attributes
+
+    def _generate(self, attributes, names):
+        if self.primitive is not Primitives.TRIANGLES or 'pos' not in attributes:
+            return
+        index = self.index
+        if 'normal' in names:
+            attributes.generate('normal', lambda pos: vertex_normals(pos, index), ['pos'])
+        if 'tangent' in names and 'uv' in attributes:
+            attributes.generate('tangent', lambda pos, uv, normal: vertex_tangents(pos, uv, normal, index), ['pos', 'uv', 'normal'])
+
+    @classmethod
+    def shared(cls, *args, **kwargs):
+        """
+        Get the geometry of these parameters from the default `GeometryPool`.
+
+        Meshes of identical primitives then share one geometry, and its GPU buffers.
+        Shared geometries must not be modified.
+        """
+        return geometry_pool.get(cls, *args, **kwargs)
+
+    def _get_bounds(self):
+        pos = self.attributes['pos']
+        if self._bounds is None or self._bounds[0] is not pos:
+            lower, upper = pos.min(axis=0), pos.max(axis=0)
+            center = (lower + upper) / 2
+            radius = np.sqrt(((pos - center) ** 2).sum(axis=1).max())
+            self._bounds = (pos, (lower, upper), (center, radius))
+        return self._bounds
+
+    @property
+    def bounding_box(self):
+        """
+        Axis aligned bounding box of the vertex positions, as a (lower, upper) tuple.
+
+        Computed on first access and cached until `attributes['pos']` is replaced.
+        """
+        return self._get_bounds()[1]
+
+    @property
+    def bounding_sphere(self):
+        """
+        Bounding sphere of the vertex positions, as a (center, radius) tuple.
+
+        Centered on the bounding box; computed on first access and cached until
+        `attributes['pos']` is replaced.
+        """
+        return self._get_bounds()[2]
+
+
+def _freeze(value):
+    """Hashable equivalent of a parameter value; arrays and sequences compare by content."""
+    if isinstance(value, (list, tuple, np.ndarray)):
+        array = np.asarray(value)
+        if array.dtype != object:
+            return (array.dtype.str, array.shape, array.tobytes())
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+class GeometryPool:
+    """
+    Memoizes geometries by class and parameters.
+
+    Geometries are held weakly, so they are dropped, and their GPU buffers
+    released, once no mesh uses them anymore.
+
+    Attributes
+    ----------
+    stats : collections.Counter
+        Cumulative hits and misses.
+    """
+
+    def __init__(self):
+        self._geometries = weakref.WeakValueDictionary()
+        self._signatures = {}
+        self.stats = collections.Counter()
+
+    def get(self, cls, *args, **kwargs):
+        """
+        Get the geometry ``cls(*args, **kwargs)``; created on the first request for these parameters.
+        """
+        signature = self._signatures.get(cls)
+        if signature is None:
+            signature = self._signatures[cls] = inspect.signature(cls)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (cls, _freeze(bound.arguments))
+        geometry = self._geometries.get(key)
+        if geometry is None:
+            self.stats['misses'] += 1
+            geometry = self._geometries[key] = cls(*args, **kwargs)
+        else:
+            self.stats['hits'] += 1
+        return geometry
+
+    def __len__(self):
+        return len(self._geometries)
+
+    def clear(self):
+        self._geometries.clear()
+
+
+# pool of `Geometry.shared`
+geometry_pool = GeometryPool()
 
 
 class PlaneGeometry(Geometry):
@@ -62,7 +375,244 @@ class PlaneGeometry(Geometry):
         # broadcast and reshape to get the final result
         index = (t[:, None, None] + t_offset).reshape((-1, 3))
 
-        # generate normals
-        attributes["normal"] = generate_vertex_normals(vertices, index)
+        # normals are generated on first use
+        super().__init__(attributes, index=index)
+
+
+def _grid(u_segments, v_segments):
+    """
+    Parameters and triangles of a grid over the unit square.
+
+    Vertex ``i * (v_segments + 1) + j`` is at ``(u, v) = (i / u_segments, j / v_segments)``;
+    triangles wind counter-clockwise in the (u, v) plane.
+
+    Returns
+    -------
+    tuple
+        The u and v of every vertex, and the (N, 3) index.
+    """
+    u, v = np.meshgrid(np.linspace(0, 1, u_segments + 1), np.linspace(0, 1, v_segments + 1), indexing='ij')
+    t = np.arange((u_segments + 1) * (v_segments + 1), dtype='i4').reshape((u_segments + 1, v_segments + 1))[:-1, :-1].ravel()
+    t_offset = np.array([
+        [0, v_segments + 1, 1],
+        [v_segments + 1, v_segments + 2, 1],
+    ], dtype='i4')
+    return u.ravel(), v.ravel(), (t[:, None, None] + t_offset).reshape((-1, 3))
+
+
+def _merge(parts):
+    """Concatenate (pos, normal, uv, index) parts into the attributes and index of a single geometry."""
+    offsets = np.cumsum([0] + [len(pos) for pos, _, _, _ in parts[:-1]])
+    attributes = {
+        'pos': np.concatenate([pos for pos, _, _, _ in parts]).astype('f4'),
+        'normal': np.concatenate([normal for _, normal, _, _ in parts]).astype('f4'),
+        'uv': np.concatenate([uv for _, _, uv, _ in parts]).astype('f4'),
+    }
+    index = np.concatenate([index + offset for (_, _, _, index), offset in zip(parts, offsets)]).astype('i4')
+    return attributes, index
+
+
+class BoxGeometry(Geometry):
+    """
+    Axis aligned box centered on the origin, with separate vertices per face.
+    """
+
+    def __init__(self, width=1, height=1, depth=1, width_segments=1, height_segments=1, depth_segments=1):
+        size = np.array([width, height, depth], dtype='f8')
+        segments = (width_segments, height_segments, depth_segments)
+        parts = []
+        # per face: the outward normal, and the directions of u and v, with u x v = normal
+        for normal, u_dir, v_dir in (
+                ((1, 0, 0), (0, 0, -1), (0, 1, 0)), ((-1, 0, 0), (0, 0, 1), (0, 1, 0)),
+                ((0, 1, 0), (1, 0, 0), (0, 0, -1)), ((0, -1, 0), (1, 0, 0), (0, 0, 1)),
+                ((0, 0, 1), (1, 0, 0), (0, 1, 0)), ((0, 0, -1), (-1, 0, 0), (0, 1, 0))):
+            normal, u_dir, v_dir = np.array(normal), np.array(u_dir), np.array(v_dir)
+            u, v, index = _grid(segments[np.abs(u_dir).argmax()], segments[np.abs(v_dir).argmax()])
+            pos = (normal / 2 + (u[:, None] - 0.5) * u_dir + (v[:, None] - 0.5) * v_dir) * size
+            parts.append((pos, np.broadcast_to(normal, pos.shape), np.stack([u, v], axis=1), index))
+        attributes, index = _merge(parts)
+        super().__init__(attributes, index=index)
+
+
+def _drop_degenerate(pos, index):
+    """Remove triangles with coinciding corners, e.g. at the poles of a sphere."""
+    corners = pos[index]
+    keep = ~((corners[:, 0] == corners[:, 1]).all(axis=1) | (corners[:, 1] == corners[:, 2]).all(axis=1)
+             | (corners[:, 0] == corners[:, 2]).all(axis=1))
+    return index[keep]
+
+
+class SphereGeometry(Geometry):
+    """
+    UV sphere centered on the origin, with its poles on the y axis.
+
+    The seam at u = 0 has duplicate vertices, so texture coordinates wrap around.
+    """
+
+    def __init__(self, radius=1, width_segments=32, height_segments=16):
+        u, v, index = _grid(width_segments, height_segments)
+        phi, theta = u * 2 * np.pi, v * np.pi
+        # from the south pole up; u x v points outward
+        normal = np.stack([np.sin(theta) * np.cos(phi), -np.cos(theta), -np.sin(theta) * np.sin(phi)], axis=1)
+        # exactly on the poles, so the triangles collapsing there are dropped
+        normal[v == 0] = (0, -1, 0)
+        normal[v == 1] = (0, 1, 0)
+        pos = (normal * radius).astype('f4')
+        attributes = {'pos': pos, 'normal': normal.astype('f4'), 'uv': np.stack([u, v], axis=1).astype('f4')}
+        super().__init__(attributes, index=_drop_degenerate(pos, index))
+
+
+class CylinderGeometry(Geometry):
+    """
+    Cylinder, or truncated cone, centered on the origin along the y axis.
+
+    Caps have their own vertices, so their edges stay sharp; a radius of 0 makes a cone.
+    """
+
+    def __init__(self, radius_top=1, radius_bottom=1, height=1, radial_segments=32, height_segments=1, open_ended=False):
+        u, v, index = _grid(radial_segments, height_segments)
+        phi = u * 2 * np.pi
+        radius = radius_bottom + (radius_top - radius_bottom) * v
+        direction = np.stack([np.cos(phi), np.zeros_like(phi), -np.sin(phi)], axis=1)
+        pos = direction * radius[:, None]
+        pos[:, 1] = (v - 0.5) * height
+        # tilted by the slope of the side
+        normal = direction + [0, (radius_bottom - radius_top) / height if height else 0, 0]
+        normal /= np.linalg.norm(normal, axis=1, keepdims=True)
+        parts = [(pos, normal, np.stack([u, v], axis=1), _drop_degenerate(pos, index))]
+
+        if not open_ended:
+            ring = np.linspace(0, 2 * np.pi, radial_segments + 1)[:-1]
+            circle = np.stack([np.cos(ring), np.zeros_like(ring), -np.sin(ring)], axis=1)
+            fan = np.stack([np.zeros(radial_segments), np.arange(1, radial_segments + 1), np.roll(np.arange(1, radial_segments + 1), -1)], axis=1)
+            for cap_radius, sign in ((radius_top, 1), (radius_bottom, -1)):
+                if cap_radius <= 0:
+                    continue
+                cap = np.concatenate([[[0, 0, 0]], circle * cap_radius]) + [0, sign * height / 2, 0]
+                uv = np.concatenate([[[0.5, 0.5]], (circle[:, [0, 2]] * [1, sign] + 1) / 2])
+                # counter-clockwise seen from outside
+                triangles = fan if sign > 0 else fan[:, [0, 2, 1]]
+                parts.append((cap, np.broadcast_to([0, sign, 0], cap.shape), uv, triangles))
+
+        attributes, index = _merge(parts)
+        super().__init__(attributes, index=index)
+
+
+class TorusGeometry(Geometry):
+    """
+    Torus centered on the origin, in the xy plane.
+
+    Parameters
+    ----------
+    radius : float
+        Distance from the center to the center of the tube.
+    tube : float
+        Radius of the tube.
+    radial_segments : int
+        Number of segments around the tube.
+    tubular_segments : int
+        Number of segments along the tube.
+    arc : float
+        Angle the tube goes around, e.g. pi for half a torus.
+    """
+
+    def __init__(self, radius=1, tube=0.4, radial_segments=16, tubular_segments=48, arc=2 * np.pi):
+        u, v, index = _grid(tubular_segments, radial_segments)
+        phi, theta = u * arc, v * 2 * np.pi
+        ring = np.stack([np.cos(phi), np.sin(phi), np.zeros_like(phi)], axis=1)
+        # around the tube, so u x v points outward
+        normal = ring * np.cos(theta)[:, None]
+        normal[:, 2] = np.sin(theta)
+        pos = ring * radius + normal * tube
+        attributes = {'pos': pos.astype('f4'), 'normal': normal.astype('f4'), 'uv': np.stack([u, v], axis=1).astype('f4')}
+        super().__init__(attributes, index=index)
+
+
+def _cross_2d(a, b):
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+def triangulate_polygon(points):
+    """
+    Triangulate a simple polygon by ear clipping.
+
+    Parameters
+    ----------
+    points : (N, 2) array
+        Corners in counter-clockwise order, without repeating the first one.
+
+    Returns
+    -------
+    (N - 2, 3) int32 array
+        Counter-clockwise triangles.
+    """
+    points = np.asarray(points, dtype='f8')
+    remaining = np.arange(len(points))
+    triangles = []
+    while len(remaining) > 3:
+        p = points[remaining]
+        previous, following = np.roll(p, 1, axis=0), np.roll(p, -1, axis=0)
+        convex = _cross_2d(p - previous, following - p) > 0
+        # only reflex corners, other than the corners of the ear itself, can lie within an ear
+        reflex = np.flatnonzero(~convex)
+        r = p[reflex]
+        a, b, c = previous[:, None], p[:, None], following[:, None]
+        inside = (_cross_2d(b - a, r - a) >= 0) & (_cross_2d(c - b, r - b) >= 0) & (_cross_2d(a - c, r - c) >= 0)
+        own = np.abs((reflex[None] - np.arange(len(p))[:, None] + 1) % len(p) - 1) <= 1
+        ears = np.flatnonzero(convex & ~(inside & ~own).any(axis=1))
+        # collinear or self-intersecting remainders are clipped anyway
+        ear = ears[0] if len(ears) else 0
+        triangles.append([remaining[ear - 1], remaining[ear], remaining[(ear + 1) % len(remaining)]])
+        remaining = np.delete(remaining, ear)
+    triangles.append(remaining)
+    return np.array(triangles, dtype='i4').reshape((-1, 3))
+
+
+class ExtrusionGeometry(Geometry):
+    """
+    Prism of a simple polygon extruded along the z axis, centered on the xy plane.
+
+    Side faces have their own vertices per edge, so edges stay sharp.
+
+    Parameters
+    ----------
+    shape : (N, 2) array
+        Corners of the polygon in the xy plane, in either order, without repeating the first one.
+    depth : float
+        Length along the z axis.
+    steps : int
+        Number of segments along the z axis.
+    caps : bool
+        Close the ends.
+    """
+
+    def __init__(self, shape, depth=1, steps=1, caps=True):
+        shape = np.asarray(shape, dtype='f8')
+        if _cross_2d(shape, np.roll(shape, -1, axis=0)).sum() < 0:
+            shape = shape[::-1]
+        edges = np.roll(shape, -1, axis=0) - shape
+        lengths = np.linalg.norm(edges, axis=1)
+        perimeter = np.concatenate([[0], np.cumsum(lengths)]) / max(lengths.sum(), np.finfo('f8').tiny)
+
+        # a grid of 1 x steps quads per edge, broadcast over all edges; u along the edge, v along z
+        u, v, index = _grid(1, steps)
+        pos = np.empty((len(shape), len(u), 3))
+        pos[:, :, :2] = shape[:, None] + u[None, :, None] * edges[:, None]
+        pos[:, :, 2] = (v - 0.5) * depth
+        # counter-clockwise corners have the outside on their right
+        normal = np.zeros_like(pos)
+        normal[:, :, :2] = (np.stack([edges[:, 1], -edges[:, 0]], axis=1) / lengths[:, None])[:, None]
+        uv = np.stack(np.broadcast_arrays(perimeter[:-1, None] + u * (perimeter[1:] - perimeter[:-1])[:, None], v), axis=2)
+        index = (index[None] + (np.arange(len(shape)) * len(u))[:, None, None]).reshape((-1, 3))
+        parts = [(pos.reshape((-1, 3)), normal.reshape((-1, 3)), uv.reshape((-1, 2)), index)]
+
+        if caps:
+            triangles = triangulate_polygon(shape)
+            lower, upper = shape.min(axis=0), shape.max(axis=0)
+            cap_uv = (shape - lower) / np.where(upper > lower, upper - lower, 1)
+            for sign in (1, -1):
+                cap = np.concatenate([shape, np.full((len(shape), 1), sign * depth / 2)], axis=1)
+                parts.append((cap, np.broadcast_to([0, 0, sign], cap.shape), cap_uv, triangles if sign > 0 else triangles[:, [0, 2, 1]]))
 
+        attributes, index = _merge(parts)
         super().__init__(attributes, index=index)
@@ -0,0 +1,190 @@
+import numpy as np
+import pyrr
+
+from .maths import compose
+from .scenes import Object3D, transform_versions
+
+
+__all__ = ('TransformGraph',)
+
+
+class TransformGraph:
+    """
+    Flattened, array-backed storage of the transforms of a scene graph.
+
+    The local position, scale and rotation of every node below (and including) `root`
+    live in contiguous arrays, ordered breadth-first so that parents precede their
+    children and every depth level is a contiguous range of rows. World matrices are
+    computed level by level with batched matrix products.
+
+    The nodes remain usable as before; they become thin views over their row, so
+    setting e.g. `Object3D.position` writes straight into the arrays. Changes to the
+    structure of the graph (`Object3D.append_child` / `remove_child`) are picked up
+    by a rebuild on the next update.
+
+    Parameters
+    ----------
+    root : Object3D
+        Top-most node of the scene graph; its own parent (if any) is ignored.
+
+    Attributes
+    ----------
+    nodes : list of Object3D
+        Node of every row.
+    position, scale : (N, 3) array
+    rotation : (N, 4) array
+        Quaternions in (x, y, z, w) order.
+    parent : (N,) array
+        Row of the parent of every row; -1 for the root.
+    levels : (L + 1,) array
+        Row offsets of every depth level.
+    local, world : (N, 4, 4) array
+        Local and world (model) matrices.
+    version : (N,) int array
+        Version of the world matrix of every row, see `Object3D.version`.
+    dirty : (N,) bool array
+        Rows marked dirty since the last update; propagated to the subtrees on update.
+    updated : int
+        Number of world matrices recomputed by the last update.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.nodes = []
+        self._structure_changed = False
+        self._stale = True
+        self.updated = 0
+        self.rebuild()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def rebuild(self):
+        """Re-flatten the scene graph below the root, e.g. after its structure changed."""
+        # breadth first; each level is a contiguous range of rows
+        nodes, levels = [], [0]
+        level = [self.root]
+        while level:
+            nodes.extend(level)
+            levels.append(len(nodes))
+            level = [child for node in level for child in node.children]
+
+        n = len(nodes)
+        position = np.empty((n, 3), dtype='f4')
+        scale = np.empty((n, 3), dtype='f4')
+        rotation = np.empty((n, 4), dtype='f4')
+        parent = np.full(n, -1, dtype='i4')
+        rows = {id(node): row for row, node in enumerate(nodes)}
+        for row, node in enumerate(nodes):
+            position[row] = node._position
+            scale[row] = node._scale
+            rotation[row] = node._rotation
+            if row:
+                parent[row] = rows[id(node.parent)]
+
+        # nodes that left the graph get their own storage back
+        for node in self.nodes:
+            if rows.get(id(node)) is None and node._graph is self:
+                self._detach(node)
+
+        self.nodes = nodes
+        self.levels = np.array(levels, dtype='i8')
+        self.position, self.scale, self.rotation, self.parent = position, scale, rotation, parent
+        self.local = np.empty((n, 4, 4), dtype='f4')
+        self.world = np.empty((n, 4, 4), dtype='f4')
+        self.version = np.zeros(n, dtype='i8')
+        self.dirty = np.ones(n, dtype=bool)
+        self._hooks = np.array([
+            row for row, node in enumerate(nodes) if type(node)._on_update is not Object3D._on_update
+        ], dtype='i8')
+        for row, node in enumerate(nodes):
+            self._attach(node, row)
+        self._structure_changed = False
+        self._stale = True
+
+    def _attach(self, node, row):
+        node._graph, node._row = self, row
+        node._position = self.position[row].view(pyrr.Vector3)
+        node._scale = self.scale[row].view(pyrr.Vector3)
+        node._rotation = self.rotation[row].view(pyrr.Quaternion)
+        node._model = self.world[row].view(pyrr.Matrix44)
+        node._model.flags.writeable = False
+
+    def _detach(self, node):
+        node._version = int(self.version[node._row])
+        node._graph, node._row = None, None
+        node._position = node._position.copy()
+        node._scale = node._scale.copy()
+        node._rotation = node._rotation.copy()
+        node._model = node._model.copy()
+        node._model.flags.writeable = False
+        node._dirty = True
+
+    def invalidate_structure(self):
+        """Schedule a rebuild for the next update."""
+        self._structure_changed = True
+
+    def mark_dirty(self, rows=slice(None), value=True):
+        """
+        Set the dirty flag of the given rows, e.g. after writing to the transform arrays.
+        """
+        self.dirty[rows] = value
+        if value:
+            self._stale = True
+
+    def is_dirty(self, row):
+        """Whether the given row or any of its ancestors is dirty."""
+        if not self._stale:
+            return False
+        while row >= 0:
+            if self.dirty[row]:
+                return True
+            row = self.parent[row]
+        return False
+
+    def update(self):
+        """
+        Recompute the world matrices of the dirty rows and their subtrees.
+
+        Returns
+        -------
+        int
+            Number of world matrices that were recomputed.
+        """
+        if self._structure_changed:
+            self.rebuild()
+        if not self._stale:
+            self.updated = 0
+            return 0
+
+        levels = list(zip(self.levels[:-1], self.levels[1:]))
+        # a dirty parent invalidates its children
+        for start, stop in levels[1:]:
+            self.dirty[start:stop] |= self.dirty[self.parent[start:stop]]
+        rows = np.flatnonzero(self.dirty)
+
+        if len(rows) == len(self):
+            compose(self.position, self.rotation, self.scale, out=self.local)
+            self.world[:self.levels[1]] = self.local[:self.levels[1]]
+            for start, stop in levels[1:]:
+                np.matmul(self.local[start:stop], self.world[self.parent[start:stop]], out=self.world[start:stop])
+        else:
+            self.local[rows] = compose(self.position[rows], self.rotation[rows], self.scale[rows])
+            # rows are sorted, so each level is a contiguous range of them
+            bounds = np.searchsorted(rows, self.levels)
+            for level, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+                if start == stop:
+                    continue
+                level_rows = rows[start:stop]
+                if level == 0:
+                    self.world[level_rows] = self.local[level_rows]
+                else:
+                    self.world[level_rows] = np.matmul(self.local[level_rows], self.world[self.parent[level_rows]])
+
+        self.version[rows] = next(transform_versions)
+        for row in self._hooks[self.dirty[self._hooks]]:
+            self.nodes[row]._on_update()
+        self.dirty[:] = False
+        self._stale = False
+        self.updated = len(rows)
+        return self.updated
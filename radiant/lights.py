@@ -11,7 +11,14 @@ class Light(Object3D):
 
 
 class PointLight(Light):
-    def update(self):
-        if self.dirty:
-            super().update()
-            self.uniforms["light_pos"] = self._model * self._position
+    def __init__(self, color=(1.0, 1.0, 1.0), intensity=1.0, distance=None, **kwargs):
+        super().__init__(**kwargs)
+        # used by clustered shading of many lights, see ModernGLRenderer.render
+        self.color = color
+        self.intensity = intensity
+        # range beyond which the light has no effect; unlimited when None
+        self.distance = distance
+
+    def _on_update(self):
+        self.uniforms["light_pos"] = self._model * self._position
+        super()._on_update()
@@ -1,12 +1,19 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
 import numpy as np
 
-from .geometries import Geometry, Primitives
+from .geometries import Geometry, Primitives, VertexAttributes, WindingOrders
+from .optimize import optimize_vertex_cache
 
 
-__all__ = ('load_obj',)
+__all__ = ('load_obj', 'load_obj_indexed', 'save_geometry', 'load_geometry', 'load_cached', 'save_scene', 'load_scene')
 
 
-def load_obj(file, **kwargs):
+def load_obj(file, cache=None, **kwargs):
     """
     Parses a Wavefront .obj file.
 
@@ -14,6 +21,8 @@ def load_obj(file, **kwargs):
     ----------
     file : file-like object
         Will be read from line-by-line. Assumed to opened in "r" mode.
+    cache : str, optional
+        Directory of the binary geometry cache, see `load_cached`.
 
     Returns
     -------
@@ -23,7 +32,11 @@ def load_obj(file, **kwargs):
     -----
     Inefficient implementation; naively duplicates vertex data per face.
     Assumes the format exported by Blender. Does not deal well with missing elements.
+    See `load_obj_indexed` for a faster loader that deduplicates vertices.
     """
+    if cache is not None:
+        return load_cached(file, cache, load_obj, **kwargs)
+
     v = []
     vt = []
     vn = []
@@ -38,13 +51,425 @@ def load_obj(file, **kwargs):
         elif line.startswith("f "):
             f.append([[int(x) for x in fv.split('/')] for fv in line[2:].split()])
 
-    # now produce the full buffers
+    # now produce the full buffers; texture coordinates and normals only once used
     f = np.array(f, dtype='i4')
     f[f > 0] -= 1
     v = np.array(v, dtype='f4')[f[:, :, 0].ravel()]
-    vt = np.array(vt, dtype='f4')[f[:, :, 1].ravel()]
-    vn = np.array(vn, dtype='f4')[f[:, :, 2].ravel()]
+    attributes = VertexAttributes({'pos': v})
+    for name, values, column in (('uv', vt, 1), ('normal', vn, 2)):
+        attributes.generate(name, _gather(np.array(values, dtype='f4'), f[:, :, column].ravel()))
+    return Geometry(attributes, primitive=Primitives.TRIANGLES, **kwargs)
+
+
+def _gather(values, index):
+    """Function taking the indexed rows of values, for `VertexAttributes.generate`."""
+    return lambda: values[index]
+
+
+# default number of bytes read from the file per parsing pass
+CHUNK_SIZE = 1 << 24
+
+_NEWLINE, _SPACE, _TAB, _SLASH = ord('\n'), ord(' '), ord('\t'), ord('/')
+_V, _T, _N, _F = ord('v'), ord('t'), ord('n'), ord('f')
+
+
+def load_obj_indexed(file, chunk_size=CHUNK_SIZE, cache=None, optimize=False, **kwargs):
+    """
+    Parses a Wavefront .obj file into an indexed geometry.
+
+    The file is read in large chunks and tokenized with NumPy, so there is no
+    Python work per line. Every unique ``v/vt/vn`` triple becomes a single vertex,
+    and faces are stored in `Geometry.index`. Polygons are triangulated as fans.
+
+    Parameters
+    ----------
+    file : str or file-like object
+        Path to the file, or a file-like object opened in "r" or "rb" mode.
+    chunk_size : int
+        Number of bytes to read per parsing pass.
+    cache : str, optional
+        Directory of the binary geometry cache, see `load_cached`.
+    optimize : bool
+        Reorder triangles and vertices for the GPU vertex cache, see
+        `optimize_vertex_cache`. Cached geometries are stored optimized.
+
+    Returns
+    -------
+    Geometry
+    """
+    # forwarded only if set, so unoptimized geometries keep their cache keys
+    forwarded = dict(kwargs, optimize=True) if optimize else kwargs
+    if cache is not None:
+        return load_cached(file, cache, load_obj_indexed, chunk_size=chunk_size, **forwarded)
+    if isinstance(file, str):
+        with open(file, mode="rb") as fh:
+            return load_obj_indexed(fh, chunk_size=chunk_size, **forwarded)
+
+    parser = _ObjParser()
+    remainder = b''
+    while True:
+        chunk = file.read(chunk_size)
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if not chunk:
+            break
+        chunk = remainder + chunk
+        # only hand complete lines to the parser
+        end = chunk.rfind(b'\n') + 1
+        remainder = chunk[end:]
+        if end:
+            parser.feed(chunk[:end])
+    if remainder:
+        parser.feed(remainder + b'\n')
+
+    attributes, index = parser.result()
+    geometry = Geometry(attributes, index=index, primitive=Primitives.TRIANGLES, **kwargs)
+    if optimize:
+        geometry = optimize_vertex_cache(geometry)
+    return geometry
+
+
+def _parse_numbers(data, mask, dtype):
+    """Parse all whitespace separated numbers in the masked bytes of data."""
+    if not mask.any():
+        return np.empty(0, dtype=dtype)
+    return np.fromstring(data[mask].tobytes(), dtype=dtype, sep=' ')
+
+
+class _ObjParser:
+    """Incremental state of `load_obj_indexed`; fed with chunks of complete lines."""
+
+    def __init__(self):
+        self.v, self.vt, self.vn = [], [], []
+        self.n_v, self.n_vt, self.n_vn = 0, 0, 0
+        self.faces = []
+        self.layout = None
+
+    def feed(self, chunk):
+        # writable copy; carriage returns are just whitespace to us
+        data = np.frombuffer(chunk, dtype='u1').copy()
+        data[data == ord('\r')] = _SPACE
+
+        # split into lines, padded so the first two bytes of every line can be inspected
+        ends = np.flatnonzero(data == _NEWLINE)
+        starts = np.empty_like(ends)
+        starts[0] = 0
+        starts[1:] = ends[:-1] + 1
+        lengths = ends - starts + 1
+        padded = np.concatenate([data, np.zeros(2, dtype='u1')])
+        b0, b1 = padded[starts], padded[starts + 1]
+        sep1 = (b1 == _SPACE) | (b1 == _TAB)
+        second = padded[starts + 2]
+        sep2 = (second == _SPACE) | (second == _TAB)
+
+        is_v = (b0 == _V) & sep1
+        is_vt = (b0 == _V) & (b1 == _T) & sep2
+        is_vn = (b0 == _V) & (b1 == _N) & sep2
+        is_f = (b0 == _F) & sep1
+
+        # blank out the keywords so only numbers remain
+        data[starts[is_v | is_vt | is_vn | is_f]] = _SPACE
+        data[starts[is_vt | is_vn] + 1] = _SPACE
+
+        for lines, target in ((is_v, self.v), (is_vt, self.vt), (is_vn, self.vn)):
+            n_lines = np.count_nonzero(lines)
+            if n_lines:
+                values = _parse_numbers(data, np.repeat(lines, lengths), 'f4')
+                if len(values) % n_lines:
+                    raise ValueError("inconsistent number of vertex components")
+                target.append(values.reshape((n_lines, -1)))
+
+        if is_f.any():
+            self._feed_faces(data, is_f, is_v, is_vt, is_vn, lengths)
+
+        self.n_v += np.count_nonzero(is_v)
+        self.n_vt += np.count_nonzero(is_vt)
+        self.n_vn += np.count_nonzero(is_vn)
+
+    def _feed_faces(self, data, is_f, is_v, is_vt, is_vn, lengths):
+        face_bytes = data[np.repeat(is_f, lengths)]
+
+        # count the vertices of each face; a vertex is a run of non-whitespace bytes
+        solid = (face_bytes != _SPACE) & (face_bytes != _TAB) & (face_bytes != _NEWLINE)
+        token_start = solid.copy()
+        token_start[1:] &= ~solid[:-1]
+        line_starts = np.concatenate([[0], np.flatnonzero(face_bytes == _NEWLINE)[:-1] + 1])
+        counts = np.add.reduceat(token_start.astype('i8'), line_starts)
+        if (counts < 3).any():
+            raise ValueError("faces need at least three vertices")
+
+        # v/vt/vn, v//vn, v/vt or v
+        if self.layout is None:
+            first = face_bytes[:np.argmax(face_bytes == _NEWLINE)].tobytes()
+            n_slashes = first.split()[0].count(b'/')
+            self.layout = ('v', 'vn') if b'//' in first else ('v', 'vt', 'vn')[:n_slashes + 1]
+        face_bytes[face_bytes == _SLASH] = _SPACE
+        values = np.fromstring(face_bytes.tobytes(), dtype='i8', sep=' ')
+        n_vertices = counts.sum()
+        if len(values) != n_vertices * len(self.layout):
+            raise ValueError("inconsistent face vertex format")
+        values = values.reshape((n_vertices, len(self.layout)))
+
+        # resolve relative (negative) indices against the element counts at each face
+        totals = {'v': (is_v, self.n_v), 'vt': (is_vt, self.n_vt), 'vn': (is_vn, self.n_vn)}
+        for column, key in enumerate(self.layout):
+            negative = values[:, column] < 0
+            if negative.any():
+                lines, offset = totals[key]
+                before = (np.cumsum(lines) + offset)[is_f]
+                values[negative, column] += np.repeat(before, counts)[negative] + 1
+        values -= 1
+
+        # triangulate as fans: (0, i, i + 1) for every face
+        n_triangles = counts - 2
+        first = np.repeat(np.cumsum(counts) - counts, n_triangles)
+        local = np.arange(n_triangles.sum()) - np.repeat(np.cumsum(n_triangles) - n_triangles, n_triangles) + 1
+        corners = np.stack([first, first + local, first + local + 1], axis=1)
+        self.faces.append(values[corners.ravel()])
+
+    def result(self):
+        if not self.faces:
+            raise ValueError("no faces found")
+        faces = np.concatenate(self.faces)
+        sources = {
+            'v': ('pos', self.v, self.n_v),
+            'vt': ('uv', self.vt, self.n_vt),
+            'vn': ('normal', self.vn, self.n_vn),
+        }
+
+        # identify unique vertex tuples by a single integer key
+        key = np.zeros(len(faces), dtype='i8')
+        capacity = 1
+        for column, name in enumerate(self.layout):
+            size = max(sources[name][2], 1)
+            key = key * size + faces[:, column]
+            capacity *= size
+        if capacity < np.iinfo('i8').max:
+            _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+        else:
+            _, first, inverse = np.unique(faces, axis=0, return_index=True, return_inverse=True)
+
+        # keep vertices in order of first occurrence
+        order = np.argsort(first, kind='stable')
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        index = rank[inverse.ravel()].astype('i4').reshape((-1, 3))
+        unique = faces[first[order]]
+
+        attributes = {}
+        for column, name in enumerate(self.layout):
+            attribute, chunks, _ = sources[name]
+            values = np.concatenate(chunks)
+            # drop the optional w components
+            values = values[:, :2] if attribute == 'uv' else values[:, :3]
+            attributes[attribute] = np.ascontiguousarray(values[unique[:, column]], dtype='f4')
+        return attributes, index
+
+
+# magic bytes and alignment of the binary geometry container
+GEOMETRY_MAGIC = b'RADGEOM1'
+GEOMETRY_ALIGNMENT = 64
+
+
+def save_geometry(geometry, file):
+    """
+    Writes a geometry to a compact binary container.
+
+    The container holds a small JSON header followed by the raw bytes of every
+    attribute and the index, each aligned so they can be memory-mapped.
+
+    Parameters
+    ----------
+    geometry : Geometry
+    file : str
+        Path of the file to write.
+    """
+    # attributes generated from others are generated again after loading, unless computed already
+    attributes = geometry.attributes
+    arrays = {name: attributes[name] for name in attributes if attributes.is_computed(name) or not attributes.sources(name)}
+    if geometry.index is not None:
+        arrays = dict(arrays, __index__=geometry.index)
+    arrays = {key: np.ascontiguousarray(value) for key, value in arrays.items()}
 
-    # NOTE: we could identify unique vertices in f and shave off memory requirements. we could.
+    entries = {}
+    offset = 0
+    for key, value in arrays.items():
+        entries[key] = {'dtype': value.dtype.str, 'shape': value.shape, 'offset': offset}
+        offset += -(-value.nbytes // GEOMETRY_ALIGNMENT) * GEOMETRY_ALIGNMENT
+    header = json.dumps({
+        'arrays': entries,
+        'primitive': geometry.primitive.value,
+        'winding_order': geometry.winding_order.value,
+    }).encode('utf-8')
+    # the data section starts aligned, right after the magic, header size and header
+    data_start = -(-(len(GEOMETRY_MAGIC) + 8 + len(header)) // GEOMETRY_ALIGNMENT) * GEOMETRY_ALIGNMENT
+    header = header.ljust(data_start - len(GEOMETRY_MAGIC) - 8)
 
-    return Geometry({'pos': v, 'uv': vt, 'normal': vn}, primitive=Primitives.TRIANGLES, **kwargs)
+    with open(file, mode="wb") as fh:
+        fh.write(GEOMETRY_MAGIC)
+        fh.write(np.uint64(len(header)).tobytes())
+        fh.write(header)
+        for key, value in arrays.items():
+            fh.seek(data_start + entries[key]['offset'])
+            fh.write(memoryview(value).cast('B'))
+        fh.truncate(data_start + offset)
+
+
+def load_geometry(file, mmap=True):
+    """
+    Reads a geometry written by `save_geometry`.
+
+    Parameters
+    ----------
+    file : str
+        Path of the file to read.
+    mmap : bool
+        Memory-map the arrays (read-only, zero copy) instead of reading them into memory.
+        Processes mapping the same file share its page-cached copy.
+
+    Returns
+    -------
+    Geometry
+    """
+    with open(file, mode="rb") as fh:
+        if fh.read(len(GEOMETRY_MAGIC)) != GEOMETRY_MAGIC:
+            raise ValueError(f"{file} is not a geometry container")
+        header_size = int(np.frombuffer(fh.read(8), dtype='u8')[0])
+        header = json.loads(fh.read(header_size).decode('utf-8'))
+        data_start = fh.tell()
+        if mmap:
+            data = np.memmap(fh, dtype='u1', mode='r')
+        else:
+            fh.seek(0)
+            data = np.frombuffer(fh.read(), dtype='u1')
+
+    arrays = {}
+    for key, entry in header['arrays'].items():
+        dtype = np.dtype(entry['dtype'])
+        shape = tuple(entry['shape'])
+        start = data_start + entry['offset']
+        nbytes = int(np.prod(shape, dtype='i8')) * dtype.itemsize
+        arrays[key] = data[start:start + nbytes].view(dtype).reshape(shape)
+
+    index = arrays.pop('__index__', None)
+    return Geometry(arrays, index=index, primitive=Primitives(header['primitive']),
+                    winding_order=WindingOrders(header['winding_order']))
+
+
+def load_cached(file, cache, loader, **kwargs):
+    """
+    Loads a geometry through a binary cache.
+
+    Entries are keyed by the source path, its modification time and size, the loader
+    and its keyword arguments. A warm start memory-maps the cached container instead
+    of parsing the source; a cold start parses it and writes the container atomically,
+    so concurrent processes can safely share one cache directory.
+
+    Parameters
+    ----------
+    file : str or file-like object
+        Path to the source file, or a file object with a ``name``. Objects without a
+        name (e.g. `io.StringIO`) bypass the cache.
+    cache : str
+        Directory holding the cached containers; created on demand.
+    loader : callable
+        Parses the source; called as ``loader(file, **kwargs)`` on a cache miss.
+
+    Returns
+    -------
+    Geometry
+    """
+    path = file if isinstance(file, str) else getattr(file, 'name', None)
+    if not isinstance(path, str) or not os.path.isfile(path):
+        return loader(file, **kwargs)
+
+    stat = os.stat(path)
+    key = json.dumps([
+        os.path.abspath(path), stat.st_mtime_ns, stat.st_size, loader.__name__,
+        sorted((k, repr(v)) for k, v in kwargs.items()),
+    ])
+    cached = os.path.join(cache, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.geom')
+    if os.path.exists(cached):
+        return load_geometry(cached)
+
+    geometry = loader(file, **kwargs)
+    os.makedirs(cache, exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=cache, suffix='.tmp')
+    os.close(fd)
+    try:
+        save_geometry(geometry, temp)
+        os.replace(temp, cached)
+    except BaseException:
+        os.remove(temp)
+        raise
+    return geometry
+
+
+class _ScenePickler(pickle.Pickler):
+    """Pickles geometries by reference to a container file written next to the scene."""
+
+    def __init__(self, fh, directory):
+        super().__init__(fh, protocol=pickle.HIGHEST_PROTOCOL)
+        self.directory = directory
+        self.geometries = {}
+
+    def persistent_id(self, obj):
+        if not isinstance(obj, Geometry):
+            return None
+        name = self.geometries.get(id(obj))
+        if name is None:
+            name = self.geometries[id(obj)] = f"geometry_{len(self.geometries)}.geom"
+            save_geometry(obj, os.path.join(self.directory, name))
+        return name
+
+
+class _SceneUnpickler(pickle.Unpickler):
+    def __init__(self, fh, directory, mmap):
+        super().__init__(fh)
+        self.directory = directory
+        self.mmap = mmap
+        self.geometries = {}
+
+    def persistent_load(self, name):
+        if name not in self.geometries:
+            self.geometries[name] = load_geometry(os.path.join(self.directory, name), mmap=self.mmap)
+        return self.geometries[name]
+
+
+def save_scene(scene, directory):
+    """
+    Writes a scene to a directory, for sharing it with other processes.
+
+    Every geometry goes to its own `save_geometry` container; the nodes, materials
+    and anything else reachable from `scene` are pickled, referencing those files.
+
+    Parameters
+    ----------
+    scene : object
+        A scene, or any picklable object referencing nodes and geometries.
+    directory : str
+        Created on demand.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "scene.pickle"), mode="wb") as fh:
+        _ScenePickler(fh, directory).dump(scene)
+
+
+def load_scene(directory, mmap=True):
+    """
+    Reads a scene written by `save_scene`.
+
+    Parameters
+    ----------
+    directory : str
+    mmap : bool
+        Memory-map the geometry arrays; processes loading the same scene then share
+        a single copy of them.
+
+    Returns
+    -------
+    object
+        The object passed to `save_scene`; geometries shared between nodes stay shared.
+    """
+    with open(os.path.join(directory, "scene.pickle"), mode="rb") as fh:
+        return _SceneUnpickler(fh, directory, mmap).load()
@@ -1,44 +1,136 @@
-from functools import lru_cache
-import os
+from collections.abc import MutableMapping
+import itertools
 
-__all__ = ('Material', 'MeshBasicMaterial', 'MeshPhongMaterial')
+from .renderers.uniforms import MATERIAL_BLOCKS
+from .shaderlib import shader_library
 
+__all__ = ('Material', 'MeshBasicMaterial', 'MeshPhongMaterial', 'Uniforms')
 
-@lru_cache(maxsize=None)
-def load_shader_sources(key):
+# versions of uniform values; unique across all materials
+uniform_versions = itertools.count(1)
+
+
+def load_shader_sources(key, defines=None):
     """
-    Load all built-in shaders from filesystem.
+    Load a built-in shader, preprocessed for the given defines.
 
     Returns
     -------
-    dict of dict
-        Mapping of shader key to mapping of shader type to shader source.
+    dict
+        Mapping of shader type to shader source; see `ShaderLibrary.load`.
+    """
+    return shader_library.load(key, defines)
+
+
+def load_instanced_shader_sources(key, defines=None):
+    """
+    Load the instanced variant of a built-in shader.
+
+    The variant is built with ``INSTANCED`` defined; it reads the per-instance
+    ``model_view_matrix`` and ``normal_matrix`` as vertex attributes instead of uniforms.
     """
-    shader_sources = {}
-    shader_path = os.path.join(os.path.dirname(__file__), 'shaders')
-    for filename in filter(lambda fn: fn.startswith(f"{key}."), os.listdir(shader_path)):
-        _, ext = os.path.splitext(filename)
-        with open(os.path.join(shader_path, filename)) as fh:
-            shader_sources[ext[1:]] = fh.read()
-    return shader_sources
+    return load_shader_sources(key, dict(defines or {}, INSTANCED=True))
+
+
+class Uniforms(MutableMapping):
+    """
+    Uniform values of a material.
+
+    Every assignment bumps `version`, so renderers upload the values again only after
+    they changed; arrays modified in place must be assigned again.
+
+    Parameters
+    ----------
+    values : dict, optional
+    """
+
+    def __init__(self, values=None):
+        self._values = dict(values or {})
+        self.version = next(uniform_versions)
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __setitem__(self, key, value):
+        self._values[key] = value
+        self.version = next(uniform_versions)
+
+    def __delitem__(self, key):
+        del self._values[key]
+        self.version = next(uniform_versions)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return f"Uniforms({self._values!r})"
+
+    def __setstate__(self, state):
+        # versions are only unique within a process
+        self.__dict__.update(state)
+        self.version = next(uniform_versions)
 
 
 class Material:
-    def __init__(self, shaders=None, uniforms=None):
+    def __init__(self, shaders=None, uniforms=None, instanced_shaders=None, block=()):
         self.shaders = shaders or {}
-        self.uniforms = uniforms or {}
+        self.uniforms = uniforms
+        # optional variant used to draw many meshes sharing geometry and material at once
+        self.instanced_shaders = instanced_shaders
+        # (name, default) members of the Material uniform block of the shaders, see `MATERIAL_BLOCKS`
+        self.block = block
+
+    def variant(self, instanced=False, clustered=False):
+        """
+        Get the shaders drawing the material.
+
+        Parameters
+        ----------
+        instanced : bool
+            Reading the model view and normal matrices per instance.
+        clustered : bool
+            Shading the lights of the cluster of every fragment, see `LightClusters`;
+            materials that do not support it ignore it.
+
+        Returns
+        -------
+        dict
+            Mapping of shader type to source.
+        """
+        return self.instanced_shaders if instanced else self.shaders
+
+    @property
+    def uniforms(self):
+        return self._uniforms
+
+    @uniforms.setter
+    def uniforms(self, value):
+        self._uniforms = value if isinstance(value, Uniforms) else Uniforms(value)
 
 
 class MeshBasicMaterial(Material):
     def __init__(self, color=(1.0, 0.0, 0.0, 1.0)):
         super().__init__(shaders=load_shader_sources('meshbasic'), uniforms={
             'color': color
-        })
+        }, instanced_shaders=load_instanced_shader_sources('meshbasic'), block=MATERIAL_BLOCKS['meshbasic'])
 
 
 class MeshPhongMaterial(Material):
-    def __init__(self, color=(1.0, 0.0, 0.0, 1.0), shininess=4.0):
-        super().__init__(shaders=load_shader_sources('meshphong'), uniforms={
+    def __init__(self, color=(1.0, 0.0, 0.0, 1.0), shininess=4.0, flat_shading=False):
+        # preprocessor defines of the shader variants
+        self.defines = {'FLAT_SHADING': True} if flat_shading else {}
+        super().__init__(shaders=load_shader_sources('meshphong', self.defines), uniforms={
             'color': color,
             'shininess': shininess
-        })
+        }, instanced_shaders=load_instanced_shader_sources('meshphong', self.defines), block=MATERIAL_BLOCKS['meshphong'])
+
+    def variant(self, instanced=False, clustered=False):
+        if not clustered:
+            return super().variant(instanced)
+        defines = dict(self.defines, CLUSTERED_LIGHTS=True)
+        if instanced:
+            defines['INSTANCED'] = True
+        return load_shader_sources('meshphong', defines)
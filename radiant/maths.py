@@ -2,21 +2,458 @@ import numpy as np
 import pyrr
 
 
-__all__ = ('decompose',)
+__all__ = (
+    'decompose', 'quaternion_to_matrix', 'quaternion_from_matrix', 'quaternion_multiply', 'quaternion_slerp', 'compose',
+    'look_at', 'perspective', 'affine_inverse', 'normal_matrix',
+    'frustum_planes', 'transform_spheres', 'transform_boxes', 'spheres_in_frustum',
+)
 
 
-def decompose(matrix44):
-    # indexing pyrr matrices is not a pleasant experience, so let's
-    matrix44 = np.asarray(matrix44)
+def decompose(matrices, out=None):
+    """
+    Splits a batch of model matrices into scales, rotations and translations.
 
-    scale = np.linalg.norm(matrix44[:3, :3], axis=0)
+    Inverse of `compose`, for matrices without shear. A negative determinant is
+    attributed to the scale along x.
 
-    det = np.linalg.det(matrix44)
-    if det < 0:
-        scale[0] *= -1
+    Parameters
+    ----------
+    matrices : (N, 4, 4) array
+    out : tuple of (N, 3), (N, 4) and (N, 3) arrays, optional
+        Buffers to write the scales, rotations and translations to.
 
-    position = matrix44[3, :3]
+    Returns
+    -------
+    tuple
+        The (N, 3) scales, (N, 4) quaternions in (x, y, z, w) order and (N, 3)
+        translations; pyrr types for a single matrix.
+    """
+    matrices = np.asarray(matrices)
+    if out is None:
+        shape = matrices.shape[:-2]
+        out = np.empty(shape + (3,), matrices.dtype), np.empty(shape + (4,), matrices.dtype), np.empty(shape + (3,), matrices.dtype)
+    scale, rotation, position = out
 
-    rotation = matrix44[:3, :3] * (1 / scale)
+    # scaling comes first, so row i of the upper 3x3 block is axis i of the rotation times scale i
+    linear = matrices[..., :3, :3]
+    np.sqrt((linear * linear).sum(axis=-1), out=scale)
+    flip = (np.cross(linear[..., 0, :], linear[..., 1, :]) * linear[..., 2, :]).sum(axis=-1) < 0
+    scale[..., 0] = np.where(flip, -scale[..., 0], scale[..., 0])
+    quaternion_from_matrix(linear / scale[..., :, None], out=rotation)
+    position[...] = matrices[..., 3, :3]
 
-    return pyrr.Vector3(scale), pyrr.Quaternion.from_matrix(rotation), pyrr.Vector3(position)
+    if matrices.ndim == 2:
+        return pyrr.Vector3(scale), pyrr.Quaternion(rotation), pyrr.Vector3(position)
+    return scale, rotation, position
+
+
+def quaternion_to_matrix(quaternions, out=None):
+    """
+    Converts a batch of quaternions to rotation matrices.
+
+    Follows the conventions of `pyrr.matrix33.create_from_quaternion`.
+
+    Parameters
+    ----------
+    quaternions : (N, 4) array
+        Quaternions in (x, y, z, w) order; need not be normalized.
+    out : (N, 3, 3) array, optional
+        Buffer to write the result to.
+
+    Returns
+    -------
+    (N, 3, 3) array
+    """
+    quaternions = np.asarray(quaternions)
+    if out is None:
+        out = np.empty(quaternions.shape[:-1] + (3, 3), dtype=quaternions.dtype)
+    x, y, z, w = quaternions[..., 0], quaternions[..., 1], quaternions[..., 2], quaternions[..., 3]
+    xx, yy, zz, ww = x * x, y * y, z * z, w * w
+    xy, zw, xz, yw, yz, xw = x * y, z * w, x * z, y * w, y * z, x * w
+    invs = 1 / (xx + yy + zz + ww)
+    out[..., 0, 0] = (xx - yy - zz + ww) * invs
+    out[..., 1, 1] = (-xx + yy - zz + ww) * invs
+    out[..., 2, 2] = (-xx - yy + zz + ww) * invs
+    invs *= 2
+    out[..., 1, 0] = (xy + zw) * invs
+    out[..., 0, 1] = (xy - zw) * invs
+    out[..., 2, 0] = (xz - yw) * invs
+    out[..., 0, 2] = (xz + yw) * invs
+    out[..., 2, 1] = (yz + xw) * invs
+    out[..., 1, 2] = (yz - xw) * invs
+    return out
+
+
+def quaternion_slerp(start, end, t, out=None):
+    """
+    Spherically interpolates between batches of unit quaternions.
+
+    Takes the shortest path, like `pyrr.quaternion.slerp`; nearly parallel
+    quaternions are linearly interpolated and renormalized instead.
+
+    Parameters
+    ----------
+    start, end : (N, 4) array
+        Quaternions in (x, y, z, w) order.
+    t : (N,) array or float
+        Interpolation factors in [0, 1].
+    out : (N, 4) array, optional
+        Buffer to write the result to.
+
+    Returns
+    -------
+    (N, 4) array
+    """
+    start, end = np.asarray(start), np.asarray(end)
+    t = np.asarray(t, dtype=start.dtype)[..., None]
+    dot = (start * end).sum(axis=-1, keepdims=True)
+    # q and -q are the same rotation
+    sign = np.where(dot < 0, -1, 1).astype(start.dtype)
+    dot = np.minimum(dot * sign, 1)
+    angle = np.arccos(dot)
+    sin = np.sin(angle)
+    linear = sin < 1e-3
+    sin[linear] = 1
+    a = np.where(linear, 1 - t, np.sin((1 - t) * angle) / sin)
+    b = np.where(linear, t, np.sin(t * angle) / sin) * sign
+    result = np.add(start * a, end * b, out=out)
+    result /= np.linalg.norm(result, axis=-1, keepdims=True)
+    return result
+
+
+def quaternion_multiply(a, b, out=None):
+    """
+    Multiplies batches of quaternions.
+
+    Follows the conventions of `pyrr.quaternion.cross`: the rotation matrix of the
+    product is ``quaternion_to_matrix(a) @ quaternion_to_matrix(b)``.
+
+    Parameters
+    ----------
+    a, b : (N, 4) array
+        Quaternions in (x, y, z, w) order.
+    out : (N, 4) array, optional
+        Buffer to write the result to; must not overlap the inputs.
+
+    Returns
+    -------
+    (N, 4) array
+    """
+    a, b = np.asarray(a), np.asarray(b)
+    if out is None:
+        out = np.empty(np.broadcast_shapes(a.shape, b.shape), dtype=np.result_type(a, b))
+    ax, ay, az, aw = a[..., 0], a[..., 1], a[..., 2], a[..., 3]
+    bx, by, bz, bw = b[..., 0], b[..., 1], b[..., 2], b[..., 3]
+    out[..., 0] = ax * bw + ay * bz - az * by + aw * bx
+    out[..., 1] = -ax * bz + ay * bw + az * bx + aw * by
+    out[..., 2] = ax * by - ay * bx + az * bw + aw * bz
+    out[..., 3] = -ax * bx - ay * by - az * bz + aw * bw
+    return out
+
+
+def quaternion_from_matrix(matrices, out=None):
+    """
+    Converts a batch of rotation matrices to unit quaternions.
+
+    Inverse of `quaternion_to_matrix`. Each quaternion is derived from its largest
+    component, which keeps the conversion accurate for any rotation.
+
+    Parameters
+    ----------
+    matrices : (N, 3, 3) array
+        Rotation matrices; the upper 3x3 block of larger matrices is used.
+    out : (N, 4) array, optional
+        Buffer to write the result to.
+
+    Returns
+    -------
+    (N, 4) array
+        Quaternions in (x, y, z, w) order.
+    """
+    m = np.asarray(matrices)[..., :3, :3]
+    if out is None:
+        out = np.empty(m.shape[:-2] + (4,), dtype=m.dtype)
+    m00, m11, m22 = m[..., 0, 0], m[..., 1, 1], m[..., 2, 2]
+    # four times the squares of x, y, z and w
+    squares = np.stack([1 + m00 - m11 - m22, 1 - m00 + m11 - m22, 1 - m00 - m11 + m22, 1 + m00 + m11 + m22], axis=-1)
+    # the off-diagonal sums and differences are four times the products of pairs of components
+    xy, xz, yz = m[..., 1, 0] + m[..., 0, 1], m[..., 0, 2] + m[..., 2, 0], m[..., 2, 1] + m[..., 1, 2]
+    xw, yw, zw = m[..., 2, 1] - m[..., 1, 2], m[..., 0, 2] - m[..., 2, 0], m[..., 1, 0] - m[..., 0, 1]
+    candidates = np.stack([
+        np.stack([squares[..., 0], xy, xz, xw], axis=-1),
+        np.stack([xy, squares[..., 1], yz, yw], axis=-1),
+        np.stack([xz, yz, squares[..., 2], zw], axis=-1),
+        np.stack([xw, yw, zw, squares[..., 3]], axis=-1),
+    ], axis=-2)
+    largest = squares.argmax(axis=-1)[..., None, None]
+    best = np.take_along_axis(candidates, largest, axis=-2)[..., 0, :]
+    norm = np.take_along_axis(squares, largest[..., 0], axis=-1)
+    np.multiply(best, 0.5 / np.sqrt(norm), out=out)
+    return out
+
+
+def compose(position, rotation, scale, out=None):
+    """
+    Builds a batch of model matrices from translations, rotations and scales.
+
+    Equivalent to ``translate * rotation * scale`` with pyrr matrices, i.e. scale,
+    then rotate, then translate, in the row-vector layout used throughout radiant.
+
+    Parameters
+    ----------
+    position : (N, 3) array
+    rotation : (N, 4) array
+        Quaternions in (x, y, z, w) order.
+    scale : (N, 3) array
+    out : (N, 4, 4) array, optional
+        Buffer to write the result to.
+
+    Returns
+    -------
+    (N, 4, 4) array
+    """
+    position = np.asarray(position)
+    if out is None:
+        out = np.empty(position.shape[:-1] + (4, 4), dtype=position.dtype)
+    quaternion_to_matrix(rotation, out=out[..., :3, :3])
+    out[..., :3, :3] *= np.asarray(scale)[..., :, None]
+    out[..., :3, 3] = 0
+    out[..., 3, :3] = position
+    out[..., 3, 3] = 1
+    return out
+
+
+def look_at(eye, target, up, out=None):
+    """
+    Builds a batch of view matrices of cameras at `eye` looking at `target`.
+
+    Follows the conventions of `pyrr.matrix44.create_look_at`.
+
+    Parameters
+    ----------
+    eye, target, up : (N, 3) array
+    out : (N, 4, 4) array, optional
+        Buffer to write the result to.
+
+    Returns
+    -------
+    (N, 4, 4) array
+    """
+    eye, target, up = np.asarray(eye), np.asarray(target), np.asarray(up)
+    dtype = np.result_type(eye, target, up, np.float32)
+    if out is None:
+        out = np.empty(np.broadcast_shapes(eye.shape, target.shape, up.shape)[:-1] + (4, 4), dtype=dtype)
+    forward = np.subtract(target, eye, dtype=dtype)
+    forward /= np.sqrt((forward * forward).sum(axis=-1, keepdims=True))
+    side = _cross(forward, up)
+    side /= np.sqrt((side * side).sum(axis=-1, keepdims=True))
+    up = _cross(side, forward)
+    up /= np.sqrt((up * up).sum(axis=-1, keepdims=True))
+    # the axes of the camera are the columns of the rotation
+    out[..., :3, 0] = side
+    out[..., :3, 1] = up
+    out[..., :3, 2] = -forward
+    out[..., :3, 3] = 0
+    out[..., 3, 0] = -(side * eye).sum(axis=-1)
+    out[..., 3, 1] = -(up * eye).sum(axis=-1)
+    out[..., 3, 2] = (forward * eye).sum(axis=-1)
+    out[..., 3, 3] = 1
+    return out
+
+
+def perspective(fovy, aspect, near, far, out=None):
+    """
+    Builds a batch of perspective projection matrices.
+
+    Follows the conventions of `pyrr.matrix44.create_perspective_projection`.
+
+    Parameters
+    ----------
+    fovy : (N,) array or float
+        Vertical field of view, in degrees.
+    aspect : (N,) array or float
+        Width over height.
+    near, far : (N,) array or float
+        Distances of the clipping planes.
+    out : (N, 4, 4) array, optional
+        Buffer to write the result to.
+
+    Returns
+    -------
+    (N, 4, 4) array
+    """
+    fovy, aspect, near, far = np.broadcast_arrays(*(np.asarray(value, dtype='f8') for value in (fovy, aspect, near, far)))
+    if out is None:
+        out = np.empty(fovy.shape + (4, 4), dtype='f8')
+    ymax = near * np.tan(fovy * np.pi / 360.0)
+    out[...] = 0
+    out[..., 0, 0] = near / (ymax * aspect)
+    out[..., 1, 1] = near / ymax
+    out[..., 2, 2] = -(far + near) / (far - near)
+    out[..., 2, 3] = -1
+    out[..., 3, 2] = -2 * far * near / (far - near)
+    return out
+
+
+def _cross(a, b):
+    # np.cross, without its overhead for small batches
+    return np.stack([
+        a[..., 1] * b[..., 2] - a[..., 2] * b[..., 1],
+        a[..., 2] * b[..., 0] - a[..., 0] * b[..., 2],
+        a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0],
+    ], axis=-1)
+
+
+# rows and columns of the 2x2 minors of a 3x3 matrix, by the element they are the cofactor of
+_NEXT, _AFTER = np.array([1, 2, 0]), np.array([2, 0, 1])
+
+
+def _inverse_transpose3(matrices):
+    """Inverse transposes of the upper 3x3 blocks: their cofactor matrices over their determinants."""
+    # in double precision; in single precision the error would exceed that of np.linalg.inv
+    m = np.asarray(matrices[..., :3, :3], dtype=np.result_type(matrices.dtype, np.float64))
+    rows, columns = _NEXT[:, None], _NEXT[None, :]
+    rows2, columns2 = _AFTER[:, None], _AFTER[None, :]
+    cofactors = m[..., rows, columns] * m[..., rows2, columns2] - m[..., rows, columns2] * m[..., rows2, columns]
+    cofactors /= (m[..., 0, :] * cofactors[..., 0, :]).sum(axis=-1)[..., None, None]
+    return cofactors
+
+
+def affine_inverse(matrices, out=None):
+    """
+    Inverts a batch of affine transformation matrices.
+
+    Cheaper than `np.linalg.inv`, by inverting the upper 3x3 block only; the last
+    column must be (0, 0, 0, 1), as for all model and view matrices.
+
+    Parameters
+    ----------
+    matrices : (N, 4, 4) array
+    out : (N, 4, 4) array, optional
+        Buffer to write the result to.
+
+    Returns
+    -------
+    (N, 4, 4) array
+    """
+    matrices = np.asarray(matrices)
+    if out is None:
+        out = np.empty_like(matrices)
+    inverse = np.swapaxes(_inverse_transpose3(matrices), -1, -2)
+    out[..., 3, :3] = -np.matmul(matrices[..., 3, None, :3], inverse)[..., 0, :]
+    out[..., :3, :3] = inverse
+    out[..., :3, 3] = 0
+    out[..., 3, 3] = 1
+    return out
+
+
+def normal_matrix(matrices, out=None):
+    """
+    Builds the matrices transforming normals of a batch of affine transformations.
+
+    The transposes of the inverses of the matrices, i.e.
+    ``np.linalg.inv(matrices).transpose((0, 2, 1))``, see `affine_inverse`.
+
+    Parameters
+    ----------
+    matrices : (N, 4, 4) array
+    out : (N, 4, 4) array, optional
+        Buffer to write the result to.
+
+    Returns
+    -------
+    (N, 4, 4) array
+    """
+    matrices = np.asarray(matrices)
+    if out is None:
+        out = np.empty_like(matrices)
+    inverse_transpose = _inverse_transpose3(matrices)
+    out[..., :3, 3] = -np.matmul(inverse_transpose, matrices[..., 3, :3, None])[..., 0]
+    out[..., :3, :3] = inverse_transpose
+    out[..., 3, :3] = 0
+    out[..., 3, 3] = 1
+    return out
+
+
+def frustum_planes(view_projection):
+    """
+    Extracts the planes of a view frustum.
+
+    Parameters
+    ----------
+    view_projection : (4, 4) array
+        ``projection * view`` with pyrr matrices; clip coordinates are ``[x, y, z, 1] @ view_projection``.
+
+    Returns
+    -------
+    (6, 4) array
+        Left, right, bottom, top, near and far planes as (a, b, c, d), normalized
+        such that ``a * x + b * y + c * z + d`` is the signed distance to the plane,
+        positive on the inside.
+    """
+    m = np.asarray(view_projection, dtype='f8')
+    w = m[:, 3]
+    planes = np.stack([w + m[:, 0], w - m[:, 0], w + m[:, 1], w - m[:, 1], w + m[:, 2], w - m[:, 2]])
+    return planes / np.linalg.norm(planes[:, :3], axis=1)[:, None]
+
+
+def transform_spheres(centers, radii, matrices):
+    """
+    Transforms a batch of bounding spheres by model matrices.
+
+    Parameters
+    ----------
+    centers : (N, 3) array
+    radii : (N,) array
+    matrices : (N, 4, 4) array
+
+    Returns
+    -------
+    tuple
+        The (N, 3) centers and conservative (N,) radii, scaled by the largest axis scale.
+    """
+    matrices = np.asarray(matrices)
+    centers = np.matmul(np.asarray(centers)[:, None, :], matrices[:, :3, :3])[:, 0] + matrices[:, 3, :3]
+    scale = np.sqrt((matrices[:, :3, :3] ** 2).sum(axis=2).max(axis=1))
+    return centers, np.asarray(radii) * scale
+
+
+def transform_boxes(lower, upper, matrices):
+    """
+    Transforms a batch of axis aligned bounding boxes by model matrices.
+
+    Parameters
+    ----------
+    lower, upper : (N, 3) array
+    matrices : (N, 4, 4) array
+
+    Returns
+    -------
+    tuple
+        The (N, 3) lower and upper corners of the axis aligned boxes enclosing the transformed boxes.
+    """
+    lower, upper, matrices = np.asarray(lower), np.asarray(upper), np.asarray(matrices)
+    centers = (lower + upper) / 2
+    extents = (upper - lower) / 2
+    centers = np.matmul(centers[:, None, :], matrices[:, :3, :3])[:, 0] + matrices[:, 3, :3]
+    extents = np.matmul(extents[:, None, :], np.abs(matrices[:, :3, :3]))[:, 0]
+    return centers - extents, centers + extents
+
+
+def spheres_in_frustum(centers, radii, planes):
+    """
+    Tests which spheres intersect a frustum.
+
+    Parameters
+    ----------
+    centers : (N, 3) array
+    radii : (N,) array
+    planes : (6, 4) array
+        See `frustum_planes`.
+
+    Returns
+    -------
+    (N,) bool array
+    """
+    distances = np.asarray(centers) @ planes[:, :3].T + planes[:, 3]
+    return (distances >= -np.asarray(radii)[:, None]).all(axis=1)
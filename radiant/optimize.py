@@ -0,0 +1,199 @@
+import numpy as np
+
+from .geometries import Geometry, Primitives, WindingOrders
+
+
+__all__ = ('acmr', 'optimize_vertex_cache')
+
+
+def _triangles(geometry):
+    if geometry.primitive is not Primitives.TRIANGLES:
+        raise ValueError(f"can only optimize triangles, not {geometry.primitive.name}")
+    if geometry.index is None:
+        raise ValueError("can only optimize indexed geometries, see load_obj_indexed")
+    return np.asarray(geometry.index).reshape((-1, 3))
+
+
+def acmr(geometry, cache_size=16):
+    """
+    Average cache miss ratio of drawing an indexed geometry.
+
+    Simulates a FIFO post-transform cache of `cache_size` vertices, as in most
+    GPUs. Ranges from 3, for no reuse at all, down to about 0.5 for regular meshes.
+
+    Parameters
+    ----------
+    geometry : Geometry or array
+        An indexed triangle geometry, or its index.
+    cache_size : int
+
+    Returns
+    -------
+    float
+        Number of vertices transformed per triangle.
+    """
+    index = _triangles(geometry) if isinstance(geometry, Geometry) else np.asarray(geometry)
+    n_triangles = index.size // 3
+    if not n_triangles:
+        return 0.0
+    # a vertex is cached while less than cache_size misses happened since it was loaded
+    stamps = [-cache_size] * (int(index.max()) + 1)
+    misses = 0
+    for vertex in index.ravel().tolist():
+        if misses - stamps[vertex] >= cache_size:
+            stamps[vertex] = misses
+            misses += 1
+    return misses / n_triangles
+
+
+def _tipsify(triangles, n_vertices, cache_size):
+    """
+    Triangle order of the Tipsify algorithm (Sander et al. 2007).
+
+    Triangles are emitted as fans around a vertex, and the next fanning vertex is
+    chosen among the vertices just emitted, preferring the ones that are still
+    cached and will be completed soonest.
+
+    Returns
+    -------
+    tuple
+        The triangle order, and the positions in it where the cache had to be
+        refilled; the latter split the order into independent clusters.
+    """
+    corners = triangles.ravel()
+    counts = np.bincount(corners, minlength=n_vertices)
+    # triangles around each vertex, as a flattened adjacency list
+    offsets = np.concatenate([[0], np.cumsum(counts)]).tolist()
+    adjacency = (np.argsort(corners, kind='stable') // 3).tolist()
+    corner_list = corners.tolist()
+    live = counts.tolist()
+    stamps = [-cache_size - 1] * n_vertices
+    emitted = bytearray(len(triangles))
+
+    order, breaks, dead_ends = [], [0], []
+    time = cache_size + 1
+    cursor = 0
+    fanning = int(np.argmax(counts > 0)) if len(corners) else -1
+    while fanning >= 0:
+        # the vertices emitted around this fan are the candidates for the next one
+        start = len(dead_ends)
+        for t in adjacency[offsets[fanning]:offsets[fanning + 1]]:
+            if emitted[t]:
+                continue
+            emitted[t] = 1
+            order.append(t)
+            triangle = corner_list[3 * t:3 * t + 3]
+            dead_ends.extend(triangle)
+            for vertex in triangle:
+                live[vertex] -= 1
+                if time - stamps[vertex] > cache_size:
+                    stamps[vertex] = time
+                    time += 1
+
+        # the candidate staying in the cache while its remaining triangles are emitted, loaded earliest
+        fanning, best = -1, -1
+        for vertex in dead_ends[start:]:
+            remaining = live[vertex]
+            if remaining > 0:
+                age = time - stamps[vertex]
+                priority = age if age + 2 * remaining <= cache_size else 0
+                if priority > best:
+                    fanning, best = vertex, priority
+        if fanning >= 0:
+            continue
+
+        # dead end: the most recent vertex with triangles left, or the next one in order
+        breaks.append(len(order))
+        while dead_ends:
+            vertex = dead_ends.pop()
+            if live[vertex] > 0:
+                fanning = vertex
+                break
+        else:
+            while cursor < n_vertices and live[cursor] <= 0:
+                cursor += 1
+            fanning = cursor if cursor < n_vertices else -1
+    breaks = np.unique(breaks)
+    return np.array(order, dtype='i8'), breaks[breaks < len(order)]
+
+
+def _overdraw_order(pos, triangles, breaks, cluster_size, winding_order):
+    """
+    Order of clusters of triangles, by decreasing occlusion potential (Sander et al. 2007).
+
+    Clusters facing away from the center of the mesh are likely to occlude the
+    others, so they are drawn first.
+    """
+    starts = np.union1d(breaks, np.arange(0, len(triangles), cluster_size))
+    cluster = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(triangles))))
+    v0, v1, v2 = pos[triangles[:, 0]], pos[triangles[:, 1]], pos[triangles[:, 2]]
+    # area weighted, outward facing normals
+    normals = np.cross(v1 - v0, v2 - v0)
+    if winding_order is WindingOrders.CW:
+        normals = -normals
+    centroids = (v0 + v1 + v2) / 3
+    areas = np.linalg.norm(normals, axis=1)
+
+    def cluster_sums(values):
+        return np.stack([np.bincount(cluster, weights=values[:, i], minlength=len(starts)) for i in range(3)], axis=1)
+
+    total = max(areas.sum(), np.finfo('f8').tiny)
+    center = (centroids * areas[:, None]).sum(axis=0) / total
+    weights = np.maximum(np.bincount(cluster, weights=areas, minlength=len(starts)), np.finfo('f8').tiny)
+    cluster_centroids = cluster_sums(centroids * areas[:, None]) / weights[:, None]
+    potential = ((cluster_centroids - center) * cluster_sums(normals)).sum(axis=1)
+    ranks = np.argsort(-potential, kind='stable')
+    # triangles keep their order within a cluster
+    return np.argsort(np.argsort(ranks)[cluster], kind='stable')
+
+
+def optimize_vertex_cache(geometry, cache_size=16, overdraw=False, cluster_size=512, return_acmr=False):
+    """
+    Reorders the triangles and vertices of an indexed geometry for the GPU.
+
+    Triangles are reordered for the post-transform vertex cache with Tipsify,
+    then vertices are renumbered in order of first use, so they are fetched
+    sequentially.
+
+    Parameters
+    ----------
+    geometry : Geometry
+        An indexed triangle geometry.
+    cache_size : int
+        Number of vertices in the simulated cache; a bit smaller than the actual one works best.
+    overdraw : bool
+        Also reorder clusters of triangles so outer surfaces are drawn first, and
+        early depth testing rejects more of the hidden fragments. Costs a little ACMR.
+    cluster_size : int
+        Maximum number of triangles per cluster of the overdraw reordering.
+    return_acmr : bool
+        Also return the ACMR before and after, see `acmr`.
+
+    Returns
+    -------
+    Geometry
+        The optimized geometry; and a (before, after) tuple of ACMR if requested.
+    """
+    triangles = _triangles(geometry)
+    n_vertices = len(geometry.attributes['pos'])
+    order, breaks = _tipsify(triangles, n_vertices, cache_size)
+    optimized = triangles[order]
+    if overdraw and len(optimized):
+        pos = np.asarray(geometry.attributes['pos'], dtype='f8')
+        optimized = optimized[_overdraw_order(pos, optimized, breaks, cluster_size, geometry.winding_order)]
+
+    # vertices in order of first use; unused ones at the end
+    corners = optimized.ravel()
+    _, first = np.unique(corners, return_index=True)
+    used = corners[np.sort(first)]
+    unused = np.setdiff1d(np.arange(n_vertices), used, assume_unique=True)
+    vertex_order = np.concatenate([used, unused])
+    remap = np.empty(n_vertices, dtype='i8')
+    remap[vertex_order] = np.arange(n_vertices)
+
+    attributes = {name: np.asarray(values)[vertex_order] for name, values in geometry.attributes.computed().items()}
+    index = remap[optimized].astype(geometry.index.dtype).reshape(np.shape(geometry.index))
+    result = Geometry(attributes, index=index, primitive=geometry.primitive, winding_order=geometry.winding_order)
+    if return_acmr:
+        return result, (acmr(triangles, cache_size), acmr(index, cache_size))
+    return result
@@ -0,0 +1,362 @@
+import collections
+from collections.abc import Mapping
+import re
+
+import numpy as np
+
+from .geometries import Geometry
+from .scenes import Mesh
+
+
+__all__ = ('PackedGeometry', 'pack_geometry', 'pack_scene', 'format_packing_report', 'encode_octahedral', 'decode_octahedral')
+
+
+def encode_octahedral(normals):
+    """
+    Map unit vectors onto the [-1, 1] square of an octahedral projection.
+
+    Returns
+    -------
+    (N, 2) array
+    """
+    normals = np.asarray(normals, dtype='f8')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        xy = np.nan_to_num(normals[:, :2] / np.abs(normals).sum(axis=1, keepdims=True))
+    # the lower hemisphere is folded over the diagonals
+    lower = normals[:, 2] < 0
+    signs = np.where(xy[lower] >= 0, 1.0, -1.0)
+    xy[lower] = (1 - np.abs(xy[lower][:, ::-1])) * signs
+    return xy
+
+
+def decode_octahedral(xy):
+    """
+    Inverse of `encode_octahedral`.
+
+    Returns
+    -------
+    (N, 3) array
+        Unit vectors.
+    """
+    xy = np.asarray(xy, dtype='f8')
+    normals = np.empty((len(xy), 3))
+    normals[:, :2] = xy
+    normals[:, 2] = 1 - np.abs(xy).sum(axis=1)
+    fold = np.maximum(-normals[:, 2], 0)[:, None]
+    normals[:, :2] -= np.where(xy >= 0, fold, -fold)
+    return normals / np.linalg.norm(normals, axis=1, keepdims=True)
+
+
+# GLSL decoding octahedral encodings, inserted into vertex shaders that need it
+OCTAHEDRAL_GLSL = """vec3 decode_octahedral(vec2 e) {
+    vec3 n = vec3(e, 1.0 - abs(e.x) - abs(e.y));
+    float t = max(-n.z, 0.0);
+    n.xy -= vec2(e.x >= 0.0 ? t : -t, e.y >= 0.0 ? t : -t);
+    return normalize(n);
+}"""
+
+
+def _unorm(values, dtype):
+    limit = np.iinfo(dtype).max
+    return np.round(np.clip(values, 0, 1) * limit).astype(dtype)
+
+
+def _snorm(values, dtype):
+    limit = np.iinfo(dtype).max
+    return np.round(np.clip(values, -1, 1) * limit).astype(dtype)
+
+
+# encoding -> (numpy type, moderngl type, GLSL expression decoding the fetched value, or None)
+# integers are fetched as unnormalized floats; their scale is applied in the shader
+_ENCODINGS = {
+    'f4': ('f4', 'f', None),
+    'f2': ('f2', 'f2', None),
+    'i2': ('i2', 'i2', None),
+    'i1': ('i1', 'i1', '({} / 127.0)'),
+    'u2': ('u2', 'u2', '({} / 65535.0)'),
+    'oct': ('i2', 'i2', 'decode_octahedral({} / 32767.0)'),
+}
+
+# encodings supported per attribute; other attributes are stored as float32
+_ATTRIBUTE_ENCODINGS = {
+    'pos': ('f4', 'f2', 'i2'),
+    'normal': ('f4', 'f2', 'i1', 'oct'),
+    'uv': ('f4', 'f2', 'u2'),
+}
+
+# one field of the interleaved vertex buffer
+Field = collections.namedtuple('Field', ['name', 'attribute', 'encoding', 'components', 'offset', 'nbytes', 'format'])
+
+
+class _PackedAttributes(Mapping):
+    """Read-only mapping of attribute name to the float32 values decoded from a `PackedGeometry`."""
+
+    def __init__(self, geometry):
+        self._geometry = geometry
+
+    def __getitem__(self, name):
+        return self._geometry.decode(name)
+
+    def __iter__(self):
+        return iter(self._geometry.fields)
+
+    def __len__(self):
+        return len(self._geometry.fields)
+
+    def computed(self):
+        return {name: self[name] for name in self}
+
+
+class PackedGeometry(Geometry):
+    """
+    Geometry whose vertex attributes are interleaved in a single, compactly encoded buffer.
+
+    Created with `pack_geometry`. The vertex buffer and the index are uploaded
+    as they are. `attributes` decodes the original attributes on every access,
+    for code working on the CPU; bounds are computed once.
+
+    Parameters
+    ----------
+    vertices : (N,) structured array
+        Interleaved vertex data, with a field per attribute.
+    fields : dict of str to Field
+        Layout of the attributes in `vertices`.
+    index : array, optional
+        Vertex index; uint16 or int32.
+    decode_matrix : (4, 4) array, optional
+        Transform from the stored to the original positions, for quantized positions.
+        Renderers premultiply it to the model view matrix.
+    source_nbytes : int
+        Number of bytes of the geometry this one was packed from.
+    """
+
+    def __init__(self, vertices, fields, index=None, decode_matrix=None, source_nbytes=0, **kwargs):
+        self.vertices = vertices
+        self.fields = fields
+        self.decode_matrix = decode_matrix
+        self.source_nbytes = source_nbytes
+        super().__init__(_PackedAttributes(self), index=index, **kwargs)
+
+    @property
+    def nbytes(self):
+        """Number of bytes of the vertex buffer and the index."""
+        return self.vertices.nbytes + (self.index.nbytes if self.index is not None else 0)
+
+    def format_for(self, attributes):
+        """
+        moderngl format of a vertex, skipping the fields a program does not read.
+
+        Parameters
+        ----------
+        attributes : container of str
+            Names of the shader attributes of the program.
+
+        Returns
+        -------
+        tuple
+            The format string and the list of attribute names it binds.
+        """
+        attributes = set(attributes)
+        formats, names = [], []
+        offset = 0
+        for field in self.fields.values():
+            if field.offset > offset:
+                formats.append(f"{field.offset - offset}x")
+            if field.attribute in attributes:
+                formats.append(field.format)
+                names.append(field.attribute)
+            else:
+                formats.append(f"{field.nbytes}x")
+            offset = field.offset + field.nbytes
+        if self.vertices.dtype.itemsize > offset:
+            formats.append(f"{self.vertices.dtype.itemsize - offset}x")
+        return " ".join(formats), names
+
+    def patch_shaders(self, shaders):
+        """
+        Adapt a mapping of shader type to source to the attribute encodings.
+
+        Vertex shader inputs of attributes that need decoding, e.g. ``in vec3 normal;``,
+        are replaced by an input of the packed field, ``normal_packed``, and a macro
+        decoding it under the original name. Quantized positions need no patching;
+        they are decoded by the decode matrix.
+        """
+        source = shaders.get('vert')
+        if source is None:
+            return shaders
+        for field in self.fields.values():
+            decode = _ENCODINGS[field.encoding][2]
+            if field.attribute == field.name:
+                continue
+            declaration = re.compile(rf"^in\s+vec\d\s+{field.name}\s*;", re.MULTILINE)
+            replacement = f"in vec{field.components} {field.attribute};\n"
+            if field.encoding == 'oct':
+                replacement += OCTAHEDRAL_GLSL + "\n"
+            replacement += f"#define {field.name} {decode.format(field.attribute)}"
+            source = declaration.sub(lambda _: replacement, source, count=1)
+        return dict(shaders, vert=source)
+
+    def decode(self, name):
+        """
+        Decode an attribute to float32.
+        """
+        field = self.fields[name]
+        values = self.vertices[name]
+        if name == 'pos' and self.decode_matrix is not None:
+            values = values * np.diag(self.decode_matrix)[:3] + self.decode_matrix[3, :3]
+        elif field.encoding == 'oct':
+            values = decode_octahedral(values / np.iinfo('i2').max)
+        elif field.encoding in ('i1', 'u2'):
+            values = values / np.iinfo(field.encoding).max
+        return np.asarray(values, dtype='f4')
+
+    def _get_bounds(self):
+        if self._bounds is None:
+            pos = self.attributes['pos']
+            lower, upper = pos.min(axis=0), pos.max(axis=0)
+            center = (lower + upper) / 2
+            radius = np.sqrt(((pos - center) ** 2).sum(axis=1).max())
+            self._bounds = (None, (lower, upper), (center, radius))
+        return self._bounds
+
+
+def pack_geometry(geometry, position='i2', normal='oct', uv='u2', narrow_index=True):
+    """
+    Interleave the attributes of a geometry into a single buffer of compact encodings.
+
+    Every field is aligned to 4 bytes. With the default encodings a vertex with
+    position, normal and uv takes 16 instead of 32 bytes.
+
+    Parameters
+    ----------
+    geometry : Geometry
+    position : {'f4', 'f2', 'i2'}
+        Positions as floats, half floats, or int16 quantized within the bounding
+        box, which `PackedGeometry.decode_matrix` maps back.
+    normal : {'f4', 'f2', 'i1', 'oct'}
+        Normals as floats, half floats, normalized int8, or octahedral encodings
+        as normalized int16.
+    uv : {'f4', 'f2', 'u2'}
+        Texture coordinates as floats, half floats or normalized uint16; the latter
+        are clamped to [0, 1].
+    narrow_index : bool
+        Store the index as uint16 if there are less than 65536 vertices.
+
+    Other attributes are stored as float32, if they are computed already.
+
+    Returns
+    -------
+    PackedGeometry
+    """
+    encodings = {'pos': position, 'normal': normal, 'uv': uv}
+    for name, encoding in encodings.items():
+        if encoding not in _ATTRIBUTE_ENCODINGS[name]:
+            raise ValueError(f"{encoding!r} is not an encoding of {name}, use one of {_ATTRIBUTE_ENCODINGS[name]}")
+
+    # the encoded attributes are packed even if they still have to be generated
+    attributes = dict(geometry.attributes.computed())
+    attributes.update((name, geometry.attributes[name]) for name in encodings if name in geometry.attributes and name not in attributes)
+
+    columns = {}
+    decode_matrix = None
+    source_nbytes = 0
+    for name, values in attributes.items():
+        values = np.asarray(values)
+        source_nbytes += values.nbytes
+        encoding = encodings.get(name, 'f4')
+        if name == 'pos' and encoding == 'i2':
+            lower, upper = values.min(axis=0), values.max(axis=0)
+            center = (lower + upper) / 2
+            half = np.maximum((upper - lower) / 2, np.finfo('f4').tiny)
+            limit = np.iinfo('i2').max
+            decode_matrix = np.diag(np.append(half / limit, 1.0)).astype('f4')
+            decode_matrix[3, :3] = center
+            values = _snorm((values - center) / half, 'i2')
+        elif encoding == 'oct':
+            values = _snorm(encode_octahedral(values), 'i2')
+        elif encoding == 'i1':
+            values = _snorm(values, 'i1')
+        elif encoding == 'u2':
+            values = _unorm(values, 'u2')
+        else:
+            values = values.astype(encoding)
+        columns[name] = (encoding, values)
+
+    fields = {}
+    dtype = {'names': [], 'formats': [], 'offsets': []}
+    offset = 0
+    for name, (encoding, values) in columns.items():
+        numpy_type, mgl_type, decode = _ENCODINGS[encoding]
+        components = values.shape[-1]
+        nbytes = components * values.dtype.itemsize
+        attribute = name if decode is None else f"{name}_packed"
+        fields[name] = Field(name, attribute, encoding, components, offset, nbytes, f"{components}{mgl_type}")
+        dtype['names'].append(name)
+        dtype['formats'].append((numpy_type, components))
+        dtype['offsets'].append(offset)
+        # keep every field 4 byte aligned
+        offset += -(-nbytes // 4) * 4
+    dtype['itemsize'] = offset
+
+    n_vertices = len(next(iter(columns.values()))[1]) if columns else 0
+    vertices = np.zeros(n_vertices, dtype=np.dtype(dtype))
+    for name, (_, values) in columns.items():
+        vertices[name] = values
+
+    index = geometry.index
+    if index is not None:
+        index = np.asarray(index)
+        source_nbytes += index.nbytes
+        if narrow_index and n_vertices <= 1 << 16:
+            index = index.astype('u2')
+
+    return PackedGeometry(
+        vertices, fields, index=index, decode_matrix=decode_matrix, source_nbytes=source_nbytes,
+        primitive=geometry.primitive, winding_order=geometry.winding_order)
+
+
+# bytes of a mesh before and after packing its geometry
+PackingReport = collections.namedtuple('PackingReport', ['mesh', 'source_nbytes', 'nbytes'])
+
+
+def pack_scene(root, **kwargs):
+    """
+    Pack the geometries of all meshes in a subtree, in place.
+
+    Geometries shared by meshes are packed once, and stay shared. Keyword
+    arguments are passed to `pack_geometry`.
+
+    Returns
+    -------
+    list of PackingReport
+        A row per mesh, in scene order.
+    """
+    packed = {}
+    report = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Mesh):
+            geometry = node.geometry
+            if not isinstance(geometry, PackedGeometry):
+                if id(geometry) not in packed:
+                    packed[id(geometry)] = (geometry, pack_geometry(geometry, **kwargs))
+                geometry = node.geometry = packed[id(geometry)][1]
+            report.append(PackingReport(node, geometry.source_nbytes, geometry.nbytes))
+        stack.extend(reversed(node.children))
+    return report
+
+
+def format_packing_report(report):
+    """
+    Format the rows of `pack_scene` as a table of bytes saved per mesh, with totals.
+    """
+    lines = [f"{'mesh':>6s} {'source':>12s} {'packed':>12s} {'saved':>12s} {'ratio':>6s}"]
+    for i, row in enumerate(report):
+        ratio = row.nbytes / row.source_nbytes if row.source_nbytes else 1.0
+        lines.append(f"{i:6d} {row.source_nbytes:12d} {row.nbytes:12d} {row.source_nbytes - row.nbytes:12d} {ratio:6.2f}")
+    # shared geometries only count once
+    unique = {id(row.mesh.geometry): row for row in report}.values()
+    source, total = sum(row.source_nbytes for row in unique), sum(row.nbytes for row in unique)
+    lines.append(f"{'total':>6s} {source:12d} {total:12d} {source - total:12d} {total / source if source else 1.0:6.2f}")
+    return "\n".join(lines)
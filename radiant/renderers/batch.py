@@ -0,0 +1,166 @@
+import collections
+import concurrent.futures
+import functools
+import time
+
+import numpy as np
+
+
+__all__ = ('BatchRenderer', 'save_images')
+
+
+class BatchRenderer:
+    """
+    Render a scene from a sequence of cameras into offscreen images.
+
+    Frames are rendered round robin into `buffers` framebuffers, and read back
+    asynchronously into pixel buffers: the pixels of a frame are only mapped once
+    `buffers - 1` later frames have been submitted, so the GPU renders ahead
+    while the CPU prepares the next frames and the previous ones are encoded on a
+    thread pool.
+
+    Parameters
+    ----------
+    renderer : ModernGLRenderer
+    size : tuple of int
+        Width and height of the images.
+    buffers : int
+        Number of frames in flight; 2 for double, 3 for triple buffering.
+    components : int
+        Number of color components to read back, 3 for RGB and 4 for RGBA.
+    workers : int
+        Number of threads handling finished frames.
+    max_pending : int, optional
+        Number of finished frames that may wait for a worker before rendering
+        blocks; twice the number of workers by default.
+
+    Attributes
+    ----------
+    stats : dict
+        Number of frames, seconds and frames per second of the last batch.
+    """
+
+    def __init__(self, renderer, size=(512, 512), buffers=3, components=3, workers=4, max_pending=None):
+        if buffers < 1:
+            raise ValueError("at least one buffer is needed")
+        self.renderer = renderer
+        self.ctx = ctx = renderer.ctx
+        self.size = tuple(size)
+        self.components = components
+        self.workers = workers
+        self.max_pending = max_pending if max_pending is not None else 2 * workers
+        self.stats = {}
+        self._renderbuffers = [(ctx.renderbuffer(self.size), ctx.depth_renderbuffer(self.size)) for _ in range(buffers)]
+        self._framebuffers = [ctx.framebuffer(color, depth) for color, depth in self._renderbuffers]
+        nbytes = self.size[0] * self.size[1] * components
+        self._pixel_buffers = [ctx.buffer(reserve=nbytes, dynamic=True) for _ in range(buffers)]
+
+    def _read(self, pbo):
+        # rows start at the bottom in OpenGL
+        width, height = self.size
+        return np.frombuffer(pbo.read(), dtype='u1').reshape((height, width, self.components))[::-1]
+
+    def frames(self, scene, cameras, light=None):
+        """
+        Render the scene from every camera.
+
+        Yields
+        ------
+        tuple
+            The index of the camera and its (height, width, components) uint8 image,
+            top row first, in camera order.
+        """
+        in_flight = collections.deque()
+        slot = 0
+        for index, camera in enumerate(cameras):
+            fbo, pbo = self._framebuffers[slot], self._pixel_buffers[slot]
+            slot = (slot + 1) % len(self._framebuffers)
+            if len(in_flight) == len(self._framebuffers):
+                # the slot is about to be reused; wait for its frame
+                done, done_pbo = in_flight.popleft()
+                yield done, self._read(done_pbo)
+
+            fbo.use()
+            self.renderer.render(scene, camera, light=light, finish=False)
+            fbo.read_into(pbo, components=self.components, alignment=1)
+            in_flight.append((index, pbo))
+
+        while in_flight:
+            done, done_pbo = in_flight.popleft()
+            yield done, self._read(done_pbo)
+
+    def render(self, scene, cameras, light=None, sink=None):
+        """
+        Render the scene from every camera and pass the images to a sink.
+
+        Parameters
+        ----------
+        scene : Object3D
+        cameras : iterable of Camera
+        light : PointLight, optional
+        sink : callable, optional
+            Called as ``sink(index, image)`` on a worker thread for every frame;
+            see `save_images`. Exceptions raised by the sink are re-raised here.
+
+        Returns
+        -------
+        list
+            The results of the sink per camera, or the images without a sink.
+        """
+        start = time.perf_counter()
+        results = []
+        if sink is None:
+            results = [image for _, image in self.frames(scene, cameras, light=light)]
+        else:
+            pending = collections.deque()
+            with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+                for index, image in self.frames(scene, cameras, light=light):
+                    pending.append(executor.submit(sink, index, image))
+                    while len(pending) > self.max_pending:
+                        results.append(pending.popleft().result())
+                results.extend(future.result() for future in pending)
+
+        seconds = time.perf_counter() - start
+        self.stats = {
+            'frames': len(results),
+            'seconds': seconds,
+            'fps': len(results) / seconds if seconds else float('inf'),
+        }
+        return results
+
+    def release(self):
+        """Release the framebuffers and pixel buffers."""
+        for fbo, (color, depth), pbo in zip(self._framebuffers, self._renderbuffers, self._pixel_buffers):
+            fbo.release()
+            color.release()
+            depth.release()
+            pbo.release()
+        self._framebuffers, self._renderbuffers, self._pixel_buffers = [], [], []
+
+
+def _save_image(pattern, index, image):
+    from PIL import Image
+
+    filename = pattern.format(index)
+    mode = 'RGBA' if image.shape[2] == 4 else 'RGB'
+    Image.fromarray(np.ascontiguousarray(image), mode).save(filename)
+    return filename
+
+
+def save_images(pattern):
+    """
+    Make a `BatchRenderer.render` sink saving every frame to an image file.
+
+    The sink can be pickled, so it can run in the workers of a `RenderFarm` too.
+
+    Parameters
+    ----------
+    pattern : str
+        File name, formatted with the index of the frame, e.g. ``"frame_{:05d}.png"``.
+
+    Returns
+    -------
+    callable
+        Returns the file name of every frame it saved.
+    """
+    return functools.partial(_save_image, pattern)
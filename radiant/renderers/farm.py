@@ -0,0 +1,189 @@
+import collections
+import concurrent.futures
+import copy
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from .batch import BatchRenderer
+from .moderngl import create_standalone_context, ModernGLRenderer
+from ..loaders import load_scene, save_scene
+
+
+__all__ = ('RenderFarm',)
+
+
+# state of a worker process: the scene it loaded and its context
+_worker = None
+
+
+def _render_chunk(directory, size, context_factory, renderer_kwargs, sink, jobs):
+    global _worker
+    if _worker is None or _worker[0] != directory:
+        if _worker is not None:
+            _worker[2].release()
+        ctx = context_factory()
+        renderer = ModernGLRenderer(ctx, **renderer_kwargs)
+        shared = load_scene(directory)
+        _worker = (directory, shared, BatchRenderer(renderer, size=size, workers=1))
+    _, shared, batch = _worker
+
+    indices = [index for index, _ in jobs]
+    results = []
+    for position, image in batch.frames(shared['scene'], [camera for _, camera in jobs], light=shared['light']):
+        results.append(image if sink is None else sink(indices[position], image))
+    return results
+
+
+def _detached(camera):
+    """Copy of a camera without its parent and children, so jobs do not pickle the scene."""
+    camera = copy.copy(camera)
+    camera._parent = None
+    camera._children = tuple()
+    camera._graph = camera._row = None
+    camera._position = camera._position.copy()
+    camera.dirty = True
+    return camera
+
+
+class RenderFarm:
+    """
+    Render a scene from many cameras on a pool of processes.
+
+    The scene is written once with `radiant.save_scene`, by default to shared
+    memory (``/dev/shm``) where available. Every worker memory-maps the same
+    geometry arrays instead of receiving a copy, and renders on its own standalone
+    context with a `BatchRenderer`.
+
+    Cameras are sent to the workers in chunks, and results come back in camera
+    order. When a worker process dies, the pool is restarted and its unfinished
+    chunks are submitted again, up to `max_restarts` times. Exceptions raised while
+    rendering or by the sink are re-raised to the caller.
+
+    Parameters
+    ----------
+    scene : Object3D
+    light : PointLight, optional
+    size : tuple of int
+        Width and height of the images.
+    workers : int, optional
+        Number of processes; the number of CPUs by default.
+    chunk_size : int
+        Number of cameras per job; frames within a chunk are pipelined.
+    sink : callable, optional
+        Called as ``sink(index, image)`` in the worker for every frame; its result
+        is returned instead of the image. Must be picklable, see `save_images`.
+    context_factory : callable
+        Creates the context of a worker; must be picklable.
+    renderer_kwargs : dict, optional
+        Keyword arguments of the `ModernGLRenderer` of every worker.
+    directory : str, optional
+        Where to write the scene; a temporary directory, removed on `close`, by default.
+    max_restarts : int
+        Number of times a broken pool is restarted before giving up.
+    start_method : str, optional
+        Multiprocessing start method, e.g. ``'spawn'``; the platform default otherwise.
+
+    Attributes
+    ----------
+    stats : collections.Counter
+        Number of frames rendered, chunks submitted and pool restarts.
+    """
+
+    def __init__(self, scene, light=None, size=(512, 512), workers=None, chunk_size=4, sink=None,
+                 context_factory=create_standalone_context, renderer_kwargs=None, directory=None,
+                 max_restarts=2, start_method=None):
+        self.size = tuple(size)
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.sink = sink
+        self.context_factory = context_factory
+        self.renderer_kwargs = dict(renderer_kwargs or {})
+        self.max_restarts = max_restarts
+        self.start_method = start_method
+        self.stats = collections.Counter()
+
+        self._temporary = directory is None
+        if directory is None:
+            shm = '/dev/shm'
+            directory = tempfile.mkdtemp(prefix='radiant-', dir=shm if os.path.isdir(shm) else None)
+        self.directory = directory
+        scene.update_subtree()
+        save_scene({'scene': scene, 'light': light}, directory)
+        self._executor = None
+
+    def _start(self):
+        kwargs = {}
+        if self.start_method is not None:
+            kwargs['mp_context'] = multiprocessing.get_context(self.start_method)
+        self._executor = concurrent.futures.ProcessPoolExecutor(self.workers, **kwargs)
+
+    def _submit(self, jobs):
+        if self._executor is None:
+            self._start()
+        self.stats['chunks'] += 1
+        try:
+            return self._executor.submit(
+                _render_chunk, self.directory, self.size, self.context_factory, self.renderer_kwargs, self.sink, jobs)
+        except concurrent.futures.process.BrokenProcessPool as error:
+            # a worker died since the last result; fail the chunk like the ones in flight, so it is submitted again
+            future = concurrent.futures.Future()
+            future.set_exception(error)
+            return future
+
+    def render(self, cameras):
+        """
+        Render the scene from every camera.
+
+        Yields
+        ------
+        tuple
+            The index of the camera and its image, or the result of the sink, in
+            camera order as soon as they are available.
+        """
+        cameras = iter(enumerate(cameras))
+        # bound the number of chunks in flight, so results can stream
+        window = 2 * self.workers
+        pending = collections.deque()
+        restarts = 0
+        while True:
+            while len(pending) < window:
+                jobs = [(index, _detached(camera)) for index, camera in itertools.islice(cameras, self.chunk_size)]
+                if not jobs:
+                    break
+                pending.append((jobs, self._submit(jobs)))
+            if not pending:
+                return
+
+            jobs, future = pending[0]
+            try:
+                results = future.result()
+            except concurrent.futures.process.BrokenProcessPool:
+                restarts += 1
+                self.stats['restarts'] += 1
+                if restarts > self.max_restarts:
+                    raise
+                self._executor.shutdown(wait=False)
+                self._start()
+                pending = collections.deque((jobs, self._submit(jobs)) for jobs, _ in pending)
+                continue
+            pending.popleft()
+            self.stats['frames'] += len(results)
+            for (index, _), result in zip(jobs, results):
+                yield index, result
+
+    def close(self):
+        """Stop the workers, and remove the shared scene if it was written to a temporary directory."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._temporary and os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,97 +1,479 @@
-from functools import lru_cache
+import collections
+import math
+import weakref
 
-import ModernGL
+import moderngl
 import numpy as np
 
 from .base import Renderer
-from ..scenes import Mesh
+from .profiling import NULL_PHASE
+from .resources import ResourceManager
+from .uniforms import BLOCK_BINDINGS, FRAME_BLOCK, OBJECT_STRIDE, pack_std140
+from ..clusters import LightClusters, perspective_depth_range
+from ..maths import frustum_planes, normal_matrix, spheres_in_frustum, transform_spheres
+from ..scenes import LOD, Mesh
+
+
+# a single draw call; uniforms holds the per-draw uniforms and instances the instance count
+RenderItem = collections.namedtuple('RenderItem', ['sort_key', 'vao', 'geometry', 'material', 'uniforms', 'instances'])
+
+# texture units of the light data read by the clustered shaders; kept clear of material textures
+LIGHT_TEXTURE_UNITS = {'light_data': 13, 'cluster_data': 14, 'light_indices': 15}
+# width of the texture of light indices, see the CLUSTERED_LIGHTS variant of meshphong.frag
+LIGHT_INDICES_WIDTH = 4096
+
+
+def create_standalone_context(**kwargs):
+    """
+    Create a moderngl context without a window.
+
+    Falls back to EGL where the default backend of the platform cannot create a
+    context, e.g. on Linux servers without an X display.
+    """
+    try:
+        return moderngl.create_standalone_context(**kwargs)
+    except Exception as error:
+        # glcontext reports a backend that cannot create a context as a plain Exception
+        if type(error) is not Exception or 'backend' in kwargs:
+            raise
+        try:
+            return moderngl.create_standalone_context(backend='egl', **kwargs)
+        except Exception as egl_error:
+            raise egl_error from error
 
 
 class ModernGLRenderer(Renderer):
-    def __init__(self, context):
+    def __init__(self, context, budget=None, max_idle_frames=60, instancing_threshold=2, frustum_culling=True, profiler=None, light_clusters=(16, 9, 24),
+                 program_cache=None):
         self.ctx = context
+        # optional Profiler receiving a record per frame; costs next to nothing when None
+        self.profiler = profiler
+        # skip meshes whose bounding sphere lies outside the view frustum
+        self.frustum_culling = frustum_culling
+        # meshes sharing geometry and material are drawn instanced from this group size on
+        self.instancing_threshold = instancing_threshold
+        # programs, buffers and vertex arrays; see ResourceManager
+        self.resources = ResourceManager(context, budget=budget, max_idle_frames=max_idle_frames, program_cache=program_cache)
+        # subdivision of the view frustum assigning many lights to the fragments they reach
+        self.light_clusters = LightClusters(light_clusters)
+        # statistics of the last frame
+        self.stats = {}
+        # frame uniforms of the clustered shaders while rendering many lights; None otherwise
+        self._light_uniforms = None
+        # name -> (texture, size) of the light data
+        self._light_textures = {}
+        # per node: (camera key, node version, model view matrix, normal matrix)
+        self._matrices = weakref.WeakKeyDictionary()
+        # state of the last draw call
+        self._program = None
+        self._vao = None
+        self._front_face = None
+        self._material_buffer = None
 
-    def render(self, scene, camera, light=None):
+    def render(self, scene, camera, light=None, lights=None, finish=True):
         """
         Render scene from the camera viewpoint.
+
+        Materials with a clustered variant, see `Material.variant`, are lit by all of `lights`, a sequence of
+        `PointLight`, instead of the single `light`; see `cluster_lights`.
+
+        Unless `finish` is set, this returns once the draw calls are issued, without
+        waiting for the GPU to complete them.
         """
-        camera.update()
-        if light:
-            light.update()
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.begin_frame()
+            resource_stats = collections.Counter(self.resources.stats)
+
+        with self._phase('update'):
+            camera.update()
+            if light:
+                light.update()
+            for node in lights or ():
+                node.update()
+            # only dirty subtrees are visited
+            self.stats = {'matrices_updated': scene.update_subtree()}
+
+        self._light_uniforms = None
+        if lights is not None:
+            with self._phase('lights'):
+                self._light_uniforms = self.cluster_lights(lights, camera)
 
-        def visit(node):
-            node.update()
-            self.render_object(node, camera, light=light)
-            for child in node.children:
-                visit(child)
+        with self._phase('gather'):
+            meshes = self.collect(scene, camera)
+        if self.frustum_culling:
+            with self._phase('cull'):
+                visible = self.cull(meshes, camera)
+            self.stats['culled'] = len(meshes) - len(visible)
+            meshes = visible
+        with self._phase('matrices'):
+            computed = self.update_matrices(meshes, camera)
+        self.stats['matrices_computed'] = computed
+        self.stats['matrices_cached'] = len(meshes) - computed
 
         # get going
-        self.ctx.enable(ModernGL.DEPTH_TEST)
-        self.ctx.enable(ModernGL.CULL_FACE)
+        self.ctx.enable(moderngl.DEPTH_TEST)
+        self.ctx.enable(moderngl.CULL_FACE)
         self.ctx.clear(0.9, 0.9, 0.9)
-        visit(scene)
-        self.ctx.finish()
+        with self._phase('prepare'):
+            items = self.render_list(meshes, camera)
+        with self._phase('draw'), self._gpu_timer():
+            self.draw(items, camera, light=light)
+        if finish:
+            with self._phase('finish'):
+                self.ctx.finish()
+        self.resources.end_frame()
+
+        if profiler is not None:
+            if finish:
+                profiler.read_gpu()
+            resource_stats = collections.Counter(self.resources.stats) - resource_stats
+            profiler.end_frame(stats=dict(self.stats), resources=dict(resource_stats))
+
+    def _phase(self, name):
+        if self.profiler is None:
+            return NULL_PHASE
+        return self.profiler.phase(name)
+
+    def _gpu_timer(self):
+        if self.profiler is None:
+            return NULL_PHASE
+        return self.profiler.gpu_timer(self.ctx)
+
+    def collect(self, scene, camera):
+        """
+        Gather the meshes to draw, in scene order; an `LOD` contributes only its selected level.
+
+        Returns
+        -------
+        list of Mesh
+        """
+        meshes = []
+        stack = [scene]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Mesh):
+                meshes.append(node)
+            if isinstance(node, LOD):
+                selected = node.select(camera)
+                children = (selected,) if selected is not None else ()
+            else:
+                children = node.children
+            stack.extend(reversed(children))
+        return meshes
+
+    def cull(self, meshes, camera):
+        """
+        Select the meshes whose world space bounding sphere intersects the view frustum.
+
+        Returns
+        -------
+        list of Mesh
+        """
+        if not meshes or getattr(camera, 'projection', None) is None:
+            return list(meshes)
+        spheres = [node.geometry.bounding_sphere for node in meshes]
+        centers, radii = transform_spheres(
+            np.array([center for center, _ in spheres]),
+            np.array([radius for _, radius in spheres]),
+            np.stack([np.asarray(node.model) for node in meshes]),
+        )
+        visible = spheres_in_frustum(centers, radii, frustum_planes(camera.projection * camera.view))
+        return [node for node, keep in zip(meshes, visible) if keep]
+
+    def cluster_lights(self, lights, camera):
+        """
+        Assign point lights to the clusters of the view frustum and upload them for the clustered shaders.
+
+        The view space positions, ranges and colors of the lights, the light lists of
+        all clusters and their offsets are stored in float textures, so a fragment
+        only loops over the lights of its own cluster.
+
+        Returns
+        -------
+        dict
+            Frame uniforms of the clustered shaders.
+        """
+        view = np.asarray(camera.view, dtype='f8')
+        positions = np.array([np.asarray(node.model)[3, :3] for node in lights], dtype='f8').reshape((-1, 3))
+        positions = positions @ view[:3, :3] + view[3, :3]
+        radii = np.array([np.inf if node.distance is None else node.distance for node in lights], dtype='f8')
+        colors = np.array([np.multiply(node.color, node.intensity) for node in lights], dtype='f4').reshape((-1, 3))
+        offsets, counts, indices = self.light_clusters.assign(positions, radii, camera.projection)
+
+        nx, ny, nz = self.light_clusters.grid
+        light_data = np.zeros((2, max(len(lights), 1), 4), dtype='f4')
+        light_data[0, :len(lights), :3] = positions
+        light_data[0, :len(lights), 3] = np.minimum(radii, np.finfo('f4').max)
+        light_data[1, :len(lights), :3] = colors
+        cluster_data = np.stack([offsets, counts], axis=-1).astype('f4').reshape((nz, nx * ny, 2))
+        index_data = np.zeros((max(-(-len(indices) // LIGHT_INDICES_WIDTH), 1), LIGHT_INDICES_WIDTH, 1), dtype='f4')
+        index_data.flat[:len(indices)] = indices
+        for name, data in (('light_data', light_data), ('cluster_data', cluster_data), ('light_indices', index_data)):
+            self._light_texture(name, data)
+
+        self.stats['lights'] = len(lights)
+        self.stats['light_assignments'] = len(indices)
+        self.stats['max_cluster_lights'] = int(counts.max())
+
+        near, far = perspective_depth_range(camera.projection)
+        _, _, width, height = self.ctx.viewport
+        uniforms = dict(LIGHT_TEXTURE_UNITS)
+        uniforms['cluster_grid'] = np.array((nx, ny, nz), dtype='i4')
+        uniforms['cluster_scale'] = (nx / width, ny / height, float(self.light_clusters.slice_scale(near, far)), float(near))
+        return uniforms
+
+    def _light_texture(self, name, data):
+        height, width, components = data.shape
+        texture, size = self._light_textures.get(name, (None, None))
+        if size != (width, height):
+            if texture is not None:
+                texture.release()
+            texture = self.ctx.texture((width, height), components, data.tobytes(), dtype='f4')
+            self._light_textures[name] = (texture, (width, height))
+        else:
+            texture.write(data.tobytes())
+        texture.use(LIGHT_TEXTURE_UNITS[name])
+
+    def update_matrices(self, nodes, camera):
+        """
+        Bring the cached model view and normal matrices of the nodes up to date.
+
+        Matrices are only recomputed for nodes that moved, or all of them when the
+        camera moved, in a single batched call.
+
+        Returns
+        -------
+        int
+            Number of nodes whose matrices were recomputed.
+        """
+        camera_key = (id(camera), camera.version)
+        stale = []
+        for node in nodes:
+            entry = self._matrices.get(node)
+            if entry is None or entry[0] != camera_key or entry[1] != node.version:
+                stale.append(node)
+        if not stale:
+            return 0
+
+        models = np.stack([np.asarray(node.model) for node in stale])
+        # camera.view * node.model
+        model_views = np.matmul(models, np.asarray(camera.view))
+        normals = normal_matrix(model_views)
+        for node, model_view, normal in zip(stale, model_views, normals):
+            self._matrices[node] = (camera_key, node.version, model_view, normal)
+        return len(stale)
+
+    def group_instances(self, meshes):
+        """
+        Group meshes sharing geometry and material, if the material has an instanced variant.
+
+        Returns
+        -------
+        list of list of Mesh
+        """
+        groups = {}
+        for node in meshes:
+            if node.material.instanced_shaders is None:
+                groups[id(node)] = [node]
+            else:
+                groups.setdefault((id(node.geometry), id(node.material)), []).append(node)
+        return list(groups.values())
+
+    def render_list(self, meshes, camera):
+        """
+        Build the draw calls for the meshes, sorted to minimize state changes.
+
+        Draw calls are ordered by program, then roughly front to back, so the depth
+        test can reject hidden fragments early, then by vertex array and winding order.
+        Depths are compared in buckets doubling in size with the distance, so nearby
+        meshes sharing a vertex array are still drawn in a row, and exactly last.
+
+        Returns
+        -------
+        list of RenderItem
+        """
+        items = []
+        for group in self.group_instances(meshes):
+            if len(group) >= self.instancing_threshold:
+                items.append(self.instanced_item(group, camera))
+            else:
+                items.extend(self.render_item(node, camera) for node in group)
+        items.sort(key=lambda item: item.sort_key)
+        return items
+
+    def _sort_key(self, vao, geometry, depth):
+        bucket = math.floor(math.log2(max(depth, 1e-6)))
+        return id(vao.program), bucket, id(vao), geometry.winding_order.value, depth
+
+    def _get_matrices(self, node, camera):
+        entry = self._matrices.get(node)
+        if entry is None or entry[0] != (id(camera), camera.version) or entry[1] != node.version:
+            self.update_matrices([node], camera)
+            entry = self._matrices[node]
+        return entry[2], entry[3]
+
+    def shaders(self, material, instanced=False):
+        """
+        Get the shaders drawing a material, in the variant matching the current lighting.
+        """
+        return material.variant(instanced=instanced, clustered=self._light_uniforms is not None)
 
-    @lru_cache(maxsize=None)
     def get_vertex_array(self, node):
-        # get the shader program
-        mapping = {
-            'vert': self.ctx.vertex_shader,
-            'geom': self.ctx.geometry_shader,
-            'frag': self.ctx.fragment_shader,
+        return self.resources.vertex_array(self.shaders(node.material), node.geometry)
+
+    def render_item(self, node, camera):
+        """
+        Build the draw call of a single mesh.
+        """
+        vao = self.get_vertex_array(node)
+        model_view_matrix, normal_matrix = self._get_matrices(node, camera)
+        decode_matrix = getattr(node.geometry, 'decode_matrix', None)
+        if decode_matrix is not None:
+            # quantized positions are mapped back by the vertex transform; normals are not affected
+            model_view_matrix = decode_matrix @ model_view_matrix
+        uniforms = {
+            'model_view_matrix': model_view_matrix,
+            'normal_matrix': normal_matrix,
         }
-        shaders = [mapping[key](source) for key, source in node.material.shaders.items()]
-        prog = self.ctx.program(shaders)
+        # the camera looks down the negative z axis
+        depth = -model_view_matrix[3, 2]
+        return RenderItem(self._sort_key(vao, node.geometry, depth), vao, node.geometry, node.material, uniforms, None)
 
-        # build the vertex buffers
-        vertex_buffers = [
-            (self.ctx.buffer(data.tobytes()), f"{data.shape[-1]}{data.dtype.kind}", [key])
-            for key, data in node.geometry.attributes.items() if key in prog.attributes
-        ]
+    def instanced_item(self, nodes, camera):
+        """
+        Build a single instanced draw call for meshes sharing geometry and material.
 
-        vao_args = [prog, vertex_buffers]
+        The model view and normal matrices of the meshes are packed into a per-instance
+        buffer, read by the instanced variant of the material shaders.
+        """
+        geometry, material = nodes[0].geometry, nodes[0].material
+        self.update_matrices(nodes, camera)
+        data = np.empty((len(nodes), 2, 4, 4), dtype='f4')
+        for i, node in enumerate(nodes):
+            _, _, data[i, 0], data[i, 1] = self._matrices[node]
+        decode_matrix = getattr(geometry, 'decode_matrix', None)
+        if decode_matrix is not None:
+            data[:, 0] = np.matmul(decode_matrix, data[:, 0])
 
-        # build the index buffers
-        if node.geometry.index is not None:
-            index_buffer = self.ctx.buffer(node.geometry.index.tobytes())
-            vao_args.append(index_buffer)
+        attributes = [('16f', 'model_view_matrix'), ('16f', 'normal_matrix')]
+        vao = self.resources.instanced_vertex_array(
+            self.shaders(material, instanced=True), geometry, (id(geometry), id(material)), data, attributes)
+        depth = -data[:, 0, 3, 2].max()
+        return RenderItem(self._sort_key(vao, geometry, depth), vao, geometry, material, {}, len(nodes))
 
-        # construct the vertex array
-        return self.ctx.vertex_array(*vao_args)
+    def draw(self, items, camera, light=None):
+        """
+        Issue the draw calls, skipping redundant state changes and uniform writes.
+
+        Per-frame data goes into the ``Frame`` uniform block, written once. The
+        ``Object`` blocks of all single draws are packed into one buffer, so a draw
+        only binds its range. ``Material`` blocks are bound when the material changes,
+        and uploaded only when its uniforms did. Uniforms outside of these blocks,
+        e.g. of custom shaders, are written one by one.
+        """
+        for key in ('draw_calls', 'program_binds', 'vertex_array_binds', 'state_changes', 'uniform_writes', 'uniform_skips', 'uniform_block_binds'):
+            self.stats.setdefault(key, 0)
+        # the context may have been used by others in between frames
+        self._program = self._vao = self._front_face = self._material_buffer = None
+
+        frame_uniforms = {
+            'projection_matrix': camera.projection,
+            'view_matrix': camera.view,
+        }
+        if self._light_uniforms is not None:
+            frame_uniforms.update(self._light_uniforms)
+        if light:
+            frame_uniforms.update(light.uniforms)
+        frame = pack_std140(frame_uniforms.get(name, default) for name, default in FRAME_BLOCK)
+        self.resources.stream_buffer('frame', frame).bind_to_uniform_block(BLOCK_BINDINGS['Frame'])
+        self.stats['uniform_block_binds'] += 1
+
+        singles = [item for item in items if item.instances is None]
+        objects = np.zeros((len(singles), OBJECT_STRIDE // 4), dtype='f4')
+        for i, item in enumerate(singles):
+            objects[i, :16] = np.asarray(item.uniforms['model_view_matrix']).ravel()
+            objects[i, 16:32] = np.asarray(item.uniforms['normal_matrix']).ravel()
+        object_buffer = self.resources.stream_buffer('objects', objects.tobytes()) if singles else None
+        offsets = {id(item): i * OBJECT_STRIDE for i, item in enumerate(singles)}
+
+        for item in items:
+            program = item.vao.program
+            if program is not self._program:
+                self._program = program
+                self.stats['program_binds'] += 1
+            if item.vao is not self._vao:
+                self._vao = item.vao
+                self.stats['vertex_array_binds'] += 1
+
+            blocks, uniform_names = self.resources.interface(program)
+            if 'Object' in blocks and item.instances is None:
+                object_buffer.bind_to_uniform_block(BLOCK_BINDINGS['Object'], offset=offsets[id(item)], size=32 * 4)
+                self.stats['uniform_block_binds'] += 1
+            if 'Material' in blocks:
+                buffer = self.resources.material_buffer(item.material)
+                if buffer is not self._material_buffer:
+                    buffer.bind_to_uniform_block(BLOCK_BINDINGS['Material'])
+                    self._material_buffer = buffer
+                    self.stats['uniform_block_binds'] += 1
+            if uniform_names:
+                self.write_uniforms(program, dict(frame_uniforms, **item.uniforms), item.material, light=light)
+
+            winding_order = item.geometry.winding_order.value.lower()
+            if winding_order != self._front_face:
+                self.ctx.front_face = self._front_face = winding_order
+                self.stats['state_changes'] += 1
+
+            mgl_primitive = getattr(moderngl, item.geometry.primitive.name)
+            if item.instances is None:
+                item.vao.render(mgl_primitive)
+            else:
+                item.vao.render(mgl_primitive, instances=item.instances)
+            self.stats['draw_calls'] += 1
 
     def render_object(self, node, camera, light=None):
         if isinstance(node, Mesh):
-            # get the vao
-            vao = self.get_vertex_array(node)
-
-            # compute transforms for this node
-            model_view_matrix = camera.view * node.model
-            normal_matrix = model_view_matrix.inverse.T
-
-            # set the transformation uniforms
-            uniforms = {
-                'model_view_matrix': model_view_matrix,
-                'projection_matrix': camera.projection,
-                'view_matrix': camera.view,
-                'normal_matrix': normal_matrix,
-            }
-            if light:
-                # add the light uniforms
-                uniforms.update(light.uniforms)
-            # add the material uniforms
-            uniforms.update(node.material.uniforms)
-
-            # assign them based on the program needs
-            for key, _ in vao.program.uniforms:
-                value = uniforms[key]
-                if isinstance(value, np.ndarray):
-                    vao.program.uniforms[key].write(value.tobytes())
-                elif isinstance(value, (tuple, float, int)):
-                    vao.program.uniforms[key].value = value
-                else:
-                    raise ValueError(f"{type(value)} is not a supported type as a uniform value")
-
-            # actually render
-            mgl_primitive = getattr(ModernGL, node.geometry.primitive.name)
-            self.ctx.front_face = node.geometry.winding_order.value
-            vao.render(mgl_primitive)
+            self.draw([self.render_item(node, camera)], camera, light=light)
+
+    def render_instanced(self, nodes, camera, light=None):
+        """
+        Draw meshes sharing geometry and material with a single instanced call.
+        """
+        self.draw([self.instanced_item(nodes, camera)], camera, light=light)
+
+    def write_uniforms(self, program, uniforms, material, light=None):
+        """
+        Assign the uniforms a program needs, from the given ones, the light and the material.
+
+        Values equal to the last ones written to the program are skipped.
+        """
+        uniforms = dict(uniforms)
+        if light:
+            # add the light uniforms
+            uniforms.update(light.uniforms)
+        # add the material uniforms
+        uniforms.update(material.uniforms)
+
+        # assign them based on the program needs
+        state = self.resources.uniform_state(program)
+        writes = skips = 0
+        _, names = self.resources.interface(program)
+        for key in names:
+            value = uniforms[key]
+            if isinstance(value, np.ndarray):
+                value = value.tobytes()
+                if state.get(key) == value:
+                    skips += 1
+                    continue
+                program[key].write(value)
+            elif isinstance(value, (tuple, float, int)):
+                if state.get(key) == value:
+                    skips += 1
+                    continue
+                program[key].value = value
+            else:
+                raise ValueError(f"{type(value)} is not a supported type as a uniform value")
+            state[key] = value
+            writes += 1
+        self.stats['uniform_writes'] = self.stats.get('uniform_writes', 0) + writes
+        self.stats['uniform_skips'] = self.stats.get('uniform_skips', 0) + skips
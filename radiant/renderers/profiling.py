@@ -0,0 +1,138 @@
+import collections
+import json
+import time
+
+
+__all__ = ('Profiler', 'RingBuffer', 'JSONLines')
+
+
+class _NullPhase:
+    """Context manager doing nothing; what renderers use while profiling is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    def __init__(self, phases, name):
+        self.phases = phases
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        # phases entered more than once per frame accumulate
+        self.phases[self.name] = self.phases.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+
+class Profiler:
+    """
+    Collects a record per frame and passes it to sinks.
+
+    A record is a dict with the frame number, the CPU seconds spent per phase, the
+    total CPU seconds of the frame, the GPU seconds of the draw calls (None when
+    unsupported or not measured) and whatever the renderer adds, such as its
+    counters.
+
+    Parameters
+    ----------
+    sinks : iterable of callable
+        Called with every record, e.g. a `RingBuffer`, `JSONLines` or any function.
+    gpu : bool
+        Measure the GPU time of the draw calls with a timer query of the moderngl
+        context. Reading the result waits for the GPU, so it is only done for
+        frames that are finished anyway. Contexts without timer queries, such as
+        the None context of CPU-only tests, record no GPU time.
+    """
+
+    def __init__(self, sinks=(), gpu=True):
+        self.sinks = list(sinks)
+        self.gpu = gpu
+        self.frame = 0
+        self._record = None
+        self._start = None
+        self._query = None
+        self._query_used = False
+
+    def begin_frame(self):
+        self._record = {'frame': self.frame, 'phases': {}, 'gpu_seconds': None}
+        self._query_used = False
+        self._start = time.perf_counter()
+
+    def phase(self, name):
+        """Context manager timing a phase of the current frame."""
+        return _Phase(self._record['phases'], name)
+
+    def gpu_timer(self, ctx):
+        """Context manager timing the GPU work issued within it with a ``GL_TIME_ELAPSED`` query."""
+        if not self.gpu or not hasattr(ctx, 'query'):
+            return NULL_PHASE
+        if self._query is None:
+            self._query = ctx.query(time=True)
+        self._query_used = True
+        return self._query
+
+    def read_gpu(self):
+        """Store the GPU time of the current frame; call once its work is finished."""
+        if self._query_used:
+            self._record['gpu_seconds'] = self._query.elapsed / 1e9
+
+    def end_frame(self, **data):
+        """Complete the record of the current frame with `data` and pass it to the sinks."""
+        record = self._record
+        record['seconds'] = time.perf_counter() - self._start
+        record.update(data)
+        for sink in self.sinks:
+            sink(record)
+        self._record = None
+        self.frame += 1
+        return record
+
+
+class RingBuffer:
+    """
+    Sink keeping the records of the last `capacity` frames in memory.
+    """
+
+    def __init__(self, capacity=120):
+        self.records = collections.deque(maxlen=capacity)
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+
+class JSONLines:
+    """
+    Sink writing every record as a line of JSON.
+
+    Parameters
+    ----------
+    file : str or file-like object
+        A path is opened for appending, and closed by `close`.
+    """
+
+    def __init__(self, file):
+        self._owned = isinstance(file, str)
+        self.fh = open(file, mode="a") if self._owned else file
+
+    def __call__(self, record):
+        self.fh.write(json.dumps(record, default=float) + "\n")
+
+    def close(self):
+        if self._owned:
+            self.fh.close()
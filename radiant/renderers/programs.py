@@ -0,0 +1,108 @@
+import json
+import os
+
+
+__all__ = ('ProgramCache',)
+
+
+class ProgramCache:
+    """
+    On-disk cache of the programs compiled by previous runs.
+
+    Programs are stored under the digest of their preprocessed sources, see
+    `program_digest`, together with a manifest of the most recently compiled
+    ones, so that `ResourceManager.warm_up` can compile them all before the first
+    frame instead of stalling whenever a new material comes into view.
+
+    Program binaries are not stored: ModernGL exposes neither
+    ``glGetProgramBinary`` nor ``glProgramBinary``, so programs are always
+    compiled from source. Drivers with a shader cache of their own, e.g. Mesa
+    (see ``MESA_SHADER_CACHE_DIR``), then reuse their binaries on a warm start.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the cache; created if needed.
+    max_programs : int
+        Number of programs kept in the manifest.
+    """
+
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, path, max_programs=256):
+        self.path = path
+        self.max_programs = max_programs
+        os.makedirs(path, exist_ok=True)
+        self._manifest = None
+
+    def _write(self, name, data):
+        # write a temporary file first, so readers never see a partial file
+        filename = os.path.join(self.path, name)
+        with open(f"{filename}.tmp", 'w') as fh:
+            json.dump(data, fh)
+        os.replace(f"{filename}.tmp", filename)
+
+    def manifest(self):
+        """
+        Digests of the cached programs, most recently compiled first.
+
+        Returns
+        -------
+        list of str
+        """
+        if self._manifest is None:
+            try:
+                with open(os.path.join(self.path, self.MANIFEST)) as fh:
+                    self._manifest = list(json.load(fh))
+            except (OSError, ValueError):
+                self._manifest = []
+        return list(self._manifest)
+
+    def load(self, digest):
+        """
+        Get the shaders of a cached program.
+
+        Returns
+        -------
+        dict or None
+            Mapping of shader type to source, or None if the program is not cached.
+        """
+        try:
+            with open(os.path.join(self.path, f"{digest}.json")) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, digest, shaders):
+        """
+        Add a program to the cache, as the most recently compiled one.
+
+        Parameters
+        ----------
+        digest : str
+        shaders : dict
+            Mapping of shader type to source.
+        """
+        self.store_all({digest: shaders})
+
+    def store_all(self, programs):
+        """
+        Add programs to the cache, writing the manifest once.
+
+        Parameters
+        ----------
+        programs : dict
+            Mapping of digest to shaders, in the order they were compiled.
+        """
+        for digest, shaders in programs.items():
+            if not os.path.exists(os.path.join(self.path, f"{digest}.json")):
+                self._write(f"{digest}.json", dict(shaders))
+        recent = list(programs)[::-1]
+        manifest = recent + [other for other in self.manifest() if other not in programs]
+        for evicted in manifest[self.max_programs:]:
+            try:
+                os.remove(os.path.join(self.path, f"{evicted}.json"))
+            except OSError:
+                pass
+        self._manifest = manifest[:self.max_programs]
+        self._write(self.MANIFEST, self._manifest)
@@ -0,0 +1,561 @@
+import collections
+import time
+import weakref
+
+import moderngl
+import numpy as np
+
+from .uniforms import BLOCK_BINDINGS, pack_std140
+from ..packing import PackedGeometry
+from ..shaderlib import program_digest
+
+
+# keyword arguments of moderngl.Context.program, by shader file extension
+SHADER_STAGES = {'vert': 'vertex_shader', 'geom': 'geometry_shader', 'frag': 'fragment_shader'}
+
+
+class _GeometryResources:
+    """GPU buffers of a single geometry, shared by every mesh and program using it."""
+
+    def __init__(self, key):
+        self.key = key
+        self.ref = None
+        self.buffers = {}
+        self.index = None
+        self.nbytes = 0
+        self.vertex_arrays = set()
+        self.last_used = -1
+
+
+class _InstanceResources:
+    """Growable buffer of per-instance data of a group of meshes."""
+
+    def __init__(self, buffer, capacity):
+        self.buffer = buffer
+        self.capacity = capacity
+        self.vertex_arrays = set()
+        self.last_used = -1
+
+
+class _MaterialResources:
+    """Uniform buffer of the values of a material, shared by every program drawing it."""
+
+    def __init__(self, key):
+        self.key = key
+        self.ref = None
+        self.buffer = None
+        self.nbytes = 0
+        self.version = None
+        self.last_used = -1
+
+
+class ResourceManager:
+    """
+    Cache of the GPU resources of a moderngl context.
+
+    Programs are cached by the digest of their sources, so identical variants are
+    compiled once, and recorded in the optional `program_cache` for `warm_up` in
+    later runs; new programs are written to it at the end of the frame, see `save`.
+    Buffers are cached by `Geometry` identity (and shared by all meshes using it),
+    and vertex arrays by (program, geometry). Buffers are uploaded per attribute,
+    only once a program actually needs them, straight from the memory of the arrays.
+    A `PackedGeometry` has a single interleaved buffer, and adapts the shaders to
+    its encodings. Instanced vertex arrays additionally bind a per-instance buffer,
+    cached by a group key.
+
+    The uniform blocks of programs are bound to the points of `BLOCK_BINDINGS`.
+    Uniform buffers of materials are uploaded again only when their uniforms
+    changed, and streamed buffers, e.g. of per-frame data, are rewritten in place.
+
+    Resources that were not used for `max_idle_frames` frames, e.g. because their
+    meshes left the scene, are released at the end of a frame. So are the least
+    recently used idle buffers while more than `budget` bytes are allocated.
+    Buffers of geometries that are garbage collected are released as well.
+
+    Parameters
+    ----------
+    ctx : moderngl.Context
+    budget : int, optional
+        Number of bytes of buffers to keep allocated at most; unlimited by default.
+    max_idle_frames : int
+        Number of frames an unused resource is kept around.
+    program_cache : ProgramCache, optional
+
+    Attributes
+    ----------
+    stats : collections.Counter
+        Cumulative hits, misses, buffers created and released, and bytes uploaded,
+        to uniform buffers separately, and the programs compiled and the seconds spent
+        compiling them.
+    nbytes : int
+        Number of bytes currently allocated in buffers.
+    """
+
+    def __init__(self, ctx, budget=None, max_idle_frames=60, program_cache=None):
+        self.ctx = ctx
+        self.budget = budget
+        self.max_idle_frames = max_idle_frames
+        self.program_cache = program_cache
+        self.frame = 0
+        self.nbytes = 0
+        self.stats = collections.Counter()
+        # program digest -> [program, last used frame]
+        self._programs = {}
+        # sorted (shader type, source) pairs -> program digest
+        self._digests = {}
+        # program digest -> shaders, of programs not in the program cache yet
+        self._unsaved = {}
+        # id(geometry) -> _GeometryResources
+        self._geometries = {}
+        # (program digest, id(geometry)[, instance group key]) -> vertex array
+        self._vertex_arrays = {}
+        # instance group key -> _InstanceResources
+        self._instances = {}
+        # id(program) -> mapping of uniform name to the value last written
+        self._uniform_state = {}
+        # id(program) -> (names of uniform blocks, names of plain uniforms)
+        self._interfaces = {}
+        # id(program) -> names of vertex shader inputs
+        self._attributes = {}
+        # id(material) -> _MaterialResources
+        self._materials = {}
+        # name -> (buffer, capacity) of streamed data
+        self._streams = {}
+        # resources of geometries and materials that were garbage collected
+        self._collected = []
+        self._collected_materials = []
+
+    def program(self, shaders):
+        """
+        Get the program compiled from a mapping of shader type to source.
+
+        Returns
+        -------
+        tuple
+            The digest of the sources, which is the cache key of the program, and the program itself.
+        """
+        sources = tuple(sorted(shaders.items()))
+        key = self._digests.get(sources)
+        if key is None:
+            key = self._digests[sources] = program_digest(shaders)
+        entry = self._programs.get(key)
+        if entry is None:
+            self.stats['program_misses'] += 1
+            entry = self._programs[key] = [self._compile(shaders), self.frame]
+            if self.program_cache is not None:
+                self._unsaved[key] = dict(shaders)
+        else:
+            self.stats['program_hits'] += 1
+        entry[1] = self.frame
+        return key, entry[0]
+
+    def _compile(self, shaders):
+        start = time.perf_counter()
+        program = self.ctx.program(**{SHADER_STAGES[stage]: source for stage, source in shaders.items()})
+        blocks, uniforms, attributes = [], [], []
+        for name in program:
+            member = program[name]
+            if isinstance(member, moderngl.UniformBlock):
+                if name in BLOCK_BINDINGS:
+                    member.binding = BLOCK_BINDINGS[name]
+                blocks.append(name)
+            elif isinstance(member, moderngl.Uniform):
+                uniforms.append(name)
+            elif isinstance(member, moderngl.Attribute):
+                attributes.append(name)
+        self._interfaces[id(program)] = (frozenset(blocks), frozenset(uniforms))
+        self._attributes[id(program)] = frozenset(attributes)
+        self.stats['programs_compiled'] += 1
+        self.stats['compile_seconds'] += time.perf_counter() - start
+        return program
+
+    def warm_up(self):
+        """
+        Compile the programs of the program cache that are not compiled yet.
+
+        Returns
+        -------
+        int
+            Number of programs compiled.
+        """
+        if self.program_cache is None:
+            return 0
+        compiled = 0
+        for key in self.program_cache.manifest():
+            if key in self._programs:
+                continue
+            shaders = self.program_cache.load(key)
+            if shaders is None:
+                continue
+            self._programs[key] = [self._compile(shaders), self.frame]
+            compiled += 1
+        return compiled
+
+    def save(self):
+        """
+        Write the programs compiled since the last call to the program cache.
+
+        Called by `end_frame`, so that compiling a program never waits for the disk.
+        """
+        if self._unsaved:
+            self.program_cache.store_all(self._unsaved)
+            self._unsaved = {}
+
+    def uniform_state(self, program):
+        """
+        Get the mapping of uniform name to the value last written, of a cached program.
+        """
+        return self._uniform_state.setdefault(id(program), {})
+
+    def interface(self, program):
+        """
+        Get the names of the uniform blocks and of the other uniforms of a cached program.
+
+        Returns
+        -------
+        tuple of frozenset
+        """
+        return self._interfaces[id(program)]
+
+    def attributes(self, program):
+        """
+        Get the names of the vertex shader inputs of a cached program.
+
+        Returns
+        -------
+        frozenset
+        """
+        return self._attributes[id(program)]
+
+    def material_buffer(self, material):
+        """
+        Get the uniform buffer of the values of a material, see `pack_std140`.
+
+        The members of `Material.block` are packed by name, taking the default of a
+        member the uniforms lack. The values are uploaded again only when the version
+        of the uniforms changed.
+        """
+        if not material.block:
+            raise ValueError(f"{type(material).__name__} declares no members of its Material uniform block")
+        key = id(material)
+        entry = self._materials.get(key)
+        if entry is not None and entry.ref() is not material:
+            self.release_material(key)
+            entry = None
+        if entry is None:
+            entry = self._materials[key] = _MaterialResources(key)
+            entry.ref = weakref.ref(material, lambda _, collected=self._collected_materials, entry=entry: collected.append(entry))
+        entry.last_used = self.frame
+
+        uniforms = material.uniforms
+        if entry.version != uniforms.version:
+            data = pack_std140(uniforms.get(name, default) for name, default in material.block)
+            if entry.buffer is not None and entry.nbytes == len(data):
+                entry.buffer.write(data)
+            else:
+                if entry.buffer is not None:
+                    entry.buffer.release()
+                    self.nbytes -= entry.nbytes
+                    self.stats['buffers_released'] += 1
+                entry.buffer, entry.nbytes = self.ctx.buffer(data), len(data)
+                self.nbytes += len(data)
+                self.stats['buffers_created'] += 1
+            entry.version = uniforms.version
+            self.stats['material_uploads'] += 1
+            self.stats['uniform_bytes_uploaded'] += len(data)
+        return entry.buffer
+
+    def stream_buffer(self, name, data):
+        """
+        Get a dynamic buffer rewritten with new data (bytes), e.g. every frame.
+
+        The buffer grows in powers of two, so it is seldom reallocated.
+        """
+        buffer, capacity = self._streams.get(name, (None, 0))
+        if capacity < len(data):
+            if buffer is not None:
+                self.release_stream(name)
+            capacity = 1 << max(len(data) - 1, 1).bit_length()
+            buffer = self.ctx.buffer(reserve=capacity, dynamic=True)
+            self._streams[name] = (buffer, capacity)
+            self.nbytes += capacity
+            self.stats['buffers_created'] += 1
+        buffer.write(data)
+        self.stats['uniform_bytes_uploaded'] += len(data)
+        return buffer
+
+    def _geometry(self, geometry):
+        key = id(geometry)
+        entry = self._geometries.get(key)
+        if entry is not None and entry.ref() is not geometry:
+            # the id was reused before the collected geometry was released
+            self.release_geometry(key)
+            entry = None
+        if entry is None:
+            entry = self._geometries[key] = _GeometryResources(key)
+            entry.ref = weakref.ref(geometry, lambda _, collected=self._collected, entry=entry: collected.append(entry))
+        entry.last_used = self.frame
+        return entry
+
+    def _upload(self, entry, data):
+        # no copy unless the array is not contiguous
+        buffer = self.ctx.buffer(np.ascontiguousarray(data))
+        entry.nbytes += data.nbytes
+        self.nbytes += data.nbytes
+        self.stats['buffers_created'] += 1
+        self.stats['bytes_uploaded'] += data.nbytes
+        return buffer
+
+    def buffer(self, geometry, name):
+        """
+        Get the buffer and moderngl format of an attribute of a geometry.
+        """
+        entry = self._geometry(geometry)
+        if name not in entry.buffers:
+            self.stats['buffer_misses'] += 1
+            data = geometry.attributes[name]
+            entry.buffers[name] = (self._upload(entry, data), f"{data.shape[-1]}{data.dtype.kind}")
+        else:
+            self.stats['buffer_hits'] += 1
+        return entry.buffers[name]
+
+    def packed_buffer(self, geometry):
+        """
+        Get the interleaved vertex buffer of a `PackedGeometry`.
+        """
+        entry = self._geometry(geometry)
+        if None not in entry.buffers:
+            self.stats['buffer_misses'] += 1
+            entry.buffers[None] = (self._upload(entry, geometry.vertices), None)
+        else:
+            self.stats['buffer_hits'] += 1
+        return entry.buffers[None][0]
+
+    def index_buffer(self, geometry):
+        """
+        Get the index buffer of a geometry, or None if it is not indexed.
+        """
+        if geometry.index is None:
+            return None
+        entry = self._geometry(geometry)
+        if entry.index is None:
+            self.stats['buffer_misses'] += 1
+            entry.index = self._upload(entry, geometry.index)
+        else:
+            self.stats['buffer_hits'] += 1
+        return entry.index
+
+    def vertex_array(self, shaders, geometry):
+        """
+        Get the vertex array binding the attributes of a geometry to a program.
+        """
+        if isinstance(geometry, PackedGeometry):
+            shaders = geometry.patch_shaders(shaders)
+        program_key, prog = self.program(shaders)
+        entry = self._geometry(geometry)
+        key = (program_key, id(geometry))
+        vao = self._vertex_arrays.get(key)
+        if vao is not None:
+            self.stats['vertex_array_hits'] += 1
+            return vao
+
+        self.stats['vertex_array_misses'] += 1
+        vao = self._vertex_arrays[key] = self._create_vertex_array(prog, geometry)
+        entry.vertex_arrays.add(key)
+        return vao
+
+    def _create_vertex_array(self, prog, geometry, *extra_buffers):
+        attributes = self.attributes(prog)
+        vertex_buffers = []
+        if isinstance(geometry, PackedGeometry):
+            fmt, names = geometry.format_for(attributes)
+            if names:
+                vertex_buffers.append((self.packed_buffer(geometry), fmt, *names))
+        else:
+            for name in geometry.attributes:
+                if name in attributes:
+                    buffer, fmt = self.buffer(geometry, name)
+                    vertex_buffers.append((buffer, fmt, name))
+        index_buffer = self.index_buffer(geometry)
+        index_element_size = geometry.index.dtype.itemsize if index_buffer is not None else 4
+        return self.ctx.vertex_array(prog, vertex_buffers + list(extra_buffers), index_buffer, index_element_size=index_element_size)
+
+    def instanced_vertex_array(self, shaders, geometry, group, data, attributes):
+        """
+        Get a vertex array that also binds per-instance data.
+
+        Parameters
+        ----------
+        shaders : dict
+            Mapping of shader type to source.
+        geometry : Geometry
+        group : hashable
+            Key of the group of instances; its buffer is reused (and grown) across frames.
+        data : (N, ...) array
+            Per-instance data, written to the instance buffer.
+        attributes : list of (str, str)
+            moderngl format and attribute name of every field of an instance, in order.
+            Fields the program does not use are skipped.
+
+        Returns
+        -------
+        moderngl.VertexArray
+        """
+        if isinstance(geometry, PackedGeometry):
+            shaders = geometry.patch_shaders(shaders)
+        program_key, prog = self.program(shaders)
+        entry = self._geometry(geometry)
+
+        instances = self._instances.get(group)
+        if instances is None or instances.capacity < data.nbytes:
+            if instances is not None:
+                self.release_instances(group)
+            # grow in powers of two to avoid reallocating every frame
+            capacity = 1 << max(data.nbytes - 1, 1).bit_length()
+            instances = self._instances[group] = _InstanceResources(self.ctx.buffer(reserve=capacity, dynamic=True), capacity)
+            self.nbytes += capacity
+            self.stats['buffers_created'] += 1
+        instances.last_used = self.frame
+        instances.buffer.write(data.tobytes())
+        self.stats['bytes_uploaded'] += data.nbytes
+
+        key = (program_key, id(geometry), group)
+        vao = self._vertex_arrays.get(key)
+        if vao is not None:
+            self.stats['vertex_array_hits'] += 1
+            return vao
+
+        self.stats['vertex_array_misses'] += 1
+        fmt, names = [], []
+        for field_fmt, name in attributes:
+            if name in self.attributes(prog):
+                fmt.append(field_fmt)
+                names.append(name)
+            else:
+                # skip the bytes of the unused field
+                count, kind = int(field_fmt[:-1]), field_fmt[-1]
+                fmt.append(f"{count * (8 if kind == 'd' else 4)}x")
+        instance_buffer = (instances.buffer, " ".join(fmt) + "/i", *names)
+        vao = self._vertex_arrays[key] = self._create_vertex_array(prog, geometry, instance_buffer)
+        entry.vertex_arrays.add(key)
+        instances.vertex_arrays.add(key)
+        return vao
+
+    def release_instances(self, group):
+        """Release the instance buffer of a group and the vertex arrays using it."""
+        instances = self._instances.pop(group)
+        for vao_key in instances.vertex_arrays:
+            vao = self._vertex_arrays.pop(vao_key, None)
+            if vao is not None:
+                vao.release()
+                entry = self._geometries.get(vao_key[1])
+                if entry is not None:
+                    entry.vertex_arrays.discard(vao_key)
+        instances.buffer.release()
+        self.nbytes -= instances.capacity
+        self.stats['buffers_released'] += 1
+        self.stats['bytes_released'] += instances.capacity
+
+    def release_geometry(self, key):
+        """Release the buffers and vertex arrays of a geometry, by its id."""
+        entry = self._geometries.pop(key, None)
+        if entry is None:
+            return
+        for vao_key in entry.vertex_arrays:
+            self._vertex_arrays.pop(vao_key).release()
+            if len(vao_key) > 2 and vao_key[2] in self._instances:
+                self._instances[vao_key[2]].vertex_arrays.discard(vao_key)
+        for buffer, _ in entry.buffers.values():
+            buffer.release()
+        if entry.index is not None:
+            entry.index.release()
+        self.stats['buffers_released'] += len(entry.buffers) + (entry.index is not None)
+        self.stats['bytes_released'] += entry.nbytes
+        self.nbytes -= entry.nbytes
+
+    def release_material(self, key):
+        """Release the uniform buffer of a material, by its id."""
+        entry = self._materials.pop(key, None)
+        if entry is None or entry.buffer is None:
+            return
+        entry.buffer.release()
+        self.nbytes -= entry.nbytes
+        self.stats['buffers_released'] += 1
+        self.stats['bytes_released'] += entry.nbytes
+
+    def release_stream(self, name):
+        """Release a streamed buffer."""
+        buffer, capacity = self._streams.pop(name)
+        buffer.release()
+        self.nbytes -= capacity
+        self.stats['buffers_released'] += 1
+        self.stats['bytes_released'] += capacity
+
+    def release_program(self, key):
+        """Release a program and the vertex arrays using it, by its cache key."""
+        program, _ = self._programs.pop(key)
+        for vao_key in [k for k in self._vertex_arrays if k[0] == key]:
+            self._vertex_arrays.pop(vao_key).release()
+            entry = self._geometries.get(vao_key[1])
+            if entry is not None:
+                entry.vertex_arrays.discard(vao_key)
+            if len(vao_key) > 2 and vao_key[2] in self._instances:
+                self._instances[vao_key[2]].vertex_arrays.discard(vao_key)
+        for sources in [sources for sources, digest in self._digests.items() if digest == key]:
+            del self._digests[sources]
+        self._uniform_state.pop(id(program), None)
+        self._interfaces.pop(id(program), None)
+        self._attributes.pop(id(program), None)
+        program.release()
+        self.stats['programs_released'] += 1
+
+    def end_frame(self):
+        """Save new programs, release collected and idle resources, and enforce the budget."""
+        self.save()
+        while self._collected:
+            entry = self._collected.pop()
+            if self._geometries.get(entry.key) is entry:
+                self.release_geometry(entry.key)
+        while self._collected_materials:
+            entry = self._collected_materials.pop()
+            if self._materials.get(entry.key) is entry:
+                self.release_material(entry.key)
+
+        oldest = self.frame - self.max_idle_frames
+        for key, entry in list(self._geometries.items()):
+            if entry.last_used < oldest:
+                self.release_geometry(key)
+                self.stats['evictions'] += 1
+        for key, (_, last_used) in list(self._programs.items()):
+            if last_used < oldest:
+                self.release_program(key)
+        for group, instances in list(self._instances.items()):
+            if instances.last_used < oldest:
+                self.release_instances(group)
+        for key, entry in list(self._materials.items()):
+            if entry.last_used < oldest:
+                self.release_material(key)
+
+        if self.budget is not None and self.nbytes > self.budget:
+            # least recently used first; never what was used this frame
+            idle = sorted((entry.last_used, key) for key, entry in self._geometries.items() if entry.last_used < self.frame)
+            for _, key in idle:
+                if self.nbytes <= self.budget:
+                    break
+                self.release_geometry(key)
+                self.stats['evictions'] += 1
+        self.frame += 1
+
+    def release(self):
+        """Save new programs and release all resources."""
+        self.save()
+        for group in list(self._instances):
+            self.release_instances(group)
+        for key in list(self._geometries):
+            self.release_geometry(key)
+        for key in list(self._programs):
+            self.release_program(key)
+        for key in list(self._materials):
+            self.release_material(key)
+        for name in list(self._streams):
+            self.release_stream(name)
@@ -0,0 +1,300 @@
+import concurrent.futures
+import os
+
+import numpy as np
+
+from .base import Renderer
+from ..geometries import Primitives, WindingOrders
+from ..materials import MeshBasicMaterial, MeshPhongMaterial
+from ..maths import normal_matrix
+from ..scenes import LOD, Mesh
+
+
+__all__ = ('SoftwareRenderer',)
+
+
+def _homogeneous(points):
+    return np.concatenate([points, np.ones(points.shape[:-1] + (1,), dtype=points.dtype)], axis=-1)
+
+
+def _normalize(vectors):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.nan_to_num(vectors / np.linalg.norm(vectors, axis=-1, keepdims=True))
+
+
+class SoftwareRenderer(Renderer):
+    """
+    Render scenes on the CPU with NumPy, without an OpenGL driver.
+
+    Mirrors `ModernGLRenderer` and the built-in shaders: vertices are transformed
+    in batch, triangles are back face culled and binned into screen tiles, and
+    every tile is rasterized against its own depth buffer on a thread pool. The
+    visible pixels are then shaded once, with perspective correct interpolation,
+    following `MeshBasicMaterial` or `MeshPhongMaterial`.
+
+    Output is deterministic: the nearest triangle wins, ties going to the first
+    one in scene order, independent of the tile size and number of threads. That
+    makes it usable as a reference image in regression tests.
+
+    Triangles with a vertex behind the camera are dropped instead of clipped.
+
+    Parameters
+    ----------
+    size : tuple of int
+        Width and height of the image.
+    tile_size : int
+        Width and height of the tiles in pixels.
+    workers : int, optional
+        Number of threads rasterizing tiles; the number of CPUs by default.
+    clear_color : tuple of float
+        Background color.
+    max_fragments : int
+        Number of candidate fragments rasterized at once per tile; bounds memory use.
+
+    Attributes
+    ----------
+    color : (height, width, 4) float array
+        Color buffer of the last frame, bottom row first as in OpenGL.
+    depth : (height, width) float array
+        Window space depth of the last frame, 1 where nothing was drawn.
+    stats : dict
+        Triangle and tile counts of the last frame.
+    """
+
+    def __init__(self, size=(512, 512), tile_size=32, workers=None, clear_color=(0.9, 0.9, 0.9, 0.0), max_fragments=1 << 16):
+        self.size = tuple(size)
+        self.tile_size = tile_size
+        self.workers = workers or os.cpu_count()
+        self.clear_color = clear_color
+        self.max_fragments = max_fragments
+        width, height = self.size
+        self.color = np.zeros((height, width, 4), dtype='f4')
+        self.depth = np.ones((height, width), dtype='f4')
+        self.stats = {}
+
+    def render(self, scene, camera, light=None, components=3):
+        """
+        Render scene from the camera viewpoint.
+
+        Returns
+        -------
+        (height, width, components) uint8 array
+            The image, top row first.
+        """
+        camera.update()
+        if light:
+            light.update()
+        scene.update_subtree()
+
+        meshes = []
+        stack = [scene]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Mesh) and node.geometry.primitive is Primitives.TRIANGLES:
+                meshes.append(node)
+            if isinstance(node, LOD):
+                selected = node.select(camera)
+                stack.extend((selected,) if selected is not None else ())
+            else:
+                stack.extend(reversed(node.children))
+
+        view = np.asarray(camera.view, dtype='f8')
+        self._setup(meshes, view, np.asarray(camera.projection, dtype='f8'))
+        self._rasterize()
+        self._shade(meshes, view, light)
+
+        image = np.clip(self.color[::-1, :, :components], 0, 1) * 255
+        return np.rint(image).astype('u1')
+
+    def _setup(self, meshes, view, projection):
+        """Transform all vertices and build the front facing triangles in screen space."""
+        width, height = self.size
+        positions, normals, clips, triangles, owners = [], [], [], [], []
+        offset = 0
+        for i, node in enumerate(meshes):
+            geometry = node.geometry
+            pos = np.asarray(geometry.attributes['pos'], dtype='f8')
+            model_view = np.asarray(node.model, dtype='f8') @ view
+            pos_view = pos @ model_view[:3, :3] + model_view[3, :3]
+            normal = geometry.attributes.get('normal')
+            if normal is None:
+                normals.append(np.zeros_like(pos_view))
+            else:
+                normals.append(np.asarray(normal, dtype='f8') @ normal_matrix(model_view)[:3, :3])
+            positions.append(pos_view)
+            clips.append(_homogeneous(pos_view) @ projection)
+
+            if geometry.index is not None:
+                index = np.asarray(geometry.index, dtype='i8').reshape((-1, 3))
+            else:
+                index = np.arange(len(pos) - len(pos) % 3).reshape((-1, 3))
+            if geometry.winding_order is WindingOrders.CW:
+                # make front faces counter clockwise
+                index = index[:, [0, 2, 1]]
+            triangles.append(index + offset)
+            owners.append(np.full(len(index), i))
+            offset += len(pos)
+
+        if meshes:
+            self._positions, self._normals = np.concatenate(positions), np.concatenate(normals)
+            clip = np.concatenate(clips)
+            triangles, owners = np.concatenate(triangles), np.concatenate(owners)
+        else:
+            self._positions, self._normals, clip = np.zeros((0, 3)), np.zeros((0, 3)), np.zeros((0, 4))
+            triangles, owners = np.zeros((0, 3), dtype='i8'), np.zeros(0, dtype='i8')
+        total = len(triangles)
+
+        # drop triangles reaching behind the camera
+        w = clip[:, 3]
+        keep = (w[triangles] > 1e-6).all(axis=1)
+        triangles, owners = triangles[keep], owners[keep]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ndc = clip[:, :3] / w[:, None]
+        screen = np.empty_like(ndc)
+        screen[:, 0] = (ndc[:, 0] + 1) * (width / 2)
+        screen[:, 1] = (ndc[:, 1] + 1) * (height / 2)
+        screen[:, 2] = (ndc[:, 2] + 1) / 2
+
+        # back face culling; front faces have a positive area
+        v0, v1, v2 = screen[triangles[:, 0]], screen[triangles[:, 1]], screen[triangles[:, 2]]
+        area = (v1[:, 0] - v0[:, 0]) * (v2[:, 1] - v0[:, 1]) - (v2[:, 0] - v0[:, 0]) * (v1[:, 1] - v0[:, 1])
+        keep = area > 0
+        triangles, owners, area = triangles[keep], owners[keep], area[keep]
+        v0, v1, v2 = v0[keep], v1[keep], v2[keep]
+
+        # range of pixels whose centers may be covered
+        corners = np.stack([v0, v1, v2], axis=1)
+        lower = np.ceil(corners[:, :, :2].min(axis=1) - 0.5).astype('i8')
+        upper = np.floor(corners[:, :, :2].max(axis=1) - 0.5).astype('i8')
+        lower = np.maximum(lower, 0)
+        upper = np.minimum(upper, [width - 1, height - 1])
+        keep = (lower <= upper).all(axis=1)
+
+        # barycentric coordinates as linear functions of the pixel center: l = a * x + b * y + c
+        edges = []
+        for p, q in ((v1, v2), (v2, v0), (v0, v1)):
+            a = -(q[:, 1] - p[:, 1]) / area
+            b = (q[:, 0] - p[:, 0]) / area
+            edges.append((a, b, -(a * p[:, 0] + b * p[:, 1])))
+        self._edges = np.array(edges).transpose((2, 0, 1))[keep]
+        self._triangles = triangles[keep]
+        self._owners = owners[keep]
+        self._z = screen[:, 2][self._triangles]
+        self._w = w
+        self._lower, self._upper = lower[keep], upper[keep]
+        self.stats = {'triangles': total, 'culled': total - len(self._triangles)}
+
+    def _bin(self):
+        """Sorted triangle indices per tile."""
+        width, height = self.size
+        ts = self.tile_size
+        tiles_x = -(-width // ts)
+        tile_lower, tile_upper = self._lower // ts, self._upper // ts
+        span = tile_upper - tile_lower + 1
+        counts = span[:, 0] * span[:, 1]
+        triangles = np.repeat(np.arange(len(counts)), counts)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        nx = span[triangles, 0]
+        tiles = (tile_lower[triangles, 1] + k // nx) * tiles_x + tile_lower[triangles, 0] + k % nx
+        order = np.lexsort((triangles, tiles))
+        tiles, triangles = tiles[order], triangles[order]
+        bins = {}
+        if len(tiles):
+            starts = np.flatnonzero(np.concatenate([[True], tiles[1:] != tiles[:-1]]))
+            for tile, triangle_bin in zip(tiles[starts], np.split(triangles, starts[1:])):
+                bins[int(tile)] = triangle_bin
+        return bins
+
+    def _rasterize(self):
+        width, height = self.size
+        self.depth[:] = 1
+        self._ids = np.full((height, width), -1, dtype='i8')
+        bins = self._bin()
+        self.stats['tiles'] = len(bins)
+        if self.workers > 1 and len(bins) > 1:
+            with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+                list(executor.map(self._rasterize_tile, bins.items()))
+        else:
+            for item in bins.items():
+                self._rasterize_tile(item)
+
+    def _rasterize_tile(self, item):
+        tile, triangles = item
+        width, height = self.size
+        ts = self.tile_size
+        tiles_x = -(-width // ts)
+        x0, y0 = (tile % tiles_x) * ts, (tile // tiles_x) * ts
+        x1, y1 = min(x0 + ts, width), min(y0 + ts, height)
+        tile_width = x1 - x0
+
+        # candidate fragments: the pixels of the bounding box of a triangle within the tile
+        lower = np.maximum(self._lower[triangles], [x0, y0])
+        span = np.minimum(self._upper[triangles], [x1 - 1, y1 - 1]) - lower + 1
+        counts = span[:, 0] * span[:, 1]
+        depth = np.ones((y1 - y0) * tile_width)
+        ids = np.full(len(depth), -1, dtype='i8')
+        # chunks of whole triangles, in order, of about max_fragments fragments
+        chunks = np.cumsum(counts) // self.max_fragments
+        for chunk in np.split(np.arange(len(triangles)), np.flatnonzero(np.diff(chunks)) + 1):
+            chunk_counts = counts[chunk]
+            owner = np.repeat(chunk, chunk_counts)
+            k = np.arange(chunk_counts.sum()) - np.repeat(np.cumsum(chunk_counts) - chunk_counts, chunk_counts)
+            fx = lower[owner, 0] + k % span[owner, 0]
+            fy = lower[owner, 1] + k // span[owner, 0]
+            triangle = triangles[owner]
+
+            edges = self._edges[triangle]
+            bary = edges[:, :, 0] * (fx[:, None] + 0.5) + edges[:, :, 1] * (fy[:, None] + 0.5) + edges[:, :, 2]
+            fragment_depth = (bary * self._z[triangle]).sum(axis=1)
+            covered = (bary >= 0).all(axis=1) & (fragment_depth >= 0) & (fragment_depth <= 1)
+            pixel = ((fy - y0) * tile_width + fx - x0)[covered]
+            fragment_depth, triangle = fragment_depth[covered], triangle[covered]
+            if not len(pixel):
+                continue
+
+            # nearest fragment per pixel; the first triangle wins ties, as with a less-than depth test
+            order = np.lexsort((triangle, fragment_depth, pixel))
+            pixel, fragment_depth, triangle = pixel[order], fragment_depth[order], triangle[order]
+            first = np.concatenate([[True], pixel[1:] != pixel[:-1]])
+            pixel, fragment_depth, triangle = pixel[first], fragment_depth[first], triangle[first]
+            closer = fragment_depth < depth[pixel]
+            depth[pixel[closer]] = fragment_depth[closer]
+            ids[pixel[closer]] = triangle[closer]
+
+        self.depth[y0:y1, x0:x1] = depth.reshape((y1 - y0, tile_width))
+        self._ids[y0:y1, x0:x1] = ids.reshape((y1 - y0, tile_width))
+
+    def _shade(self, meshes, view, light):
+        self.color[:] = self.clear_color
+        ys, xs = np.nonzero(self._ids >= 0)
+        ids = self._ids[ys, xs]
+        edges = self._edges[ids]
+        bary = edges[:, :, 0] * (xs[:, None] + 0.5) + edges[:, :, 1] * (ys[:, None] + 0.5) + edges[:, :, 2]
+        # perspective correct interpolation
+        vertices = self._triangles[ids]
+        bary = bary / self._w[vertices]
+        bary /= bary.sum(axis=1, keepdims=True)
+
+        owners = self._owners[ids]
+        for i in np.unique(owners):
+            selected = owners == i
+            material = meshes[i].material
+            color = np.asarray(material.uniforms['color'], dtype='f8')
+            if isinstance(material, MeshPhongMaterial):
+                if light is None:
+                    raise ValueError("MeshPhongMaterial needs a light")
+                b, v = bary[selected, :, None], vertices[selected]
+                pos = (self._positions[v] * b).sum(axis=1)
+                normal = _normalize((self._normals[v] * b).sum(axis=1))
+                light_pos = _homogeneous(np.asarray(light.uniforms['light_pos'], dtype='f8')) @ view
+                light_dir = _normalize(light_pos[:3] / light_pos[3] - pos)
+                lambertian = np.maximum((light_dir * normal).sum(axis=1), 0)
+                reflect_dir = 2 * (light_dir * normal).sum(axis=1, keepdims=True) * normal - light_dir
+                spec_angle = np.maximum((reflect_dir * _normalize(-pos)).sum(axis=1), 0)
+                specular = np.where(lambertian > 0, spec_angle ** material.uniforms['shininess'], 0)
+                self.color[ys[selected], xs[selected]] = lambertian[:, None] * color + specular[:, None]
+            elif isinstance(material, MeshBasicMaterial):
+                self.color[ys[selected], xs[selected]] = color
+            else:
+                raise ValueError(f"{type(material)} is not supported by the software renderer")
@@ -0,0 +1,62 @@
+import numpy as np
+
+
+__all__ = ('pack_std140', 'FRAME_BLOCK', 'MATERIAL_BLOCKS', 'BLOCK_BINDINGS', 'OBJECT_STRIDE')
+
+
+# members of the Frame uniform block, in declaration order, with the values used when a frame has none
+FRAME_BLOCK = (
+    ('projection_matrix', np.eye(4, dtype='f4')),
+    ('view_matrix', np.eye(4, dtype='f4')),
+    ('light_pos', np.zeros(3, dtype='f4')),
+    ('cluster_grid', np.ones(3, dtype='i4')),
+    ('cluster_scale', np.zeros(4, dtype='f4')),
+)
+
+# members of the Material uniform block of every built-in shader, in declaration order,
+# with the values used when a material has none
+MATERIAL_BLOCKS = {
+    'meshbasic': (
+        ('color', np.array((1.0, 0.0, 0.0, 1.0), dtype='f4')),
+    ),
+    'meshphong': (
+        ('color', np.array((1.0, 0.0, 0.0, 1.0), dtype='f4')),
+        ('shininess', 4.0),
+    ),
+}
+
+# binding points of the uniform blocks of the built-in shaders
+BLOCK_BINDINGS = {'Frame': 0, 'Object': 1, 'Material': 2}
+
+# bytes between the Object blocks of consecutive draws in the per-object buffer; the
+# largest GL_UNIFORM_BUFFER_OFFSET_ALIGNMENT of common implementations
+OBJECT_STRIDE = 256
+
+
+def pack_std140(values):
+    """
+    Packs values in the std140 layout of a uniform block declaring them in the same order.
+
+    Scalars and vectors of 2 to 4 components, and 4x4 matrices in the memory layout
+    of pyrr, are supported. Integer arrays are packed as ints, anything else as floats.
+
+    Parameters
+    ----------
+    values : iterable
+
+    Returns
+    -------
+    bytes
+        The contents of the block, padded to a multiple of 16 bytes.
+    """
+    data = bytearray()
+    for value in values:
+        integer = isinstance(value, np.ndarray) and np.issubdtype(value.dtype, np.integer)
+        array = np.asarray(value, dtype='i4' if integer else 'f4').ravel()
+        if array.size not in (1, 2, 3, 4, 16):
+            raise ValueError(f"cannot pack a value of {array.size} components into a uniform block")
+        align = {1: 4, 2: 8}.get(array.size, 16)
+        data.extend(bytes(-len(data) % align))
+        data.extend(array.tobytes())
+    data.extend(bytes(-len(data) % 16))
+    return bytes(data)
@@ -1,32 +1,120 @@
-import collections
+import collections.abc
+import itertools
 
 import numpy as np
 import pyrr
 
-from .maths import decompose
+from .maths import compose, decompose, transform_spheres
+
+
+# source of unique model matrix versions, shared by all nodes and graphs
+transform_versions = itertools.count(1)
 
 
 class Object3D:
     def __init__(self, position=(0, 0, 0), scale=(1, 1, 1), rotation=(0, 0, 0)):
-        self.position = position
-        self.scale = scale
-        self.rotation = rotation
+        # set when this node is a view over a row of a TransformGraph
+        self._graph = None
+        self._row = None
         self._parent = None
         self._children = tuple()
         self._model = None
-        self.dirty = True
+        self._version = 0
+        # invariant: when a node is dirty, so are all of its descendants
+        self._dirty = True
+        # whether some descendant is dirty, so traversals need to descend
+        self._subtree_dirty = False
+        # writable storage, exposed through read-only views by the properties
+        self._position = np.zeros(3, dtype='f4').view(pyrr.Vector3)
+        self._scale = np.zeros(3, dtype='f4').view(pyrr.Vector3)
+        self._rotation = np.zeros(4, dtype='f4').view(pyrr.Quaternion)
+        self.position = position
+        self.scale = scale
+        self.rotation = rotation
 
     def update(self):
-        if self.dirty:
-            scale = pyrr.Matrix44.from_scale(self._scale, dtype='f4')
-            translate = pyrr.Matrix44.from_translation(self._position, dtype='f4')
-            # Scale -> Rotate -> Translate
-            self._model = translate * self._rotation.matrix44.astype('f4') * scale
+        if self._graph is not None:
+            self._graph.update()
+        elif self._dirty:
             if self._parent:
                 self._parent.update()
-                self._model = self._parent.model * self._model
+                if self._graph is not None:
+                    # adopted by the graph of the parent
+                    self._graph.update()
+                    return
+            # Scale -> Rotate -> Translate
+            model = compose(self._position, self._rotation, self._scale)
+            if self._parent:
+                # parent.model * model with pyrr matrices
+                model = np.matmul(model, self._parent.model, out=model)
+            self._model = model.view(pyrr.Matrix44)
             self._model.flags.writeable = False
-            self.dirty = False
+            self._version = next(transform_versions)
+            self._dirty = False
+            self._on_update()
+
+    def update_subtree(self):
+        """
+        Update the model matrices of this node and its descendants.
+
+        Clean subtrees are skipped without visiting them.
+
+        Returns
+        -------
+        int
+            Number of model matrices that were recomputed.
+        """
+        if self._graph is not None:
+            return self._graph.update()
+        count = 0
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node._graph is not None:
+                count += node._graph.update()
+                continue
+            descend = node._dirty or node._subtree_dirty
+            if node._dirty:
+                node.update()
+                count += 1
+            node._subtree_dirty = False
+            if descend:
+                stack.extend(node._children)
+        return count
+
+    def _on_update(self):
+        """Called after the model matrix was recomputed; override to update derived state."""
+        pass
+
+    @property
+    def dirty(self):
+        if self._graph is not None:
+            return self._graph.is_dirty(self._row)
+        return self._dirty
+
+    @dirty.setter
+    def dirty(self, value):
+        if self._graph is not None:
+            self._graph.mark_dirty(self._row, value)
+        elif value:
+            self._invalidate()
+        else:
+            self._dirty = False
+
+    def _invalidate(self):
+        """Mark this node and its subtree dirty and let the ancestors know."""
+        if not self._dirty:
+            stack = [self]
+            while stack:
+                node = stack.pop()
+                # the subtree of a dirty node is dirty already
+                if not node._dirty:
+                    node._dirty = True
+                    stack.extend(node._children)
+        node = self._parent
+        while node is not None and not node._subtree_dirty:
+            node._subtree_dirty = True
+            node = node._parent
 
     @property
     def model(self):
@@ -36,48 +124,57 @@ class Object3D:
     def model(self, value):
         self.scale, self.rotation, self.position = decompose(value)
 
+    @property
+    def version(self):
+        """Changes whenever the model matrix is recomputed; 0 before the first update."""
+        if self._graph is not None:
+            return int(self._graph.version[self._row])
+        return self._version
+
+    @staticmethod
+    def _readonly(value):
+        value = value.view()
+        value.flags.writeable = False
+        return value
+
     @property
     def position(self):
-        return self._position
+        return self._readonly(self._position)
 
     @position.setter
     def position(self, value):
-        self._position = pyrr.Vector3(value, dtype='f4')
-        self._position.flags.writeable = False
+        self._position[:] = value
         self.dirty = True
 
     @property
     def scale(self):
-        return self._scale
+        return self._readonly(self._scale)
 
     @scale.setter
     def scale(self, value):
-        self._scale = pyrr.Vector3(value, dtype='f4')
-        self._scale.flags.writeable = False
+        self._scale[:] = value
         self.dirty = True
 
     @property
     def rotation(self):
-        return self._rotation
+        return self._readonly(self._rotation)
 
     @rotation.setter
     def rotation(self, value):
-        value = np.asanyarray(value, dtype='f4')
         if isinstance(value, pyrr.Quaternion):
-            self._rotation = value.astype('f4')
-        elif isinstance(value, (np.ndarray, collections.Iterable)):
+            self._rotation[:] = value
+        elif isinstance(value, (np.ndarray, collections.abc.Iterable)):
             value = np.asanyarray(value, dtype='f4')
             if value.shape in ((3, 3), (4, 4)):
-                self._rotation = pyrr.Quaternion.from_matrix(value, dtype='f4')
+                self._rotation[:] = pyrr.Quaternion.from_matrix(value, dtype='f4')
             elif value.shape == (3,):
-                self._rotation = pyrr.Quaternion.from_eulers(pyrr.euler.create(*value, dtype='f4'))
+                self._rotation[:] = pyrr.Quaternion.from_eulers(pyrr.euler.create(*value, dtype='f4'))
             elif value.shape == (4,):
-                self._rotation = pyrr.Quaternion(value, dtype='f4')
+                self._rotation[:] = value
             else:
                 raise ValueError(f"unexpected shape {value.shape} for rotation")
         else:
             raise ValueError(f"unexpected type {type(value)} for rotation")
-        self._rotation.flags.writeable = False
         self.dirty = True
 
     @property
@@ -95,6 +192,8 @@ class Object3D:
         self._children = self._children + tuple([child])
         child._parent = self
         child.dirty = True
+        if self._graph is not None:
+            self._graph.invalidate_structure()
 
     def remove_child(self, child):
         if child.parent is not self:
@@ -102,6 +201,8 @@ class Object3D:
         self._children = tuple([c for c in self._children if c is not child])
         child._parent = None
         child.dirty = True
+        if self._graph is not None:
+            self._graph.invalidate_structure()
 
 
 class Scene(Object3D):
@@ -113,3 +214,72 @@ class Mesh(Object3D):
         super().__init__(**kwargs)
         self.geometry = geometry
         self.material = material
+
+
+class LOD(Object3D):
+    """
+    Level of detail: shows one of its children, chosen by projected size.
+
+    Children are added with `add_level`, each with the smallest screen size at
+    which it is shown. Renderers call `select` every frame to pick the child to draw.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # (screen size, node), from the largest screen size down
+        self.levels = []
+
+    def add_level(self, node, screen_size=0.0):
+        """
+        Add a child, shown while the projected size is at least `screen_size`.
+
+        See `projected_size` for the unit of the size.
+        """
+        self.append_child(node)
+        self.levels.append((screen_size, node))
+        self.levels.sort(key=lambda level: -level[0])
+
+    def remove_child(self, child):
+        super().remove_child(child)
+        self.levels = [(size, node) for size, node in self.levels if node is not child]
+
+    @classmethod
+    def from_geometries(cls, geometries, material, screen_sizes=None, **kwargs):
+        """
+        Make an LOD of meshes from a chain of geometries, see `radiant.lod_chain`.
+
+        By default every next level is used from half the screen size of the
+        previous one on, starting at 0.25; the last level has no lower bound.
+        """
+        if screen_sizes is None:
+            screen_sizes = [0.25 / 2 ** i for i in range(len(geometries) - 1)] + [0.0]
+        lod = cls(**kwargs)
+        for geometry, screen_size in zip(geometries, screen_sizes):
+            lod.add_level(Mesh(geometry, material), screen_size)
+        return lod
+
+    def projected_size(self, camera):
+        """
+        Projected radius of the bounding sphere of the first level, as a fraction
+        of half the viewport height; 1 when it fills the viewport vertically.
+        """
+        node = self.levels[0][1]
+        center, radius = node.geometry.bounding_sphere
+        model = np.asarray(node.model)
+        centers, radii = transform_spheres(np.asarray(center)[None], np.asarray([radius]), model[None])
+        view_center = np.append(centers[0], 1) @ np.asarray(camera.view)
+        # the camera looks down the negative z axis
+        distance = -view_center[2]
+        if distance <= radii[0]:
+            return float('inf')
+        return float(radii[0] * np.asarray(camera.projection)[1, 1] / distance)
+
+    def select(self, camera):
+        """The child to show from the camera viewpoint, or None if there are no levels."""
+        if not self.levels:
+            return None
+        size = self.projected_size(camera)
+        for screen_size, node in self.levels:
+            if size >= screen_size:
+                return node
+        return self.levels[-1][1]
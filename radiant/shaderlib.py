@@ -0,0 +1,181 @@
+from functools import lru_cache
+import hashlib
+import os
+import re
+
+
+__all__ = ('ShaderLibrary', 'shader_library', 'preprocess', 'program_digest')
+
+
+SHADER_PATH = os.path.join(os.path.dirname(__file__), 'shaders')
+# file extensions of the shader stages
+STAGES = ('vert', 'geom', 'frag')
+
+_INCLUDE = re.compile(r'^\s*#\s*include\s+"([^"]+)"\s*$')
+_DIRECTIVE = re.compile(r'^\s*#\s*(ifdef|ifndef|if|elif|else|endif|define|undef)\b\s*(\w*)')
+_COMMENTS = re.compile(r'/\*.*?\*/|//[^\n]*', re.S)
+
+
+def _include(source, read, seen):
+    lines = []
+    for line in source.splitlines():
+        match = _INCLUDE.match(line)
+        if match is None:
+            lines.append(line)
+            continue
+        name = match.group(1)
+        if name in seen:
+            raise ValueError(f"circular include of {name!r}")
+        lines.extend(_include(read(name), read, seen | {name}))
+    return lines
+
+
+def preprocess(source, defines=None, read=None):
+    """
+    Preprocesses GLSL source into the variant of the given defines.
+
+    Resolves ``#include "name"`` directives, evaluates ``#ifdef`` / ``#ifndef`` /
+    ``#else`` / ``#endif`` blocks, and inserts the defines still referenced after the
+    ``#version`` line. Other conditionals are left to the GLSL compiler. Comments and
+    blank lines are removed, so variants whose defines make no difference come out
+    identical.
+
+    Parameters
+    ----------
+    source : str
+    defines : dict, optional
+        Mapping of name to value; a value of None or True defines the bare name.
+    read : callable, optional
+        Returns the source of an included file by name.
+
+    Returns
+    -------
+    str
+    """
+    defines = dict(defines or {})
+    if read is None:
+        read = shader_library.read
+    source = _COMMENTS.sub('', source)
+
+    defined = set(defines)
+    # a frame per conditional: [active, condition, evaluated here, parent active]
+    stack = []
+    lines = []
+    for line in _include(source, lambda name: _COMMENTS.sub('', read(name)), frozenset()):
+        active = stack[-1][0] if stack else True
+        match = _DIRECTIVE.match(line)
+        directive, name = match.groups() if match else (None, None)
+        if directive in ('ifdef', 'ifndef'):
+            condition = (name in defined) == (directive == 'ifdef')
+            stack.append([active and condition, condition, True, active])
+            continue
+        if directive == 'if' or directive in ('elif', 'else', 'endif') and stack and not stack[-1][2]:
+            # conditions on expressions are left to the compiler
+            if directive == 'if':
+                stack.append([active, True, False, active])
+            if stack[-1][3]:
+                lines.append(line.rstrip())
+            if directive == 'endif':
+                stack.pop()
+            continue
+        if directive in ('elif', 'else', 'endif') and not stack:
+            raise ValueError(f"#{directive} without #ifdef")
+        if directive == 'elif':
+            raise ValueError("#elif is not supported after #ifdef / #ifndef")
+        if directive == 'else':
+            frame = stack[-1]
+            frame[0] = frame[3] and not frame[1]
+            continue
+        if directive == 'endif':
+            stack.pop()
+            continue
+        if not active:
+            continue
+        if directive == 'define':
+            defined.add(name)
+        elif directive == 'undef':
+            defined.discard(name)
+        if line.strip():
+            lines.append(line.rstrip())
+    if stack:
+        raise ValueError("unterminated #ifdef")
+
+    # the defines still used, right after the version
+    body = "\n".join(lines[1:])
+    injected = [
+        f"#define {name}" if value is None or value is True else f"#define {name} {value}"
+        for name, value in sorted(defines.items()) if re.search(rf'\b{re.escape(name)}\b', body)
+    ]
+    version = lines[:1] if lines and lines[0].lstrip().startswith('#version') else []
+    return "\n".join(version + injected + lines[len(version):]) + "\n"
+
+
+def program_digest(shaders):
+    """
+    Hash of the sources of a program, by stage.
+
+    Parameters
+    ----------
+    shaders : dict
+        Mapping of shader stage to source.
+
+    Returns
+    -------
+    str
+    """
+    digest = hashlib.sha256()
+    for stage, source in sorted(shaders.items()):
+        digest.update(stage.encode())
+        digest.update(b'\0')
+        digest.update(source.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ShaderLibrary:
+    """
+    Shader sources in a directory, and their preprocessed variants.
+
+    A program ``key`` consists of the files ``{key}.vert``, ``{key}.frag`` and optionally
+    ``{key}.geom``; other files, e.g. ``*.glsl``, are only meant to be included.
+
+    Parameters
+    ----------
+    path : str
+    """
+
+    def __init__(self, path=SHADER_PATH):
+        self.path = path
+        self.read = lru_cache(maxsize=None)(self._read)
+        self._load = lru_cache(maxsize=None)(self._load_variant)
+
+    def _read(self, name):
+        with open(os.path.join(self.path, name)) as fh:
+            return fh.read()
+
+    def load(self, key, defines=None):
+        """
+        Get the preprocessed sources of a program.
+
+        Parameters
+        ----------
+        key : str
+        defines : dict, optional
+            See `preprocess`.
+
+        Returns
+        -------
+        dict
+            Mapping of shader stage to source; shared, do not modify.
+        """
+        return self._load(key, tuple(sorted((defines or {}).items())))
+
+    def _load_variant(self, key, defines):
+        stages = [stage for stage in STAGES if os.path.exists(os.path.join(self.path, f"{key}.{stage}"))]
+        if not stages:
+            raise KeyError(f"no shaders named {key!r} in {self.path}")
+        return {stage: preprocess(self.read(f"{key}.{stage}"), dict(defines), read=self.read) for stage in stages}
+
+
+# library of the built-in shaders
+shader_library = ShaderLibrary()
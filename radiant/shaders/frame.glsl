@@ -0,0 +1,7 @@
+layout(std140) uniform Frame {
+	mat4 projection_matrix, view_matrix;
+	vec3 light_pos;
+	ivec3 cluster_grid;
+	// clusters per pixel along x and y, depth slices per unit of log depth, and the near plane distance
+	vec4 cluster_scale;
+};
@@ -1,6 +1,8 @@
 #version 330
 
-uniform vec4 color;
+layout(std140) uniform Material {
+	vec4 color;
+};
 
 out vec4 frag_color;
 
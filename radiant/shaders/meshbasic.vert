@@ -1,6 +1,10 @@
 #version 330
 
-uniform mat4 projection_matrix, model_view_matrix;
+// unlit, so the normals are not needed
+#define NO_NORMALS
+
+#include "frame.glsl"
+#include "object.glsl"
 
 in vec3 pos;
 
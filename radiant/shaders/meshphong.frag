@@ -1,32 +1,59 @@
 #version 330
 
 in vec3 pos_viewspace;
+#ifndef FLAT_SHADING
 in vec3 normal_viewspace;
-in vec3 light_pos_viewspace;
+#endif
 
 out vec4 frag_color;
 
-uniform vec4 color;
-uniform float shininess;
+#include "phong.glsl"
+
+#ifdef CLUSTERED_LIGHTS
+#include "frame.glsl"
+
+// one column per light; row 0 holds the view space position and range, row 1 the color times intensity
+uniform sampler2D light_data;
+// one texel per cluster; the offset and number of its lights in light_indices
+uniform sampler2D cluster_data;
+uniform sampler2D light_indices;
 
-const vec4 specular_color = vec4(1.0, 1.0, 1.0, 1.0);
+const int light_indices_width = 4096;
+#else
+in vec3 light_pos_viewspace;
+#endif
 
 
 void main() {
+#ifdef FLAT_SHADING
+	// the face normal, from the screen space derivatives of the position
+	vec3 normal = normalize(cross(dFdx(pos_viewspace), dFdy(pos_viewspace)));
+#else
 	vec3 normal = normalize(normal_viewspace);
-	vec3 light_dir = normalize(light_pos_viewspace - pos_viewspace);
-	vec3 reflect_dir = reflect(-light_dir, normal);
+#endif
 	// the view direction is the vector to the fragment of the surface we are shading
 	vec3 view_dir = normalize(-pos_viewspace);
 
-	float lambertian = max(dot(light_dir, normal), 0.0);
-	float specular = 0.0;
-
-	// TODO: does this really need to be an if-statement? probably slow
-	if (lambertian > 0.0) {
-		float spec_angle = max(dot(reflect_dir, view_dir), 0.0);
-		specular = pow(spec_angle, shininess);
+#ifdef CLUSTERED_LIGHTS
+	// only the lights of the cluster of this fragment can reach it
+	float depth_slice = log(-pos_viewspace.z / cluster_scale.w) * cluster_scale.z;
+	ivec3 cluster = clamp(ivec3(vec3(gl_FragCoord.xy * cluster_scale.xy, depth_slice)), ivec3(0), cluster_grid - 1);
+	ivec2 range = ivec2(texelFetch(cluster_data, ivec2(cluster.y * cluster_grid.x + cluster.x, cluster.z), 0).xy);
+
+	vec4 result = vec4(0.0);
+	for (int i = range.x; i < range.x + range.y; i++) {
+		int light = int(texelFetch(light_indices, ivec2(i % light_indices_width, i / light_indices_width), 0).r);
+		vec4 light_pos = texelFetch(light_data, ivec2(light, 0), 0);
+		vec3 light_color = texelFetch(light_data, ivec2(light, 1), 0).rgb;
+
+		vec3 to_light = light_pos.xyz - pos_viewspace;
+		float distance = length(to_light);
+		// falls off smoothly to zero at the range of the light
+		float falloff = clamp(1.0 - pow(distance / light_pos.w, 4.0), 0.0, 1.0);
+		result += falloff * falloff * vec4(light_color, 1.0) * phong(normal, to_light / distance, view_dir);
 	}
-
-	frag_color = lambertian * color + specular * specular_color;
+	frag_color = result;
+#else
+	frag_color = phong(normal, normalize(light_pos_viewspace - pos_viewspace), view_dir);
+#endif
 }
@@ -1,15 +1,21 @@
 #version 330
 
-uniform mat4 projection_matrix, model_view_matrix, normal_matrix, view_matrix;
-uniform vec3 light_pos;
+#include "frame.glsl"
+#include "object.glsl"
 
 in vec3 pos;
 in vec2 uv;
+#ifndef FLAT_SHADING
 in vec3 normal;
+#endif
 
 out vec3 pos_viewspace;
+#ifndef FLAT_SHADING
 out vec3 normal_viewspace;
+#endif
+#ifndef CLUSTERED_LIGHTS
 out vec3 light_pos_viewspace;
+#endif
 
 void main() {
 	gl_Position = projection_matrix * model_view_matrix * vec4(pos, 1.0);
@@ -17,8 +23,12 @@ void main() {
 	vec4 pos2 = model_view_matrix * vec4(pos, 1.0);
 	pos_viewspace = vec3(pos2) / pos2.w;
 
+#ifndef CLUSTERED_LIGHTS
 	vec4 light_pos2 = view_matrix * vec4(light_pos, 1.0);
 	light_pos_viewspace = vec3(light_pos2) / light_pos2.w;
+#endif
 	
+#ifndef FLAT_SHADING
 	normal_viewspace = (normal_matrix * vec4(normal, 0.0)).xyz;
+#endif
 }
@@ -0,0 +1,11 @@
+#ifdef INSTANCED
+// per instance
+in mat4 model_view_matrix;
+#ifndef NO_NORMALS
+in mat4 normal_matrix;
+#endif
+#else
+layout(std140) uniform Object {
+	mat4 model_view_matrix, normal_matrix;
+};
+#endif
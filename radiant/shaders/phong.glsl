@@ -0,0 +1,20 @@
+layout(std140) uniform Material {
+	vec4 color;
+	float shininess;
+};
+
+const vec4 specular_color = vec4(1.0, 1.0, 1.0, 1.0);
+
+// diffuse and specular reflection of a light from light_dir, all directions normalized
+vec4 phong(vec3 normal, vec3 light_dir, vec3 view_dir) {
+	float lambertian = max(dot(light_dir, normal), 0.0);
+	float specular = 0.0;
+
+	// TODO: does this really need to be an if-statement? probably slow
+	if (lambertian > 0.0) {
+		float spec_angle = max(dot(reflect(-light_dir, normal), view_dir), 0.0);
+		specular = pow(spec_angle, shininess);
+	}
+
+	return lambertian * color + specular * specular_color;
+}
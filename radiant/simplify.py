@@ -0,0 +1,163 @@
+import numpy as np
+
+from .geometries import Geometry, Primitives
+
+
+__all__ = ('simplify', 'lod_chain')
+
+
+def _triangles(geometry):
+    if geometry.primitive is not Primitives.TRIANGLES:
+        raise ValueError(f"can only simplify triangles, not {geometry.primitive.name}")
+    if geometry.index is not None:
+        return np.asarray(geometry.index).reshape((-1, 3))
+    n = len(geometry.attributes['pos'])
+    return np.arange(n - n % 3).reshape((-1, 3))
+
+
+def _cluster(pos, resolution):
+    """Cluster of every vertex in a uniform grid with `resolution` cells along the longest side."""
+    lower = pos.min(axis=0)
+    extent = (pos.max(axis=0) - lower).max()
+    cell = extent / resolution if extent > 0 else 1.0
+    cells = np.minimum(((pos - lower) / cell).astype('i8'), resolution - 1)
+    keys = (cells[:, 0] * resolution + cells[:, 1]) * resolution + cells[:, 2]
+    _, inverse = np.unique(keys, return_inverse=True)
+    return inverse.reshape(-1)
+
+
+def _collapse(triangles, inverse):
+    """Triangles between distinct clusters, without duplicates, in their original order."""
+    collapsed = inverse[triangles]
+    keep = ((collapsed[:, 0] != collapsed[:, 1]) & (collapsed[:, 1] != collapsed[:, 2])
+            & (collapsed[:, 0] != collapsed[:, 2]))
+    collapsed = collapsed[keep]
+    _, first = np.unique(np.sort(collapsed, axis=1), axis=0, return_index=True)
+    return collapsed[np.sort(first)]
+
+
+def _cluster_means(values, inverse, n_clusters):
+    counts = np.bincount(inverse, minlength=n_clusters)[:, None]
+    sums = np.stack([np.bincount(inverse, weights=values[:, i], minlength=n_clusters) for i in range(values.shape[1])], axis=1)
+    return sums / counts
+
+
+def _quadric_positions(pos, triangles, inverse, n_clusters):
+    """
+    Position of every cluster minimizing the squared distances to the planes of
+    the original triangles around it (the quadric error metric).
+
+    Directions the quadric does not constrain, e.g. within a flat region, keep
+    the mean of the cluster; results are clamped to the bounds of the cluster.
+    """
+    v0, v1, v2 = pos[triangles[:, 0]], pos[triangles[:, 1]], pos[triangles[:, 2]]
+    normals = np.cross(v1 - v0, v2 - v0)
+    # |cross| is twice the area, so the quadrics below are area weighted
+    lengths = np.linalg.norm(normals, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        unit = np.nan_to_num(normals / lengths[:, None])
+    d = -(unit * v0).sum(axis=1)
+    area = lengths / 2
+
+    quadric_a = area[:, None, None] * unit[:, :, None] * unit[:, None, :]
+    quadric_b = (area * d)[:, None] * unit
+    # every triangle contributes to the clusters of its three corners
+    clusters = inverse[triangles].ravel()
+    a = np.zeros((n_clusters, 9))
+    b = np.zeros((n_clusters, 3))
+    for i in range(9):
+        a[:, i] = np.bincount(clusters, weights=np.repeat(quadric_a.reshape((-1, 9))[:, i], 3), minlength=n_clusters)
+    for i in range(3):
+        b[:, i] = np.bincount(clusters, weights=np.repeat(quadric_b[:, i], 3), minlength=n_clusters)
+    a = a.reshape((-1, 3, 3))
+
+    mean = _cluster_means(pos, inverse, n_clusters)
+    # solve a x = -b around the mean, so unconstrained directions stay at the mean
+    residual = -(np.matmul(a, mean[:, :, None])[:, :, 0] + b)
+    scale = np.abs(a).max(axis=(1, 2), keepdims=True)
+    scale[scale == 0] = 1
+    offset = np.matmul(np.linalg.pinv(a / scale, rcond=1e-3), (residual / scale[:, :, 0])[:, :, None])[:, :, 0]
+
+    lower = np.full((n_clusters, 3), np.inf)
+    upper = np.full((n_clusters, 3), -np.inf)
+    np.minimum.at(lower, inverse, pos)
+    np.maximum.at(upper, inverse, pos)
+    return np.clip(mean + offset, lower, upper)
+
+
+def simplify(geometry, ratio=0.5, resolution=None):
+    """
+    Simplifies a triangle mesh by vertex clustering.
+
+    Vertices are merged per cell of a uniform grid, placed where they minimize
+    the quadric error of the original surface around them. Triangles that
+    collapse are removed. Other attributes are averaged per cell; normals are
+    renormalized. Generated attributes that were not computed yet are generated
+    again for the result.
+
+    Parameters
+    ----------
+    geometry : Geometry
+    ratio : float
+        Target fraction of the triangles to keep; the finest grid not exceeding
+        it is searched for. Ignored if `resolution` is given.
+    resolution : int, optional
+        Number of grid cells along the longest side of the bounding box.
+
+    Returns
+    -------
+    Geometry
+        An indexed geometry.
+    """
+    triangles = _triangles(geometry)
+    pos = np.asarray(geometry.attributes['pos'], dtype='f8')
+
+    if resolution is None:
+        target = ratio * len(triangles)
+        # triangle counts grow with the resolution; find the largest one within the target
+        low, high = 1, 2
+        while len(_collapse(triangles, _cluster(pos, high))) <= target and high < 1 << 20:
+            low, high = high, high * 2
+        while high - low > 1:
+            middle = (low + high) // 2
+            if len(_collapse(triangles, _cluster(pos, middle))) <= target:
+                low = middle
+            else:
+                high = middle
+        resolution = low
+
+    inverse = _cluster(pos, resolution)
+    n_clusters = inverse.max() + 1 if len(inverse) else 0
+    attributes = {}
+    for name, values in geometry.attributes.computed().items():
+        values = np.asarray(values)
+        if name == 'pos':
+            merged = _quadric_positions(pos, triangles, inverse, n_clusters)
+        else:
+            merged = _cluster_means(values.astype('f8'), inverse, n_clusters)
+            if name == 'normal':
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    merged = np.nan_to_num(merged / np.linalg.norm(merged, axis=1, keepdims=True))
+        attributes[name] = merged.astype(values.dtype)
+
+    dtype = geometry.index.dtype if geometry.index is not None else 'i4'
+    index = _collapse(triangles, inverse).astype(dtype)
+    return Geometry(attributes, index=index, primitive=geometry.primitive, winding_order=geometry.winding_order)
+
+
+def lod_chain(geometry, levels=4, ratio=0.25):
+    """
+    Builds levels of detail of a geometry.
+
+    Every level is simplified from the original, to `ratio` times the triangles
+    of the previous level.
+
+    Returns
+    -------
+    list of Geometry
+        The original geometry first.
+    """
+    chain = [geometry]
+    for level in range(1, levels):
+        chain.append(simplify(geometry, ratio=ratio ** level))
+    return chain
@@ -0,0 +1,91 @@
+import numpy as np
+import numpy.testing as npt
+import pyrr
+import pytest
+
+import radiant
+
+
+def test_sample():
+    a, b = radiant.Object3D(), radiant.Object3D()
+    rotations = [pyrr.Quaternion.from_y_rotation(angle) for angle in (0, 1, 2.5)]
+    clip = radiant.AnimationClip([
+        radiant.KeyframeTrack(a, 'position', [0, 1, 3], [[0, 0, 0], [1, 2, 3], [3, 2, 1]]),
+        radiant.KeyframeTrack(b, 'position', [0.5, 2], [[1, 1, 1], [4, 4, 4]]),
+        radiant.KeyframeTrack(b, 'scale', [0, 1], [[1, 1, 1], [2, 2, 2]], interpolation='step'),
+        radiant.KeyframeTrack(a, 'rotation', [0, 1, 2], rotations),
+    ])
+    assert clip.duration == 3
+    assert [id(node) for node in clip.targets] == [id(a), id(b)]
+
+    for time in (-1, 0, 0.25, 1, 1.5, 2.9, 4):
+        values = clip.sample(time)
+        npt.assert_allclose(values['position'][0], [np.interp(time, [0, 1, 3], axis) for axis in ([0, 1, 3], [0, 2, 2], [0, 3, 1])], atol=1e-5)
+        npt.assert_allclose(values['position'][1], np.full(3, np.interp(time, [0.5, 2], [1, 4])), atol=1e-5)
+        npt.assert_array_equal(values['scale'][0], np.full(3, 2 if time >= 1 else 1))
+        segment = int(np.clip(time, 0, 1.999))
+        factor = np.clip(time - segment, 0, 1)
+        npt.assert_allclose(values['rotation'][0], pyrr.quaternion.slerp(rotations[segment], rotations[segment + 1], factor), atol=1e-5)
+
+    with pytest.raises(ValueError):
+        radiant.AnimationClip([radiant.KeyframeTrack(a, 'color', [0], [[1, 1, 1]])])
+    with pytest.raises(ValueError):
+        radiant.AnimationClip([radiant.KeyframeTrack(a, 'position', [1, 0], [[1, 1, 1], [0, 0, 0]])])
+
+
+def test_mixer():
+    scene = radiant.Scene()
+    nodes = [radiant.Object3D(position=[i, 0, 0]) for i in range(4)]
+    for node in nodes:
+        scene.append_child(node)
+    graph = radiant.TransformGraph(scene)
+    graph.update()
+
+    times = [0, 1]
+    heights = np.array([[[0, 0, 0], [0, 2, 0]]] * 4) + np.arange(4)[:, None, None] * [1, 0, 0]
+    clip = radiant.AnimationClip.from_arrays(nodes, 'position', times, heights)
+    mixer = radiant.AnimationMixer(graph)
+    action = mixer.play(clip)
+    assert mixer.update(0.25) == 4
+    assert all(node.dirty for node in nodes) and not scene.dirty
+    npt.assert_allclose(np.asarray(nodes[2].position), [2, 0.5, 0])
+    graph.update()
+    npt.assert_allclose(np.asarray(nodes[2].model)[3, :3], [2, 0.5, 0])
+
+    # looping, and holding the last frame
+    mixer.update(1.0)
+    npt.assert_allclose(action.time, 0.25)
+    action.loop = False
+    mixer.update(5.0)
+    npt.assert_allclose(np.asarray(nodes[3].position), [3, 2, 0])
+
+    # half weight blends with the rest pose
+    action.weight = 0.5
+    mixer.update(0)
+    npt.assert_allclose(np.asarray(nodes[3].position), [3, 1, 0])
+
+    # structure changes are picked up
+    extra = radiant.Object3D()
+    scene.append_child(extra)
+    mixer.update(0)
+    npt.assert_allclose(np.asarray(nodes[1].position), [1, 1, 0])
+
+    action.stop()
+    assert mixer.update(1) == 0
+    with pytest.raises(ValueError):
+        mixer.play(radiant.AnimationClip([radiant.KeyframeTrack(radiant.Object3D(), 'scale', [0], [[1, 1, 1]])]))
+
+
+def test_blend_rotations():
+    scene = radiant.Scene()
+    node = radiant.Object3D()
+    scene.append_child(node)
+    graph = radiant.TransformGraph(scene)
+
+    quarter = pyrr.Quaternion.from_z_rotation(np.pi / 2)
+    mixer = radiant.AnimationMixer(graph)
+    mixer.play(radiant.AnimationClip([radiant.KeyframeTrack(node, 'rotation', [0], [quarter])]), weight=0.5)
+    # the same rotation, with the opposite sign
+    mixer.play(radiant.AnimationClip([radiant.KeyframeTrack(node, 'rotation', [0], [-np.asarray(quarter)])]), weight=0.5)
+    mixer.update(0)
+    npt.assert_allclose(np.abs(np.asarray(node.rotation)), np.abs(np.asarray(quarter)), atol=1e-6)
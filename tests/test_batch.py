@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+import radiant
+from radiant.renderers.batch import BatchRenderer, save_images
+from radiant.renderers.moderngl import create_standalone_context, ModernGLRenderer
+
+
+def orbit(n):
+    cameras = []
+    for angle in np.linspace(0, 2 * np.pi, n, endpoint=False):
+        position = [4 * np.sin(angle), 1, 4 * np.cos(angle)]
+        cameras.append(radiant.PerspectiveCamera(position=position, target=[0, 0, 0], up=[0, 1, 0], aspect=1))
+    return cameras
+
+
+def build_scene():
+    scene = radiant.Scene()
+    geometry = radiant.PlaneGeometry()
+    scene.append_child(radiant.Mesh(geometry, radiant.MeshPhongMaterial(color=(0.8, 0.2, 0.2, 1.0))))
+    scene.append_child(radiant.Mesh(geometry, radiant.MeshBasicMaterial(color=(0.2, 0.8, 0.2, 1.0)), position=[0, 0, -1]))
+    light = radiant.PointLight(position=[0, 2, 4])
+    scene.append_child(light)
+    return scene, light
+
+
+@pytest.mark.skipif(os.environ.get('TRAVIS') == 'true', reason="travis does not support opengl 3.3")
+@pytest.mark.parametrize('buffers', [1, 3])
+def test_batch_frames(buffers):
+    ctx = create_standalone_context()
+    renderer = ModernGLRenderer(ctx)
+    scene, light = build_scene()
+    cameras = orbit(7)
+
+    # render every frame synchronously
+    fbo = ctx.framebuffer(ctx.renderbuffer((64, 64)), ctx.depth_renderbuffer((64, 64)))
+    expected = []
+    for camera in cameras:
+        fbo.use()
+        renderer.render(scene, camera, light=light)
+        data = np.frombuffer(fbo.read(components=3, alignment=1), dtype='u1')
+        expected.append(data.reshape((64, 64, 3))[::-1])
+
+    batch = BatchRenderer(renderer, size=(64, 64), buffers=buffers)
+    frames = list(batch.frames(scene, cameras, light=light))
+    assert [index for index, _ in frames] == list(range(7))
+    for (_, image), reference in zip(frames, expected):
+        npt.assert_array_equal(image, reference)
+    assert len(np.unique(expected[0])) > 1
+
+    images = batch.render(scene, cameras, light=light)
+    assert batch.stats['frames'] == 7 and batch.stats['fps'] > 0
+    npt.assert_array_equal(images[3], expected[3])
+    batch.release()
+
+
+@pytest.mark.skipif(os.environ.get('TRAVIS') == 'true', reason="travis does not support opengl 3.3")
+def test_batch_sink(tmpdir):
+    ctx = create_standalone_context()
+    scene, light = build_scene()
+    batch = BatchRenderer(ModernGLRenderer(ctx), size=(32, 32), workers=2, max_pending=1)
+
+    filenames = batch.render(scene, orbit(5), light=light, sink=save_images(str(tmpdir.join("frame_{:03d}.png"))))
+    assert filenames == [str(tmpdir.join(f"frame_{i:03d}.png")) for i in range(5)]
+    assert all(os.path.exists(filename) for filename in filenames)
+
+    def fail(index, image):
+        raise RuntimeError(index)
+
+    with pytest.raises(RuntimeError):
+        batch.render(scene, orbit(3), light=light, sink=fail)
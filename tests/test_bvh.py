@@ -0,0 +1,118 @@
+import numpy as np
+import numpy.testing as npt
+import pyrr
+
+import radiant
+from radiant.bvh import intersect_triangles
+
+
+def random_boxes(n, seed=0):
+    rng = np.random.RandomState(seed)
+    lower = rng.uniform(-10, 10, (n, 3)).astype('f4')
+    return lower, lower + rng.uniform(0, 2, (n, 3)).astype('f4')
+
+
+def test_query_box():
+    lower, upper = random_boxes(500)
+    bvh = radiant.BVH(lower, upper)
+    for q_lower, q_upper in [([-1, -1, -1], [1, 1, 1]), ([0, -10, 3], [5, 10, 4]), ([20, 20, 20], [21, 21, 21])]:
+        expected = np.flatnonzero(((lower <= q_upper) & (upper >= q_lower)).all(axis=1))
+        npt.assert_array_equal(bvh.query_box(q_lower, q_upper), expected)
+
+
+def test_query_rays():
+    lower, upper = random_boxes(300, seed=1)
+    bvh = radiant.BVH(lower, upper, leaf_size=3)
+    rng = np.random.RandomState(2)
+    origins = rng.uniform(-15, 15, (50, 3)).astype('f4')
+    directions = rng.normal(size=(50, 3)).astype('f4')
+    # axis aligned directions have infinite slabs
+    directions[:5] = [0, 0, 1]
+
+    rays, items, distances = bvh.query_rays(origins, directions)
+    found = set(zip(rays.tolist(), items.tolist()))
+    for ray, (origin, direction) in enumerate(zip(origins, directions)):
+        points = origin + np.linspace(0, 40, 4001)[:, None, None] * direction
+        inside = ((points >= lower) & (points <= upper)).all(axis=2).any(axis=0)
+        for item in np.flatnonzero(inside):
+            assert (ray, item) in found
+    for ray, item, distance in zip(rays, items, distances):
+        point = origins[ray] + distance * directions[ray]
+        assert (point >= lower[item] - 1e-4).all() and (point <= upper[item] + 1e-4).all()
+
+
+def test_refit():
+    lower, upper = random_boxes(100)
+    bvh = radiant.BVH(lower, upper)
+    bvh.item_lower[10] = bvh.item_upper[10] = [50, 50, 50]
+    bvh.refit([10])
+    npt.assert_array_equal(bvh.upper[0], [50, 50, 50])
+    npt.assert_array_equal(bvh.query_box([49, 49, 49], [51, 51, 51]), [10])
+
+    rebuilt = radiant.BVH(bvh.item_lower, bvh.item_upper)
+    npt.assert_array_equal(bvh.lower[0], rebuilt.lower[0])
+
+
+def test_triangle_bvh():
+    plane = radiant.PlaneGeometry(width=2, height=2, width_segments=8, height_segments=8)
+    bvh = radiant.triangle_bvh(plane)
+    assert radiant.triangle_bvh(plane) is bvh
+
+    origins = [[0.1, 0.2, 1], [0.6, -0.4, -2], [3, 0, 1], [0.1, 0.2, 1]]
+    directions = [[0, 0, -1], [0, 0, 0.5], [0, 0, -1], [0, 0, 1]]
+    distances, triangles = bvh.raycast(origins, directions)
+    npt.assert_allclose(distances, [1, 4, np.inf, np.inf])
+    assert triangles[2] == triangles[3] == -1
+    # the triangles hit contain the points
+    corners = bvh.corners[triangles[:2]]
+    t = intersect_triangles(np.array(origins[:2], dtype='f4'), np.array(directions[:2], dtype='f4'), corners)
+    npt.assert_allclose(t, distances[:2])
+
+
+def test_scene_bvh():
+    scene = radiant.Scene()
+    plane = radiant.PlaneGeometry()
+    material = radiant.MeshBasicMaterial()
+    meshes = []
+    for x in range(5):
+        for y in range(5):
+            mesh = radiant.Mesh(plane, material, position=(x * 2, y * 2, -x))
+            scene.append_child(mesh)
+            meshes.append(mesh)
+    bvh = radiant.SceneBVH(scene)
+    assert bvh.meshes == meshes
+
+    assert bvh.query_box([1.9, 1.9, -5], [2.1, 2.1, 5]) == [meshes[6]]
+    hits = bvh.raycast([[2, 4, 10], [20, 20, 10], [4.2, 0.3, 10]], [[0, 0, -1]] * 3)
+    npt.assert_allclose(hits.distance, [11, np.inf, 12])
+    npt.assert_array_equal(hits.mesh, [7, -1, 10])
+
+    # refit after moving a mesh
+    meshes[7].position = (20, 20, 0)
+    assert bvh.update() == 1
+    assert bvh.update() == 0
+    hits = bvh.raycast([[2, 4, 10], [20, 20, 10]], [[0, 0, -1]] * 2)
+    npt.assert_allclose(hits.distance, [np.inf, 10])
+    npt.assert_array_equal(hits.mesh, [-1, 7])
+
+    # rotated and scaled meshes are hit in model space
+    meshes[0].scale = (4, 4, 4)
+    meshes[0].rotation = pyrr.Quaternion.from_x_rotation(np.pi / 2)
+    bvh.update()
+    hits = bvh.raycast([[0, 10, 0.5]], [[0, -1, 0]])
+    npt.assert_array_equal(hits.mesh, [0])
+    npt.assert_allclose(hits.distance, [10], atol=1e-5)
+
+
+def test_scene_frustum():
+    scene = radiant.Scene()
+    plane = radiant.PlaneGeometry()
+    material = radiant.MeshBasicMaterial()
+    for x in range(-20, 21, 4):
+        scene.append_child(radiant.Mesh(plane, material, position=(x, 0, 0)))
+    camera = radiant.PerspectiveCamera(position=[0, 0, 10], target=[0, 0, 0], up=[0, 1, 0], fov=60, aspect=1, near=0.1, far=100)
+    camera.update()
+    planes = radiant.maths.frustum_planes(camera.projection * camera.view)
+
+    bvh = radiant.SceneBVH(scene)
+    assert [node.position[0] for node in bvh.query_frustum(planes)] == [-4, 0, 4]
@@ -0,0 +1,42 @@
+import numpy as np
+import pyrr
+import pytest
+
+import radiant
+
+
+def test_perspective_depth_range():
+    projection = pyrr.Matrix44.perspective_projection(60, 1.5, 0.5, 80)
+    np.testing.assert_allclose(radiant.perspective_depth_range(projection), (0.5, 80))
+    with pytest.raises(ValueError):
+        radiant.perspective_depth_range(pyrr.Matrix44.orthogonal_projection(-1, 1, -1, 1, 0.1, 10))
+
+
+def test_assign():
+    near, far = 0.5, 50.0
+    projection = np.asarray(pyrr.Matrix44.perspective_projection(60, 16 / 9, near, far))
+    clusters = radiant.LightClusters(grid=(16, 9, 24))
+    rng = np.random.default_rng(4)
+    positions = rng.uniform([-30, -20, -60], [30, 20, 5], (300, 3))
+    radii = rng.uniform(0.5, 5, 300)
+    radii[:3] = np.inf
+    offsets, counts, indices = clusters.assign(positions, radii, projection)
+    assert len(counts) == len(clusters) == 16 * 9 * 24
+    assert counts.sum() == len(indices)
+    # every cluster holds the infinite lights, the others are spread out
+    assert (counts >= 3).all() and counts.max() < 100
+
+    # points inside the frustum see every light reaching them in their cluster
+    ndc = rng.uniform(-1, 1, (2000, 2))
+    depth = near * (far / near) ** rng.uniform(0, 1, 2000)
+    points = np.concatenate([ndc / np.diag(projection)[:2] * depth[:, None], -depth[:, None]], axis=1)
+    x, y = np.minimum(((ndc + 1) / 2 * [16, 9]).astype(int), [15, 8]).T
+    z = np.minimum((np.log(depth / near) * clusters.slice_scale(near, far)).astype(int), 23)
+    for point, cluster in zip(points, (z * 9 + y) * 16 + x):
+        lights = indices[offsets[cluster]:offsets[cluster] + counts[cluster]]
+        reaching = np.flatnonzero(np.linalg.norm(positions - point, axis=1) < radii)
+        assert np.isin(reaching, lights).all()
+
+    # lights behind the camera or beyond the far plane are dropped
+    offsets, counts, indices = clusters.assign([[0, 0, 3], [0, 0, -60]], [1, 1], projection)
+    assert len(indices) == 0 and not counts.any()
@@ -0,0 +1,44 @@
+import functools
+import os
+
+import numpy.testing as npt
+import pytest
+
+from radiant.renderers.batch import BatchRenderer
+from radiant.renderers.farm import RenderFarm
+from radiant.renderers.moderngl import create_standalone_context, ModernGLRenderer
+from .test_batch import build_scene, orbit
+
+
+def crash_once(marker, index, image):
+    # kill the worker the first time the frame is seen
+    if index == 2 and not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return index, image.sum()
+
+
+@pytest.mark.skipif(os.environ.get('TRAVIS') == 'true', reason="travis does not support opengl 3.3")
+def test_render_farm(tmpdir):
+    scene, light = build_scene()
+    cameras = orbit(9)
+    batch = BatchRenderer(ModernGLRenderer(create_standalone_context()), size=(32, 32))
+    expected = batch.render(scene, cameras, light=light)
+
+    with RenderFarm(scene, light=light, size=(32, 32), workers=2, chunk_size=2, start_method='spawn') as farm:
+        frames = list(farm.render(cameras))
+        assert [index for index, _ in frames] == list(range(9))
+        for (_, image), reference in zip(frames, expected):
+            npt.assert_array_equal(image, reference)
+        assert farm.stats['frames'] == 9
+        directory = farm.directory
+    assert not os.path.exists(directory)
+
+    # a dying worker is replaced and its frames are rendered again
+    marker = str(tmpdir.join("crashed"))
+    sink = functools.partial(crash_once, marker)
+    with RenderFarm(scene, light=light, size=(32, 32), workers=2, chunk_size=1, sink=sink, start_method='spawn') as farm:
+        results = list(farm.render(cameras[:5]))
+        assert [index for index, _ in results] == list(range(5))
+        assert [total for _, (_, total) in results] == [image.sum() for image in expected[:5]]
+        assert farm.stats['restarts'] == 1
@@ -1,4 +1,8 @@
+import gc
+
+import numpy as np
 import numpy.testing as npt
+import pytest
 
 import radiant
 
@@ -6,3 +10,118 @@ import radiant
 def test_plane():
     plane = radiant.PlaneGeometry()
     npt.assert_array_equal(plane.index, [[0, 2, 1], [2, 3, 1]])
+
+
+def test_bounds():
+    plane = radiant.PlaneGeometry(width=2, height=4)
+    lower, upper = plane.bounding_box
+    npt.assert_array_equal(lower, [-1, -2, 0])
+    npt.assert_array_equal(upper, [1, 2, 0])
+    center, radius = plane.bounding_sphere
+    npt.assert_array_equal(center, [0, 0, 0])
+    npt.assert_almost_equal(radius, 5 ** 0.5, decimal=6)
+
+    # cached until the positions are replaced
+    assert plane.bounding_box is plane.bounding_box
+    plane.attributes['pos'] = plane.attributes['pos'] + 1
+    npt.assert_array_equal(plane.bounding_box[0], [0, -1, 1])
+
+
+def test_generated_attributes():
+    plane = radiant.PlaneGeometry(width=2, height=2, width_segments=2, height_segments=2)
+    assert set(plane.attributes) == {'pos', 'uv', 'normal', 'tangent'}
+    assert not plane.attributes.is_computed('normal')
+    assert set(plane.attributes.computed()) == {'pos', 'uv'}
+
+    normal = plane.attributes['normal']
+    npt.assert_array_equal(normal, [[0, 0, 1]] * 9)
+    assert plane.attributes['normal'] is normal and plane.attributes.is_computed('normal')
+    npt.assert_array_equal(plane.attributes['tangent'], [[1, 0, 0, 1]] * 9)
+
+    # recomputed once a source is replaced
+    plane.attributes['pos'] = plane.attributes['pos'][:, [0, 2, 1]]
+    assert not plane.attributes.is_computed('normal') and not plane.attributes.is_computed('tangent')
+    npt.assert_array_equal(plane.attributes['normal'], [[0, -1, 0]] * 9)
+    # arrays take precedence
+    plane.attributes['normal'] = normal
+    assert plane.attributes['normal'] is normal and plane.attributes.sources('normal') == ()
+
+
+def test_generated_from_index():
+    # the tent of test_vertex_normals, with the second triangle flipped
+    pos = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 1], [0, -1, 1]], dtype='f4')
+    tent = radiant.Geometry({'pos': pos}, index=np.array([[0, 1, 2], [0, 1, 3]]))
+    npt.assert_allclose(tent.attributes['normal'][3], [0, -0.5 ** 0.5, -0.5 ** 0.5], atol=1e-7)
+
+    # the generated normals follow a new index
+    tent.index = np.array([[0, 1, 2], [0, 3, 1]])
+    assert not tent.attributes.is_computed('normal')
+    npt.assert_allclose(tent.attributes['normal'], radiant.vertex_normals(pos, tent.index), atol=1e-7)
+    npt.assert_allclose(tent.attributes['normal'][3], [0, 0.5 ** 0.5, 0.5 ** 0.5], atol=1e-7)
+
+    # arrays are kept
+    normal = tent.attributes['normal'] = np.zeros_like(pos)
+    tent.index = None
+    assert tent.attributes['normal'] is normal
+
+
+def test_vertex_normals():
+    # two triangles of a tent, sharing an edge
+    pos = [[0, 0, 0], [1, 0, 0], [0, 1, 1], [0, -1, 1]]
+    normals = radiant.vertex_normals(pos, [[0, 1, 2], [0, 3, 1]])
+    npt.assert_allclose(normals[:2], [[0, 0, 1], [0, 0, 1]], atol=1e-7)
+    npt.assert_allclose(normals[2], [0, -0.5 ** 0.5, 0.5 ** 0.5], atol=1e-7)
+    npt.assert_allclose(normals[3], [0, 0.5 ** 0.5, 0.5 ** 0.5], atol=1e-7)
+
+
+@pytest.mark.parametrize('geometry, n_triangles, lower, upper', [
+    (radiant.BoxGeometry(1, 2, 3, 2, 3, 4), 2 * 2 * (2 * 3 + 3 * 4 + 2 * 4), [-0.5, -1, -1.5], [0.5, 1, 1.5]),
+    (radiant.SphereGeometry(2, 16, 8), 16 * 8 * 2 - 2 * 16, [-2, -2, -2], [2, 2, 2]),
+    (radiant.CylinderGeometry(1, 1, 2, 16, 2), 16 * 2 * 2 + 2 * 16, [-1, -1, -1], [1, 1, 1]),
+    (radiant.CylinderGeometry(0, 1, 2, 16, 1), 16 + 16, [-1, -1, -1], [1, 1, 1]),
+    (radiant.TorusGeometry(1, 0.25, 8, 24), 8 * 24 * 2, [-1.25, -1.25, -0.25], [1.25, 1.25, 0.25]),
+    (radiant.ExtrusionGeometry([[0, 0], [2, 0], [2, 2], [1, 1], [0, 2]], 1, 2), 5 * 2 * 2 + 2 * 3, [0, 0, -0.5], [2, 2, 0.5]),
+])
+def test_generators(geometry, n_triangles, lower, upper):
+    pos, normal, uv = (geometry.attributes[name] for name in ('pos', 'normal', 'uv'))
+    assert geometry.index.shape == (n_triangles, 3) and geometry.index.dtype == np.dtype('i4')
+    assert pos.dtype == normal.dtype == uv.dtype == np.dtype('f4')
+    npt.assert_allclose(geometry.bounding_box, [lower, upper], atol=1e-6)
+    npt.assert_allclose(np.linalg.norm(normal, axis=1), 1, rtol=1e-6)
+    assert uv.min() >= 0 and uv.max() <= 1
+
+    # triangles are not degenerate and wind counter-clockwise seen from outside
+    corners = pos[geometry.index].astype('f8')
+    faces = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    assert (np.linalg.norm(faces, axis=1) > 1e-9).all()
+    assert ((faces * normal[geometry.index].sum(axis=1)).sum(axis=1) > 0).all()
+
+
+def test_triangulate_polygon():
+    angles = np.linspace(0, 2 * np.pi, 100, endpoint=False)
+    radii = 1 + 0.5 * np.sin(5 * angles)
+    star = np.stack([radii * np.cos(angles), radii * np.sin(angles)], axis=1)
+    triangles = star[radiant.triangulate_polygon(star)]
+    a, b = triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]
+    areas = (a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]) / 2
+    assert len(areas) == 98 and (areas > 0).all()
+    # together they cover the polygon exactly once
+    shoelace = (star[:, 0] * np.roll(star[:, 1], -1) - np.roll(star[:, 0], -1) * star[:, 1]).sum() / 2
+    npt.assert_allclose(areas.sum(), shoelace)
+
+
+def test_geometry_pool():
+    pool = radiant.GeometryPool()
+    sphere = pool.get(radiant.SphereGeometry, 1, width_segments=8)
+    assert pool.get(radiant.SphereGeometry, radius=1.0, width_segments=8, height_segments=16) is sphere
+    assert pool.get(radiant.SphereGeometry, 2, width_segments=8) is not sphere
+    extrusion = pool.get(radiant.ExtrusionGeometry, [[0, 0], [1, 0], [0, 1]])
+    assert pool.get(radiant.ExtrusionGeometry, np.array([[0, 0], [1, 0], [0, 1]])) is extrusion
+    assert pool.stats == {'hits': 2, 'misses': 3}
+
+    # held weakly
+    del sphere, extrusion
+    gc.collect()
+    assert len(pool) == 0
+
+    assert radiant.BoxGeometry.shared(2) is radiant.BoxGeometry.shared(width=2)
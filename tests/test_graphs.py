@@ -0,0 +1,123 @@
+import numpy as np
+import numpy.testing as npt
+import pyrr
+import pytest
+
+import radiant
+
+
+def random_tree(n, seed=0):
+    rng = np.random.RandomState(seed)
+    nodes = [radiant.Scene()]
+    for i in range(1, n):
+        node = radiant.Object3D(
+            position=rng.uniform(-1, 1, 3),
+            scale=rng.uniform(0.5, 2, 3),
+            rotation=rng.uniform(-np.pi, np.pi, 3),
+        )
+        nodes[rng.randint(i)].append_child(node)
+        nodes.append(node)
+    return nodes
+
+
+def test_compose():
+    rng = np.random.RandomState(1)
+    positions = rng.uniform(-5, 5, (10, 3)).astype('f4')
+    scales = rng.uniform(0.1, 3, (10, 3)).astype('f4')
+    rotations = np.array([pyrr.Quaternion.from_eulers(e) for e in rng.uniform(-3, 3, (10, 3))], dtype='f4')
+
+    result = radiant.maths.compose(positions, rotations, scales)
+    for position, rotation, scale, model in zip(positions, rotations, scales, result):
+        expected = pyrr.Matrix44.from_translation(position) * pyrr.Matrix44.from_quaternion(rotation) * pyrr.Matrix44.from_scale(scale)
+        npt.assert_allclose(model, np.asarray(expected), atol=1e-5)
+
+
+def test_world_matrices():
+    nodes = random_tree(50)
+    for node in nodes:
+        node.update()
+    expected = [np.asarray(node.model).copy() for node in nodes]
+
+    graph = radiant.TransformGraph(nodes[0])
+    assert len(graph) == 50
+    # parents precede their children
+    assert (graph.parent[1:] < np.arange(1, 50)).all()
+    assert all(node.dirty for node in nodes)
+    nodes[7].update()
+    assert not any(node.dirty for node in nodes)
+    for node, model in zip(nodes, expected):
+        npt.assert_allclose(np.asarray(node.model), model, atol=1e-4)
+        assert node.model is not None and not node.model.flags.writeable
+
+
+def test_views():
+    nodes = random_tree(10)
+    graph = radiant.TransformGraph(nodes[0])
+    graph.update()
+
+    node = nodes[4]
+    node.position = [1, 2, 3]
+    assert node.dirty
+    npt.assert_array_equal(graph.position[graph.nodes.index(node)], [1, 2, 3])
+    with pytest.raises(ValueError):
+        node.position[0] = 5
+
+    # writing the arrays directly shows up on the nodes
+    graph.scale[:] = 2
+    graph.mark_dirty()
+    npt.assert_array_equal(np.asarray(node.scale), [2, 2, 2])
+    node.update()
+    assert not node.dirty
+
+
+def test_structure_changes():
+    nodes = random_tree(10)
+    graph = radiant.TransformGraph(nodes[0])
+    graph.update()
+
+    child = radiant.Object3D(position=[0, 1, 0])
+    nodes[3].append_child(child)
+    child.update()
+    assert len(graph) == 11
+    assert child.dirty is False
+    expected = nodes[3].model * pyrr.Matrix44.from_translation([0, 1, 0], dtype='f4')
+    npt.assert_allclose(np.asarray(child.model), np.asarray(expected), atol=1e-5)
+
+    nodes[3].remove_child(child)
+    graph.update()
+    assert len(graph) == 10
+    child.position = [0, 2, 0]
+    child.update()
+    npt.assert_allclose(np.asarray(child.model)[3, :3], [0, 2, 0])
+
+
+def test_camera_in_graph():
+    scene = radiant.Scene()
+    camera = radiant.PerspectiveCamera(position=[0, 0, 5])
+    scene.append_child(camera)
+    radiant.TransformGraph(scene)
+    camera.update()
+    assert camera.view is not None
+    assert camera.projection is not None
+
+
+def test_dirty_subtrees():
+    nodes = random_tree(30)
+    graph = radiant.TransformGraph(nodes[0])
+    assert graph.update() == 30
+    assert graph.update() == 0
+
+    node = nodes[5]
+    subtree = [node]
+    for n in subtree:
+        subtree.extend(n.children)
+    node.position = [3, 2, 1]
+    assert all(n.dirty for n in subtree)
+    assert not nodes[0].dirty
+    assert graph.update() == len(subtree)
+
+    # the partial update matches a full one
+    expected = graph.world.copy()
+    graph.mark_dirty()
+    graph.update()
+    npt.assert_allclose(graph.world, expected, atol=1e-5)
@@ -1,3 +1,9 @@
+import io
+import os
+
+import numpy as np
+import numpy.testing as npt
+
 import radiant
 
 
@@ -31,3 +37,94 @@ def test_dragon_obj():
     assert geometry.attributes['normal'].dtype.kind == 'f'
     assert geometry.attributes['normal'].dtype.itemsize == 4
     assert geometry.index is None
+
+
+def test_dragon_obj_indexed():
+    with open("examples/resources/dragon.obj", mode="r") as fh:
+        expected = radiant.load_obj(fh)
+    # gathered on first use
+    assert set(expected.attributes.computed()) == {'pos'}
+    geometry = radiant.load_obj_indexed("examples/resources/dragon.obj", chunk_size=4096)
+
+    assert geometry.index.shape == (15294, 3)
+    assert geometry.index.dtype == np.dtype('i4')
+    assert geometry.attributes['pos'].shape[0] < 45882
+    # tangents are generated per vertex, so only equal where vertices are not shared
+    for key in ('pos', 'uv', 'normal'):
+        value = expected.attributes[key]
+        assert geometry.attributes[key].dtype == value.dtype
+        npt.assert_array_equal(geometry.attributes[key][geometry.index.ravel()], value)
+
+
+def test_obj_indexed_polygons():
+    source = io.StringIO(
+        "v 0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\n"
+        "vn 0 0 1\n"
+        "f 1//1 2//1 3//1 4//1\r\n"
+        "f -4//-1 -2//-1 -1//-1"
+    )
+    geometry = radiant.load_obj_indexed(source)
+
+    assert set(geometry.attributes) == {'pos', 'normal'}
+    assert geometry.attributes['pos'].shape == (4, 3)
+    npt.assert_array_equal(geometry.index, [[0, 1, 2], [0, 2, 3], [0, 2, 3]])
+
+
+def test_geometry_container(tmpdir):
+    expected = radiant.PlaneGeometry(width_segments=3, height_segments=2)
+    expected.winding_order = radiant.WindingOrders.CW
+    filename = str(tmpdir.join("plane.geom"))
+    radiant.save_geometry(expected, filename)
+
+    for mmap in (True, False):
+        geometry = radiant.load_geometry(filename, mmap=mmap)
+        assert geometry.primitive is expected.primitive
+        assert geometry.winding_order is expected.winding_order
+        npt.assert_array_equal(geometry.index, expected.index)
+        assert geometry.index.dtype == expected.index.dtype
+        assert set(geometry.attributes) == set(expected.attributes)
+        for key, value in expected.attributes.items():
+            npt.assert_array_equal(geometry.attributes[key], value)
+            assert geometry.attributes[key].dtype == value.dtype
+
+
+def test_obj_cache(tmpdir):
+    cache = str(tmpdir.join("cache"))
+    with open("examples/resources/suzanne.obj", mode="r") as fh:
+        cold = radiant.load_obj(fh, cache=cache)
+    assert len(os.listdir(cache)) == 1
+    with open("examples/resources/suzanne.obj", mode="r") as fh:
+        warm = radiant.load_obj(fh, cache=cache)
+    assert isinstance(warm.attributes['pos'], np.memmap)
+    for key, value in cold.attributes.items():
+        npt.assert_array_equal(warm.attributes[key], value)
+
+    # the indexed loader gets its own entry
+    radiant.load_obj_indexed("examples/resources/suzanne.obj", cache=cache)
+    warm = radiant.load_obj_indexed("examples/resources/suzanne.obj", cache=cache)
+    assert len(os.listdir(cache)) == 2
+    assert warm.index.shape == (3936, 3)
+    # keyed as before optimize existed, unless it is set
+    direct = radiant.load_cached("examples/resources/suzanne.obj", cache, radiant.load_obj_indexed, chunk_size=radiant.loaders.CHUNK_SIZE)
+    assert isinstance(direct.index, np.memmap) and len(os.listdir(cache)) == 2
+    radiant.load_obj_indexed("examples/resources/suzanne.obj", cache=cache, optimize=True)
+    assert len(os.listdir(cache)) == 3
+
+
+def test_shared_scene(tmpdir):
+    scene = radiant.Scene()
+    geometry = radiant.PlaneGeometry()
+    scene.append_child(radiant.Mesh(geometry, radiant.MeshPhongMaterial()))
+    scene.append_child(radiant.Mesh(geometry, radiant.MeshBasicMaterial(), position=[0, 0, -1]))
+    light = radiant.PointLight(position=[0, 2, 4])
+    scene.append_child(light)
+    radiant.save_scene({'scene': scene, 'light': light}, str(tmpdir))
+    assert len(tmpdir.listdir()) == 2
+    loaded = radiant.load_scene(str(tmpdir))
+
+    meshes = loaded['scene'].children[:2]
+    assert meshes[0].geometry is meshes[1].geometry
+    assert isinstance(meshes[0].geometry.attributes['pos'], np.memmap)
+    npt.assert_array_equal(meshes[0].geometry.index, scene.children[0].geometry.index)
+    npt.assert_array_equal(np.asarray(meshes[1].position), [0, 0, -1])
+    assert loaded['light'] is loaded['scene'].children[2]
@@ -33,3 +33,82 @@ def test_decompose():
     assert rotation.dtype == expected_rotation.dtype
     npt.assert_almost_equal(translation, expected_translation)
     assert translation.dtype == expected_translation.dtype
+
+
+def test_frustum_culling():
+    view = pyrr.Matrix44.look_at([0, 0, 10], [0, 0, 0], [0, 1, 0], dtype='f4')
+    projection = pyrr.Matrix44.perspective_projection(45.0, 1.0, 0.1, 100.0, dtype='f4')
+    planes = maths.frustum_planes(projection * view)
+
+    centers = np.array([
+        [0, 0, 0],  # in front of the camera
+        [0, 0, 20],  # behind the camera
+        [100, 0, 0],  # far to the right
+        [5, 0, 0],  # just outside, but the sphere pokes in
+        [0, 0, -200],  # beyond the far plane
+    ], dtype='f4')
+    radii = np.array([1, 1, 1, 1.5, 1], dtype='f4')
+    npt.assert_array_equal(maths.spheres_in_frustum(centers, radii, planes), [True, False, False, True, False])
+
+    # translate and scale the spheres
+    matrices = np.tile(np.identity(4, dtype='f4'), (2, 1, 1))
+    matrices[1, :3, :3] *= 3
+    matrices[1, 3, :3] = [1, 2, 3]
+    centers, radii = maths.transform_spheres(np.ones((2, 3), dtype='f4'), np.ones(2, dtype='f4'), matrices)
+    npt.assert_allclose(centers, [[1, 1, 1], [4, 5, 6]])
+    npt.assert_allclose(radii, [1, 3])
+
+
+def test_quaternion_slerp():
+    rng = np.random.RandomState(2)
+    start = np.array([pyrr.Quaternion.from_eulers(e) for e in rng.uniform(-3, 3, (20, 3))])
+    end = np.array([pyrr.Quaternion.from_eulers(e) for e in rng.uniform(-3, 3, (20, 3))])
+    t = rng.uniform(0, 1, 20)
+    result = maths.quaternion_slerp(start, end, t)
+    for q0, q1, factor, q in zip(start, end, t, result):
+        npt.assert_allclose(q, pyrr.quaternion.slerp(q0, q1, factor), atol=1e-6)
+
+    # ends, the shortest path, and nearly parallel quaternions
+    npt.assert_allclose(maths.quaternion_slerp(start, end, 0), start, atol=1e-6)
+    npt.assert_allclose(maths.quaternion_slerp(start, -end, t), result, atol=1e-6)
+    npt.assert_allclose(maths.quaternion_slerp(start, start, 0.5), start, atol=1e-6)
+
+
+def test_batched_transforms():
+    rng = np.random.RandomState(4)
+    rotations = np.array([pyrr.Quaternion.from_eulers(e) for e in rng.uniform(-3, 3, (20, 3))])
+    positions = rng.uniform(-5, 5, (20, 3))
+    scales = rng.uniform(0.5, 2, (20, 3))
+    scales[::2, 0] *= -1
+    models = maths.compose(positions, rotations, scales)
+
+    scale, rotation, position = maths.decompose(models)
+    npt.assert_allclose(maths.compose(position, rotation, scale), models, atol=1e-12)
+    npt.assert_allclose(np.abs(scale), np.abs(scales))
+    out = np.empty((20, 3)), np.empty((20, 4)), np.empty((20, 3))
+    assert maths.decompose(models, out=out)[1] is out[1]
+
+    # quaternions, against pyrr
+    products, matrices = maths.quaternion_multiply(rotations, rotations[::-1]), maths.quaternion_to_matrix(rotations)
+    for q0, q1, product, matrix in zip(rotations, rotations[::-1], products, matrices):
+        npt.assert_allclose(product, pyrr.quaternion.cross(q0, q1), atol=1e-12)
+        q = pyrr.quaternion.create_from_matrix(matrix)
+        npt.assert_allclose(np.abs(maths.quaternion_from_matrix(matrix) @ q), 1, atol=1e-12)
+
+    # affine inverses
+    inverses = np.linalg.inv(models)
+    npt.assert_allclose(maths.affine_inverse(models), inverses, atol=1e-10)
+    npt.assert_allclose(maths.normal_matrix(models), inverses.transpose((0, 2, 1)), atol=1e-10)
+    single = models[0].astype('f4')
+    assert maths.normal_matrix(single).dtype == single.dtype
+    npt.assert_allclose(maths.affine_inverse(single), np.linalg.inv(single), atol=1e-5)
+
+    # cameras
+    eyes, targets = rng.uniform(-5, 5, (20, 3)), rng.uniform(-5, 5, (20, 3))
+    views = maths.look_at(eyes, targets, [0, 1, 0])
+    for eye, target, view in zip(eyes, targets, views):
+        npt.assert_allclose(view, pyrr.matrix44.create_look_at(eye, target, [0, 1, 0]), atol=1e-12)
+    projections = maths.perspective([30.0, 45.0], 4 / 3, 0.1, [10.0, 1000.0])
+    npt.assert_allclose(projections[1], pyrr.matrix44.create_perspective_projection(45.0, 4 / 3, 0.1, 1000.0), atol=1e-12)
+    out = np.empty((2, 4, 4), dtype='f4')
+    assert maths.perspective([30.0, 45.0], 4 / 3, 0.1, [10.0, 1000.0], out=out) is out
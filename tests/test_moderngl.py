@@ -1,17 +1,20 @@
 import os
 
-import ModernGL
+import numpy as np
+import numpy.testing as npt
 from PIL import Image
 import pytest
 
 import radiant
-from radiant.renderers.moderngl import ModernGLRenderer
+from radiant.renderers.moderngl import create_standalone_context, ModernGLRenderer
+from radiant.renderers.profiling import Profiler, RingBuffer
+from radiant.renderers.software import SoftwareRenderer
 
 
 @pytest.mark.skipif(os.environ.get('TRAVIS') == 'true', reason="travis does not support opengl 3.3")
 def test_basic_material():
     # create context
-    ctx = ModernGL.create_standalone_context()
+    ctx = create_standalone_context()
 
     # create renderer
     renderer = ModernGLRenderer(ctx)
@@ -47,7 +50,7 @@ def test_basic_material():
 @pytest.mark.skipif(os.environ.get('TRAVIS') == 'true', reason="travis does not support opengl 3.3")
 def test_phong():
     # create context
-    ctx = ModernGL.create_standalone_context()
+    ctx = create_standalone_context()
 
     # create renderer
     renderer = ModernGLRenderer(ctx)
@@ -82,3 +85,245 @@ def test_phong():
 
     # complete the test
     assert os.path.exists(filename)
+
+
+def test_matrix_cache():
+    renderer = ModernGLRenderer(None)
+    scene = radiant.Scene()
+    meshes = [radiant.Mesh(radiant.PlaneGeometry(), radiant.MeshBasicMaterial(), position=[i, 0, 0]) for i in range(5)]
+    for mesh in meshes:
+        scene.append_child(mesh)
+    camera = radiant.PerspectiveCamera(position=[10, 10, 10])
+    scene.append_child(camera)
+    scene.update_subtree()
+
+    assert renderer.update_matrices(meshes, camera) == 5
+    assert renderer.update_matrices(meshes, camera) == 0
+
+    # only the moved node is recomputed
+    meshes[2].position = [0, 3, 0]
+    scene.update_subtree()
+    assert renderer.update_matrices(meshes, camera) == 1
+    _, _, model_view, normal = renderer._matrices[meshes[2]]
+    expected = camera.view * meshes[2].model
+    npt.assert_allclose(model_view, np.asarray(expected), atol=1e-5)
+    npt.assert_allclose(normal, np.asarray(expected.inverse.T), atol=1e-5)
+
+    # moving the camera invalidates everything
+    camera.position = [5, 5, 5]
+    camera.update()
+    assert renderer.update_matrices(meshes, camera) == 5
+
+
+def render_grid(renderer, material, geometry=None, lights=None):
+    scene = radiant.Scene()
+    geometry = geometry or radiant.PlaneGeometry(width=0.8, height=0.8)
+    for x in range(-2, 3):
+        for y in range(-2, 3):
+            scene.append_child(radiant.Mesh(geometry, material, position=[x, y, 0], rotation=[0, 0, 0.2 * x]))
+    light = radiant.PointLight(position=[0, 0, 4])
+    scene.append_child(light)
+    camera = radiant.PerspectiveCamera(position=[0, 0, 10], target=[0, 0, 0], up=[0, 1, 0])
+    scene.append_child(camera)
+
+    fbo = renderer.ctx.framebuffer(renderer.ctx.renderbuffer((128, 128)))
+    fbo.use()
+    renderer.render(scene, camera, light=light, lights=lights)
+    return np.frombuffer(fbo.read(components=3, alignment=1), dtype='u1')
+
+
+@pytest.mark.skipif(os.environ.get('TRAVIS') == 'true', reason="travis does not support opengl 3.3")
+def test_instancing():
+    ctx = create_standalone_context()
+    for material in (radiant.MeshBasicMaterial(), radiant.MeshPhongMaterial()):
+        instanced = ModernGLRenderer(ctx)
+        expected = render_grid(ModernGLRenderer(ctx, instancing_threshold=float('inf')), material)
+        npt.assert_array_equal(render_grid(instanced, material), expected)
+        assert instanced.stats['draw_calls'] == 1
+        assert len(np.unique(expected)) > 1
+
+
+@pytest.mark.skipif(os.environ.get('TRAVIS') == 'true', reason="travis does not support opengl 3.3")
+def test_packed_geometry():
+    ctx = create_standalone_context()
+    # half floats represent the vertices exactly
+    geometry = radiant.PlaneGeometry(width=0.75, height=0.75, width_segments=4, height_segments=4)
+    # every encoding of every attribute, drawn with a uint16 index
+    for encodings in ({}, {'position': 'f2', 'normal': 'i1', 'uv': 'f2'}, {'position': 'f4', 'normal': 'f2', 'uv': 'f4'}):
+        packed = radiant.pack_geometry(geometry, **encodings)
+        assert packed.index.dtype == np.uint16
+        for material in (radiant.MeshBasicMaterial(), radiant.MeshPhongMaterial()):
+            for threshold in (2, float('inf')):
+                expected = render_grid(ModernGLRenderer(ctx, instancing_threshold=threshold), material, geometry)
+                renderer = ModernGLRenderer(ctx, instancing_threshold=threshold)
+                image = render_grid(renderer, material, packed)
+                assert np.abs(image.astype('i4') - expected).max() <= 2
+                # a single interleaved buffer, and the narrowed index
+                assert renderer.resources.stats['bytes_uploaded'] <= packed.nbytes + 25 * 128
+                assert renderer.resources.vertex_array(material.shaders, packed).index_element_size == 2
+
+
+@pytest.mark.skipif(os.environ.get('TRAVIS') == 'true', reason="travis does not support opengl 3.3")
+def test_state_sorting():
+    ctx = create_standalone_context()
+    renderer = ModernGLRenderer(ctx, instancing_threshold=float('inf'))
+
+    scene = radiant.Scene()
+    materials = [radiant.MeshBasicMaterial(color=(0.0, 1.0, 0.0, 1.0)), radiant.MeshPhongMaterial()]
+    geometry = radiant.PlaneGeometry()
+    # alternate the materials in scene order
+    for i in range(10):
+        scene.append_child(radiant.Mesh(geometry, materials[i % 2], position=[i - 5, 0, -i]))
+    camera = radiant.PerspectiveCamera(position=[0, 0, 10], target=[0, 0, 0], up=[0, 1, 0])
+    light = radiant.PointLight(position=[0, 0, 4])
+
+    fbo = ctx.framebuffer(ctx.renderbuffer((64, 64)))
+    fbo.use()
+    renderer.render(scene, camera, light=light)
+    assert renderer.stats['draw_calls'] == 10
+    assert renderer.stats['program_binds'] == 2
+    assert renderer.stats['state_changes'] == 1
+    # uniform blocks only: the frame, the range of every object, and every material
+    assert renderer.stats['uniform_writes'] == 0
+    assert renderer.stats['uniform_block_binds'] == 1 + 10 + 2
+    assert renderer.resources.stats['material_uploads'] == 2
+
+    # materials are uploaded again only when their uniforms change
+    renderer.render(scene, camera, light=light)
+    assert renderer.resources.stats['material_uploads'] == 2
+    materials[1].uniforms['shininess'] = 8.0
+    renderer.render(scene, camera, light=light)
+    assert renderer.resources.stats['material_uploads'] == 3
+
+    # front to back within a program
+    items = renderer.render_list(scene.children, camera)
+    depths = [item.sort_key[-1] for item in items if item.material is materials[0]]
+    assert depths == sorted(depths)
+
+
+@pytest.mark.skipif(os.environ.get('TRAVIS') == 'true', reason="travis does not support opengl 3.3")
+def test_depth_sorting():
+    ctx = create_standalone_context()
+    renderer = ModernGLRenderer(ctx, instancing_threshold=float('inf'))
+    material = radiant.MeshPhongMaterial()
+    scene = radiant.Scene()
+    # a geometry of their own per mesh, so every draw call has a different vertex array
+    depths = [24.0, 1.5, 12.0, 3.0, 6.0]
+    meshes = [radiant.Mesh(radiant.PlaneGeometry(), material, position=[0, 0, 10 - depth]) for depth in depths]
+    for mesh in meshes:
+        scene.append_child(mesh)
+    camera = radiant.PerspectiveCamera(position=[0, 0, 10], target=[0, 0, 0], up=[0, 1, 0])
+
+    fbo = ctx.framebuffer(ctx.renderbuffer((64, 64)))
+    fbo.use()
+    renderer.render(scene, camera, light=radiant.PointLight(position=[0, 0, 4]))
+    assert renderer.stats['draw_calls'] == len(meshes)
+    items = renderer.render_list(scene.children, camera)
+    assert len({id(item.vao) for item in items}) == len(meshes)
+    assert [item.geometry for item in items] == [meshes[i].geometry for i in np.argsort(depths)]
+
+
+@pytest.mark.skipif(os.environ.get('TRAVIS') == 'true', reason="travis does not support opengl 3.3")
+def test_clustered_lights():
+    ctx = create_standalone_context()
+    rng = np.random.default_rng(5)
+    lights = [
+        radiant.PointLight(position=position, color=color, intensity=0.5, distance=1.5)
+        for position, color in zip(rng.uniform([-3, -3, 0.2], [3, 3, 1.5], (200, 3)), rng.uniform(0, 1, (200, 3)))
+    ]
+    material = radiant.MeshPhongMaterial(shininess=8.0)
+    # a single cluster shades every light everywhere
+    expected = render_grid(ModernGLRenderer(ctx, light_clusters=(1, 1, 1)), material, lights=lights)
+    assert len(np.unique(expected)) > 1
+    for threshold in (2, float('inf')):
+        renderer = ModernGLRenderer(ctx, instancing_threshold=threshold)
+        image = render_grid(renderer, material, lights=lights)
+        assert np.abs(image.astype('i4') - expected).max() <= 2
+        assert renderer.stats['lights'] == 200 and renderer.stats['max_cluster_lights'] < 200
+
+
+@pytest.mark.skipif(os.environ.get('TRAVIS') == 'true', reason="travis does not support opengl 3.3")
+def test_flat_shading():
+    ctx = create_standalone_context()
+    geometry = radiant.PlaneGeometry(width=0.8, height=0.8)
+    # the face normals of planes are their vertex normals
+    expected = render_grid(ModernGLRenderer(ctx), radiant.MeshPhongMaterial(), geometry)
+    for threshold in (2, float('inf')):
+        renderer = ModernGLRenderer(ctx, instancing_threshold=threshold)
+        image = render_grid(renderer, radiant.MeshPhongMaterial(flat_shading=True), geometry)
+        assert np.abs(image.astype('i4') - expected).max() <= 2
+        # the variant does not read the normals
+        assert 'normal' not in renderer.resources._geometries[id(geometry)].buffers
+
+
+def test_frustum_culling():
+    renderer = ModernGLRenderer(None)
+    geometry = radiant.PlaneGeometry()
+    material = radiant.MeshBasicMaterial()
+    visible = radiant.Mesh(geometry, material)
+    behind = radiant.Mesh(geometry, material, position=[0, 0, 20])
+    aside = radiant.Mesh(geometry, material, position=[50, 0, 0], scale=[10, 10, 10])
+    camera = radiant.PerspectiveCamera(position=[0, 0, 10], target=[0, 0, 0], up=[0, 1, 0])
+    for node in (visible, behind, aside, camera):
+        node.update()
+    assert renderer.cull([visible, behind, aside], camera) == [visible]
+
+    # large enough to reach into the frustum
+    aside.scale = [100, 100, 100]
+    aside.update()
+    assert renderer.cull([visible, behind, aside], camera) == [visible, aside]
+
+
+@pytest.mark.skipif(os.environ.get('TRAVIS') == 'true', reason="travis does not support opengl 3.3")
+def test_software_reference():
+    ctx = create_standalone_context()
+    for material in (radiant.MeshBasicMaterial(), radiant.MeshPhongMaterial(shininess=8.0)):
+        renderer = ModernGLRenderer(ctx)
+        expected = render_grid(renderer, material).reshape((128, 128, 3))[::-1]
+        software = SoftwareRenderer(size=(128, 128))
+        scene = radiant.Scene()
+        geometry = radiant.PlaneGeometry(width=0.8, height=0.8)
+        for x in range(-2, 3):
+            for y in range(-2, 3):
+                scene.append_child(radiant.Mesh(geometry, material, position=[x, y, 0], rotation=[0, 0, 0.2 * x]))
+        light = radiant.PointLight(position=[0, 0, 4])
+        camera = radiant.PerspectiveCamera(position=[0, 0, 10], target=[0, 0, 0], up=[0, 1, 0])
+        image = software.render(scene, camera, light=light)
+        assert np.abs(image.astype('i4') - expected).max() <= 1
+
+
+@pytest.mark.skipif(os.environ.get('TRAVIS') == 'true', reason="travis does not support opengl 3.3")
+def test_profiling():
+    ring = RingBuffer()
+    renderer = ModernGLRenderer(create_standalone_context(), profiler=Profiler(sinks=[ring]))
+    render_grid(renderer, radiant.MeshPhongMaterial())
+    render_grid(renderer, radiant.MeshPhongMaterial())
+
+    first, second = ring.records
+    assert set(first['phases']) == {'update', 'gather', 'cull', 'matrices', 'prepare', 'draw', 'finish'}
+    assert first['stats']['draw_calls'] == 1
+    assert first['resources']['buffers_created'] > 0 and first['resources']['bytes_uploaded'] > 0
+    assert first['resources']['program_misses'] == 1
+    # the second grid brings new geometry and materials, but the programs are cached
+    assert second['resources']['program_hits'] > 0 and 'program_misses' not in second['resources']
+    # the draw phase is timed on the GPU
+    assert isinstance(first['gpu_seconds'], float) and first['gpu_seconds'] > 0
+    assert isinstance(second['gpu_seconds'], float)
+
+
+def test_collect_lod():
+    renderer = ModernGLRenderer(None)
+    scene = radiant.Scene()
+    plane = radiant.Mesh(radiant.PlaneGeometry(), radiant.MeshBasicMaterial())
+    scene.append_child(plane)
+    chain = [radiant.PlaneGeometry(width_segments=4, height_segments=4), radiant.PlaneGeometry()]
+    lod = radiant.LOD.from_geometries(chain, radiant.MeshBasicMaterial(), position=[2, 0, 0])
+    scene.append_child(lod)
+    camera = radiant.PerspectiveCamera(position=[0, 0, 2], target=[0, 0, 0], up=[0, 1, 0])
+    scene.update_subtree()
+    camera.update()
+
+    assert renderer.collect(scene, camera) == [plane, lod.children[0]]
+    camera.position = [0, 0, 200]
+    camera.update()
+    assert renderer.collect(scene, camera) == [plane, lod.children[1]]
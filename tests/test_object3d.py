@@ -112,3 +112,40 @@ def test_model_setter():
     assert a.rotation.dtype == expected_rotation.dtype
     npt.assert_almost_equal(a.position, expected_translation)
     assert a.position.dtype == expected_translation.dtype
+
+
+def test_hierarchical_invalidation():
+    root = radiant.Object3D()
+    child = radiant.Object3D(position=[1, 0, 0])
+    grandchild = radiant.Object3D(position=[0, 1, 0])
+    root.append_child(child)
+    child.append_child(grandchild)
+    assert root.update_subtree() == 3
+    assert root.update_subtree() == 0
+    assert not grandchild.dirty
+
+    # moving the root invalidates the whole subtree
+    root.position = [0, 0, 5]
+    assert child.dirty and grandchild.dirty
+    grandchild.update()
+    npt.assert_almost_equal(np.asarray(grandchild.model)[3, :3], [1, 1, 5])
+
+
+def test_update_subtree_skips_clean_branches():
+    root = radiant.Object3D()
+    branches = [radiant.Object3D() for _ in range(3)]
+    for branch in branches:
+        root.append_child(branch)
+        for _ in range(10):
+            branch.append_child(radiant.Object3D())
+    assert root.update_subtree() == 34
+
+    leaf = branches[1].children[4]
+    leaf.position = [1, 2, 3]
+    assert root._subtree_dirty and branches[1]._subtree_dirty
+    assert not branches[0]._subtree_dirty
+    assert root.update_subtree() == 1
+    npt.assert_almost_equal(np.asarray(leaf.model)[3, :3], [1, 2, 3])
+
+    branches[2].scale = [2, 2, 2]
+    assert root.update_subtree() == 11
@@ -0,0 +1,51 @@
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+import radiant
+
+
+def triangle_set(geometry):
+    """Triangles as rows of corner positions, rotated to start at the smallest corner, sorted."""
+    pos = geometry.attributes['pos'][np.asarray(geometry.index).reshape((-1, 3))]
+    corners = [tuple(map(tuple, triangle)) for triangle in pos.tolist()]
+    rotated = [min(t[i:] + t[:i] for i in range(3)) for t in corners]
+    return sorted(rotated)
+
+
+def test_acmr():
+    assert radiant.acmr(np.array([0, 1, 2])) == 3.0
+    # a fan reuses all but one vertex
+    fan = np.array([[0, i, i + 1] for i in range(1, 9)])
+    assert radiant.acmr(fan) == 10 / 8
+    # vertices that fell out of the cache are transformed again
+    assert radiant.acmr(np.array([0, 1, 2, 3, 4, 5, 0, 1, 2]), cache_size=3) == 3.0
+
+
+@pytest.mark.parametrize('overdraw', [False, True])
+def test_optimize_vertex_cache(overdraw):
+    geometry = radiant.PlaneGeometry(width_segments=64, height_segments=64)
+    optimized, (before, after) = radiant.optimize_vertex_cache(geometry, overdraw=overdraw, cluster_size=64, return_acmr=True)
+    assert before == pytest.approx(radiant.acmr(geometry)) and after == pytest.approx(radiant.acmr(optimized))
+    assert after < 0.7 < before
+    # the same triangles, with the same winding, and vertices in order of first use
+    assert triangle_set(optimized) == triangle_set(geometry)
+    assert optimized.index.shape == geometry.index.shape and optimized.index.dtype == geometry.index.dtype
+    first_use = np.unique(optimized.index.ravel(), return_index=True)[1]
+    assert (np.diff(first_use) > 0).all()
+    npt.assert_array_equal(np.sort(optimized.attributes['uv'], axis=0), np.sort(geometry.attributes['uv'], axis=0))
+
+
+def test_optimize_load():
+    geometry = radiant.load_obj_indexed("examples/resources/dragon.obj")
+    optimized = radiant.load_obj_indexed("examples/resources/dragon.obj", optimize=True)
+    assert radiant.acmr(optimized) < radiant.acmr(geometry) / 2
+    assert triangle_set(optimized) == triangle_set(geometry)
+
+    # outward facing clusters first
+    reordered = radiant.optimize_vertex_cache(geometry, overdraw=True)
+    assert triangle_set(reordered) == triangle_set(geometry)
+    assert radiant.acmr(reordered) < radiant.acmr(geometry) / 2
+
+    with pytest.raises(ValueError):
+        radiant.optimize_vertex_cache(radiant.Geometry(geometry.attributes))
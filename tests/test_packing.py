@@ -0,0 +1,71 @@
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+import radiant
+from radiant.renderers.software import SoftwareRenderer
+
+
+def test_octahedral():
+    rng = np.random.default_rng(3)
+    normals = rng.normal(size=(1000, 3))
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.concatenate([normals, np.eye(3), -np.eye(3)])
+    encoded = radiant.encode_octahedral(normals)
+    assert np.abs(encoded).max() <= 1
+    npt.assert_allclose(radiant.decode_octahedral(encoded), normals, atol=1e-12)
+    # at int16 precision
+    quantized = np.round(encoded * 32767) / 32767
+    npt.assert_allclose(radiant.decode_octahedral(quantized), normals, atol=1e-4)
+
+
+def test_pack_geometry():
+    geometry = radiant.load_obj_indexed("examples/resources/dragon.obj")
+    packed = radiant.pack_geometry(geometry)
+    assert packed.vertices.dtype.itemsize == 16
+    assert packed.index.dtype == np.dtype('u2')
+    assert packed.nbytes < geometry.attributes['pos'].nbytes * 2 + geometry.index.nbytes
+    assert packed.source_nbytes == sum(values.nbytes for values in geometry.attributes.computed().values()) + geometry.index.nbytes
+    npt.assert_array_equal(packed.index, geometry.index)
+
+    extent = geometry.bounding_box[1] - geometry.bounding_box[0]
+    npt.assert_allclose(packed.attributes['pos'], geometry.attributes['pos'], atol=extent.max() / 65534 + 1e-6)
+    npt.assert_allclose(packed.attributes['normal'], geometry.attributes['normal'], atol=1e-4)
+    npt.assert_allclose(packed.bounding_box, geometry.bounding_box, atol=1e-4)
+
+    fmt, names = packed.format_for(['pos', 'normal_packed'])
+    assert fmt == "3i2 2x 4x 2i2" and names == ['pos', 'normal_packed']
+    # the shader reads the packed field, decoded under the original name
+    source = packed.patch_shaders(radiant.MeshPhongMaterial().shaders)['vert']
+    assert "in vec2 normal_packed;" in source and "in vec3 normal;" not in source
+
+    floats = radiant.pack_geometry(geometry, position='f4', normal='f4', uv='f4', narrow_index=False)
+    assert floats.decode_matrix is None and floats.index.dtype == geometry.index.dtype
+    npt.assert_array_equal(floats.attributes['pos'], geometry.attributes['pos'])
+    assert floats.patch_shaders(radiant.MeshPhongMaterial().shaders) == radiant.MeshPhongMaterial().shaders
+
+    with pytest.raises(ValueError):
+        radiant.pack_geometry(geometry, normal='u2')
+
+
+def test_pack_scene():
+    scene = radiant.Scene()
+    geometry = radiant.PlaneGeometry(width=0.8, height=0.8, width_segments=4, height_segments=4)
+    material = radiant.MeshPhongMaterial()
+    for x in range(-2, 3):
+        scene.append_child(radiant.Mesh(geometry, material, position=[x, 0, 0], rotation=[0.3 * x, 0, 0.2 * x]))
+    light = radiant.PointLight(position=[0, 0, 4])
+    camera = radiant.PerspectiveCamera(position=[0, 0, 10], target=[0, 0, 0], up=[0, 1, 0])
+    renderer = SoftwareRenderer(size=(128, 128))
+    expected = renderer.render(scene, camera, light=light)
+
+    report = radiant.pack_scene(scene)
+    assert [row.mesh for row in report] == list(scene.children)
+    # shared geometries stay shared
+    assert len({id(node.geometry) for node in scene.children}) == 1
+    assert all(row.nbytes <= row.source_nbytes / 2 for row in report)
+    lines = radiant.format_packing_report(report).splitlines()
+    assert len(lines) == len(report) + 2 and lines[-1].split()[0] == 'total'
+
+    image = renderer.render(scene, camera, light=light)
+    assert np.abs(image.astype('i4') - expected).max() <= 2
@@ -0,0 +1,73 @@
+import io
+import json
+
+import pytest
+
+from radiant.renderers.profiling import JSONLines, Profiler, RingBuffer
+
+
+class FakeQuery:
+    elapsed = 2500000
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class FakeContext:
+    def query(self, time=False):
+        assert time
+        return FakeQuery()
+
+
+def test_profiler():
+    ring = RingBuffer(capacity=2)
+    lines = io.StringIO()
+    called = []
+    profiler = Profiler(sinks=[ring, JSONLines(lines), called.append])
+
+    for frame in range(3):
+        profiler.begin_frame()
+        with profiler.phase('update'):
+            pass
+        with profiler.phase('draw'), profiler.gpu_timer(FakeContext()):
+            pass
+        with profiler.phase('update'):
+            pass
+        if frame != 1:
+            profiler.read_gpu()
+        record = profiler.end_frame(stats={'draw_calls': frame})
+
+    assert record['frame'] == 2 and record['stats'] == {'draw_calls': 2}
+    assert set(record['phases']) == {'update', 'draw'}
+    assert record['seconds'] >= sum(record['phases'].values())
+    assert record['gpu_seconds'] == pytest.approx(0.0025)
+
+    assert [r['frame'] for r in ring] == [1, 2]
+    assert ring.records[0]['gpu_seconds'] is None
+    assert len(called) == 3
+    assert [json.loads(line)['frame'] for line in lines.getvalue().splitlines()] == [0, 1, 2]
+
+
+def test_gpu_unsupported():
+    profiler = Profiler()
+    profiler.begin_frame()
+    # contexts without timer queries are skipped
+    with profiler.gpu_timer(object()):
+        pass
+    profiler.read_gpu()
+    assert profiler.end_frame()['gpu_seconds'] is None
+
+
+def test_json_lines_file(tmpdir):
+    filename = str(tmpdir.join("frames.jsonl"))
+    sink = JSONLines(filename)
+    profiler = Profiler(sinks=[sink])
+    for _ in range(2):
+        profiler.begin_frame()
+        profiler.end_frame()
+    sink.close()
+    with open(filename) as fh:
+        assert len(fh.readlines()) == 2
@@ -0,0 +1,220 @@
+import gc
+import re
+
+import moderngl
+import numpy as np
+import pytest
+
+import radiant
+from radiant.renderers.programs import ProgramCache
+from radiant.renderers.resources import ResourceManager
+from radiant.renderers.uniforms import BLOCK_BINDINGS, FRAME_BLOCK, pack_std140
+
+
+class FakeObject:
+    def __init__(self, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        self.released = False
+
+    def release(self):
+        self.released = True
+
+    def write(self, data):
+        self.data = data
+
+
+class FakeAttribute(moderngl.Attribute):
+    pass
+
+
+class FakeUniformBlock(moderngl.UniformBlock):
+    binding = None
+
+
+class FakeProgram(FakeObject):
+    """Exposes the vertex shader inputs and uniform blocks of its sources, like a moderngl program."""
+
+    def __init__(self, **shaders):
+        super().__init__(**shaders)
+        self.members = {}
+        for name in re.findall(r"^in \w+ (\w+);", shaders['vertex_shader'], re.M):
+            self.members[name] = FakeAttribute.__new__(FakeAttribute)
+        for name in sorted({name for source in shaders.values() for name in re.findall(r"uniform (\w+) \{", source)}):
+            self.members[name] = FakeUniformBlock.__new__(FakeUniformBlock)
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def __getitem__(self, name):
+        return self.members[name]
+
+
+class FakeContext:
+    """Records the objects a ResourceManager creates."""
+
+    def __init__(self):
+        self.created = []
+
+    def _create(self, *args, **kwargs):
+        obj = FakeObject(*args, **kwargs)
+        self.created.append(obj)
+        return obj
+
+    def program(self, **shaders):
+        obj = FakeProgram(**shaders)
+        self.created.append(obj)
+        return obj
+
+    buffer = vertex_array = _create
+
+
+def test_sharing():
+    ctx = FakeContext()
+    resources = ResourceManager(ctx)
+    geometry = radiant.PlaneGeometry()
+    shaders = radiant.MeshPhongMaterial().shaders
+
+    vao = resources.vertex_array(shaders, geometry)
+    assert resources.vertex_array(dict(shaders), geometry) is vao
+    assert resources.stats['program_misses'] == 1
+    assert resources.stats['program_hits'] == 1
+    assert resources.stats['vertex_array_hits'] == 1
+    # pos, uv, normal and index; the tangents the program does not read are never generated
+    assert resources.stats['buffers_created'] == 4
+    assert not geometry.attributes.is_computed('tangent')
+    assert resources.nbytes == sum(geometry.attributes[name].nbytes for name in ('pos', 'uv', 'normal')) + geometry.index.nbytes
+
+    # a second geometry gets its own buffers and vertex array, but shares the program
+    other = resources.vertex_array(shaders, radiant.PlaneGeometry())
+    assert other is not vao
+    assert resources.stats['program_misses'] == 1
+    assert resources.stats['buffers_created'] == 8
+
+
+def test_idle_release():
+    ctx = FakeContext()
+    resources = ResourceManager(ctx, max_idle_frames=1)
+    shaders = radiant.MeshBasicMaterial().shaders
+    kept, dropped = radiant.PlaneGeometry(), radiant.PlaneGeometry()
+    resources.vertex_array(shaders, kept)
+    vao = resources.vertex_array(shaders, dropped)
+    resources.end_frame()
+
+    for _ in range(2):
+        resources.vertex_array(shaders, kept)
+        resources.end_frame()
+    assert vao.released
+    assert resources.stats['evictions'] == 1
+    assert resources.nbytes == kept.attributes['pos'].nbytes + kept.index.nbytes
+
+
+def test_budget_and_collection():
+    ctx = FakeContext()
+    geometries = [radiant.PlaneGeometry() for _ in range(4)]
+    size = geometries[0].attributes['pos'].nbytes + geometries[0].index.nbytes
+    resources = ResourceManager(ctx, budget=2 * size)
+    shaders = radiant.MeshBasicMaterial().shaders
+    for geometry in geometries:
+        resources.vertex_array(shaders, geometry)
+        resources.end_frame()
+    assert resources.nbytes == 2 * size
+    assert resources.stats['evictions'] == 2
+
+    # garbage collected geometries are released too
+    del geometries[-1], geometry
+    gc.collect()
+    resources.end_frame()
+    assert resources.nbytes == size
+    assert resources.stats['bytes_released'] == 3 * size
+
+    resources.release()
+    assert resources.nbytes == 0
+    assert all(obj.released for obj in ctx.created)
+
+
+def test_instances():
+    ctx = FakeContext()
+    resources = ResourceManager(ctx)
+    geometry = radiant.PlaneGeometry()
+    shaders = radiant.MeshBasicMaterial().instanced_shaders
+    attributes = [('16f', 'model_view_matrix'), ('16f', 'normal_matrix')]
+
+    vao = resources.instanced_vertex_array(shaders, geometry, 'group', np.zeros((3, 32), dtype='f4'), attributes)
+    # the basic material does not use the normal matrix
+    instance_buffer, fmt, *names = vao.args[1][-1]
+    assert fmt == "16f 64x/i"
+    assert names == ['model_view_matrix']
+    assert instance_buffer.kwargs['reserve'] == 512
+
+    # fits in the buffer
+    assert resources.instanced_vertex_array(shaders, geometry, 'group', np.zeros((4, 32), dtype='f4'), attributes) is vao
+    # grows the buffer
+    grown = resources.instanced_vertex_array(shaders, geometry, 'group', np.zeros((5, 32), dtype='f4'), attributes)
+    assert grown is not vao and vao.released and instance_buffer.released
+    assert grown.args[1][-1][0].kwargs['reserve'] == 1024
+
+
+def test_uniform_buffers():
+    # std140: vec3 and ivec3 take 16 bytes, the block is padded to 16
+    frame = pack_std140(default for _, default in FRAME_BLOCK)
+    assert len(frame) == 176
+    assert np.frombuffer(frame, dtype='i4', count=3, offset=144).tolist() == [1, 1, 1]
+    assert len(pack_std140([(1.0, 0.0, 0.0, 1.0), 4.0])) == 32
+    with pytest.raises(ValueError):
+        pack_std140([np.eye(3)])
+
+    ctx = FakeContext()
+    resources = ResourceManager(ctx)
+    material = radiant.MeshPhongMaterial()
+    _, program = resources.program(material.shaders)
+    blocks, uniforms = resources.interface(program)
+    assert blocks == {'Frame', 'Object', 'Material'} and not uniforms
+    assert program['Material'].binding == BLOCK_BINDINGS['Material']
+
+    buffer = resources.material_buffer(material)
+    assert buffer.args[0] == pack_std140([(1.0, 0.0, 0.0, 1.0), 4.0])
+    assert resources.material_buffer(material) is buffer
+    material.uniforms['shininess'] = 16.0
+    assert resources.material_buffer(material) is buffer
+    assert buffer.data == pack_std140([(1.0, 0.0, 0.0, 1.0), 16.0])
+    assert resources.stats['material_uploads'] == 2
+    # packed by name, whatever the order of the uniforms; missing members take their defaults
+    material.uniforms = {'shininess': 8.0, 'color': (0.0, 1.0, 0.0, 1.0)}
+    assert resources.material_buffer(material).data == pack_std140([(0.0, 1.0, 0.0, 1.0), 8.0])
+    del material.uniforms['shininess']
+    assert resources.material_buffer(material).data == pack_std140([(0.0, 1.0, 0.0, 1.0), 4.0])
+    with pytest.raises(ValueError):
+        resources.material_buffer(radiant.Material(material.shaders, {'color': (1.0, 1.0, 1.0, 1.0)}))
+
+    del material, buffer
+    gc.collect()
+    resources.end_frame()
+    assert resources.stats['buffers_released'] == 1 and resources.nbytes == 0
+
+
+def test_program_cache(tmp_path):
+    ctx = FakeContext()
+    resources = ResourceManager(ctx, program_cache=ProgramCache(str(tmp_path)))
+    phong = radiant.MeshPhongMaterial()
+    key, program = resources.program(phong.shaders)
+    # programs are identified by the digest of their sources
+    assert resources.program(dict(phong.shaders)) == (key, program)
+    resources.program(phong.instanced_shaders)
+    assert resources.stats['programs_compiled'] == 2 and 'compile_seconds' in resources.stats
+    # written to the cache at the end of the frame, not while compiling
+    assert ProgramCache(str(tmp_path)).manifest() == []
+    resources.end_frame()
+
+    # a later run compiles the recorded programs up front, most recent first
+    cache = ProgramCache(str(tmp_path))
+    assert cache.manifest()[1] == key and cache.load(key) == phong.shaders
+    warm = ResourceManager(FakeContext(), program_cache=cache)
+    assert warm.warm_up() == 2 and warm.warm_up() == 0
+    assert warm.program(phong.shaders)[0] == key
+    assert warm.stats['program_misses'] == 0 and warm.stats['programs_compiled'] == 2
+
+    small = ProgramCache(str(tmp_path / 'small'), max_programs=1)
+    small.store(key, phong.shaders)
+    small.store('other', {'vert': ''})
+    assert small.manifest() == ['other'] and small.load(key) is None
@@ -0,0 +1,76 @@
+import pytest
+
+import radiant
+from radiant.shaderlib import preprocess, program_digest, ShaderLibrary
+
+
+def test_preprocess():
+    files = {
+        'common.glsl': "#include \"inner.glsl\"\nuniform float scale;  // comment\n",
+        'inner.glsl': "#ifdef DOUBLE\nconst float factor = 2.0;\n#else\nconst float factor = 1.0;\n#endif\n",
+        'loop.glsl': "#include \"loop.glsl\"\n",
+    }
+    source = """#version 330
+/* block
+   comment */
+#include "common.glsl"
+
+#ifndef DOUBLE
+#if COUNT > 2
+float many;
+#endif
+#endif
+float value = COUNT;
+"""
+    single = preprocess(source, {'COUNT': 3}, read=files.__getitem__)
+    assert single.splitlines() == [
+        "#version 330",
+        "#define COUNT 3",
+        "const float factor = 1.0;",
+        "uniform float scale;",
+        "#if COUNT > 2",
+        "float many;",
+        "#endif",
+        "float value = COUNT;",
+    ]
+    double = preprocess(source, {'COUNT': 3, 'DOUBLE': True}, read=files.__getitem__)
+    assert "const float factor = 2.0;" in double and "many" not in double
+    # consumed defines are not passed on to the compiler
+    assert "#define DOUBLE" not in double
+
+    with pytest.raises(ValueError):
+        preprocess("#include \"loop.glsl\"\n", read=files.__getitem__)
+    with pytest.raises(ValueError):
+        preprocess("#ifdef A\n")
+    with pytest.raises(ValueError):
+        preprocess("#endif\n")
+
+
+def test_shader_library(tmp_path):
+    (tmp_path / 'light.glsl').write_text("#ifdef LIT\nin vec3 normal;\n#endif\n")
+    (tmp_path / 'mesh.vert').write_text("#version 330\n#include \"light.glsl\"\nin vec3 pos;\n")
+    (tmp_path / 'mesh.frag').write_text("#version 330\n// unaffected by LIT\nout vec4 color;\n")
+    library = ShaderLibrary(str(tmp_path))
+
+    plain, lit = library.load('mesh'), library.load('mesh', {'LIT': True})
+    assert set(plain) == {'vert', 'frag'}
+    assert library.load('mesh') is plain
+    assert "normal" in lit['vert'] and "normal" not in plain['vert']
+    # variants dedupe by stage
+    assert lit['frag'] == plain['frag']
+    assert program_digest(lit) != program_digest(plain) == program_digest(dict(plain))
+    with pytest.raises(KeyError):
+        library.load('missing')
+
+
+def test_builtin_variants():
+    phong = radiant.MeshPhongMaterial()
+    flat = radiant.MeshPhongMaterial(flat_shading=True)
+    assert "in vec3 normal;" in phong.shaders['vert'] and "normal" not in flat.shaders['vert'].replace('normal_matrix', '')
+    assert "in mat4 model_view_matrix;" in phong.instanced_shaders['vert']
+    assert "light_data" in phong.variant(clustered=True)['frag']
+    assert phong.variant(instanced=True, clustered=True)['vert'] == radiant.MeshPhongMaterial().variant(instanced=True, clustered=True)['vert']
+    # the basic material has no clustered variant
+    basic = radiant.MeshBasicMaterial()
+    assert basic.variant(clustered=True) is basic.shaders
+    assert "normal_matrix" not in basic.instanced_shaders['vert']
@@ -0,0 +1,63 @@
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+import radiant
+
+
+def test_simplify_plane():
+    plane = radiant.PlaneGeometry(width=2, height=2, width_segments=32, height_segments=32)
+    simplified = radiant.simplify(plane, resolution=8)
+    assert 0 < len(simplified.index) < len(plane.index) / 4
+    assert set(simplified.attributes) == set(plane.attributes)
+    assert simplified.index.dtype == plane.index.dtype
+    # flat surfaces stay flat, and within bounds
+    pos = simplified.attributes['pos']
+    npt.assert_allclose(pos[:, 2], 0, atol=1e-6)
+    assert (pos >= -1).all() and (pos <= 1).all()
+    npt.assert_allclose(simplified.attributes['normal'], np.tile([0, 0, 1], (len(pos), 1)), atol=1e-6)
+    # winding is preserved
+    v0, v1, v2 = (pos[simplified.index[:, i]] for i in range(3))
+    assert (np.cross(v1 - v0, v2 - v0)[:, 2] > 0).all()
+
+
+def test_lod_chain():
+    geometry = radiant.load_obj_indexed("examples/resources/dragon.obj")
+    chain = radiant.lod_chain(geometry, levels=3, ratio=0.25)
+    assert chain[0] is geometry
+    counts = [len(g.index) for g in chain]
+    assert counts[1] <= len(geometry.index) * 0.25 and counts[2] <= len(geometry.index) / 16
+    assert counts[2] > len(geometry.index) / 64
+    # the shape keeps its extent
+    npt.assert_allclose(chain[1].bounding_box, geometry.bounding_box, atol=0.1)
+
+    with pytest.raises(ValueError):
+        radiant.simplify(radiant.Geometry(geometry.attributes, primitive=radiant.Primitives.POINTS))
+
+
+def test_lod_select():
+    chain = [radiant.PlaneGeometry(width=2, height=2, width_segments=n, height_segments=n) for n in (8, 4, 1)]
+    lod = radiant.LOD.from_geometries(chain, radiant.MeshBasicMaterial())
+    assert [size for size, _ in lod.levels] == [0.25, 0.125, 0.0]
+    meshes = [node for _, node in lod.levels]
+    assert list(lod.children) == meshes
+
+    camera = radiant.PerspectiveCamera(position=[0, 0, 2], target=[0, 0, 0], up=[0, 1, 0], fov=90)
+    camera.update()
+    lod.update_subtree()
+    # a sphere of radius sqrt(2) at distance 2 under a 90 degree field of view
+    assert lod.projected_size(camera) == pytest.approx(2 ** 0.5 / 2)
+    assert lod.select(camera) is meshes[0]
+
+    for distance, expected in ((8, meshes[1]), (100, meshes[2])):
+        camera.position = [0, 0, distance]
+        camera.update()
+        assert lod.select(camera) is expected
+
+    # scaling the node makes it appear larger
+    lod.scale = [10, 10, 10]
+    lod.update_subtree()
+    assert lod.select(camera) is meshes[1]
+
+    lod.remove_child(meshes[0])
+    assert [node for _, node in lod.levels] == meshes[1:]
@@ -0,0 +1,64 @@
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+import radiant
+from radiant.renderers.software import SoftwareRenderer
+
+
+def build_scene():
+    scene = radiant.Scene()
+    geometry = radiant.PlaneGeometry(width=2, height=2, width_segments=4, height_segments=4)
+    red = radiant.MeshBasicMaterial(color=(1.0, 0.0, 0.0, 1.0))
+    green = radiant.MeshBasicMaterial(color=(0.0, 1.0, 0.0, 1.0))
+    scene.append_child(radiant.Mesh(geometry, red, position=[0, 0, -1]))
+    scene.append_child(radiant.Mesh(geometry, green, position=[1, 1, 0]))
+    phong = radiant.MeshPhongMaterial(color=(0.2, 0.4, 0.8, 1.0), shininess=8.0)
+    scene.append_child(radiant.Mesh(geometry, phong, position=[-1.5, -1, 0.5], rotation=[0.3, 0.4, 0]))
+    light = radiant.PointLight(position=[0, 0, 4])
+    scene.append_child(light)
+    camera = radiant.PerspectiveCamera(position=[0, 0, 5], target=[0, 0, 0], up=[0, 1, 0], aspect=1)
+    return scene, camera, light
+
+
+def test_reference_image():
+    scene, camera, light = build_scene()
+    renderer = SoftwareRenderer(size=(64, 64), tile_size=16, workers=1)
+    image = renderer.render(scene, camera, light=light)
+    assert image.shape == (64, 64, 3) and image.dtype == np.uint8
+
+    # background, the far red plane, and the green plane in front of it; top row first
+    npt.assert_array_equal(image[0, 0], [230, 230, 230])
+    npt.assert_array_equal(image[40, 30], [255, 0, 0])
+    npt.assert_array_equal(image[24, 40], [0, 255, 0])
+    shaded = image[44, 14]
+    assert shaded[2] > shaded[1] > shaded[0] > 0
+    assert renderer.depth.min() > 0 and renderer.depth.max() == 1
+
+    # independent of tiling and threads
+    for tile_size, workers, max_fragments in ((7, 4, 5), (64, 2, 1 << 20)):
+        other = SoftwareRenderer(size=(64, 64), tile_size=tile_size, workers=workers, max_fragments=max_fragments)
+        npt.assert_array_equal(other.render(scene, camera, light=light), image)
+
+
+def test_culling():
+    scene, camera, light = build_scene()
+    renderer = SoftwareRenderer(size=(32, 32))
+    # seen from behind, all planes are back faces
+    camera.look_at([0, 0, -5], [0, 0, 0])
+    image = renderer.render(scene, camera, light=light)
+    assert (image == 230).all()
+    assert renderer.stats['culled'] == renderer.stats['triangles'] == 3 * 32
+
+    # unless they wind the other way
+    for mesh in scene.children[:3]:
+        mesh.geometry = radiant.Geometry(
+            mesh.geometry.attributes, index=mesh.geometry.index, winding_order=radiant.WindingOrders.CW)
+    image = renderer.render(scene, camera, light=light)
+    assert not (image == 230).all()
+
+
+def test_phong_needs_light():
+    scene, camera, _ = build_scene()
+    with pytest.raises(ValueError):
+        SoftwareRenderer(size=(32, 32)).render(scene, camera)